@@ -1,12 +1,19 @@
 from django.contrib import admin
 
-from .models import Certificate
+from .models import Certificate, IssuanceJob
 
 
 # Register your models here.
 class CertificateAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'cohort', 'intern_name', 'stack', 'issue_date', 'created_at', 'updated_at')
     list_filter = ('cohort', 'issue_date', 'created_at', 'updated_at')
-    search_fields = ('id', 'user', 'cohort', 'intern_name', 'stack')
+    search_fields = ('id', 'user', 'cohort', 'intern_name', 'stack', 'verification_code')
 
 admin.site.register(Certificate, CertificateAdmin)
+
+
+class IssuanceJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'cohort', 'status', 'processed', 'total', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+
+admin.site.register(IssuanceJob, IssuanceJobAdmin)
@@ -0,0 +1,121 @@
+"""ZIP archives of rendered certificates, streamed as they are written.
+
+`zipfile` writes to an object that can't seek by following each entry with
+a data descriptor instead of going back to fix its header, so the archive
+can be handed to the client piece by piece: each file is read in
+`CHUNK_SIZE` blocks and the bytes `zipfile` produced are passed on straight
+away. Memory stays flat however many certificates there are.
+
+Entries are stored, not deflated (PNG and PDF are compressed already), with
+fixed names and timestamps, so an archive's bytes only depend on its
+entries. That lets `zip_size` work out its length in advance from the file
+sizes, for Content-Length, and `stream_range` serve any part of it again,
+which is what resuming a download with Range needs."""
+
+import struct
+import zipfile
+from contextlib import closing
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.utils.text import slugify
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ZipEntry(NamedTuple):
+    name: str
+    path: Path
+    size: int
+    date_time: Tuple[int, int, int, int, int, int]
+
+
+def certificate_entry(certificate, path: Path) -> ZipEntry:
+    # ASCII names have one encoding, which zip_size relies on
+    name = f"{slugify(certificate.intern_name or 'certificate')}-{certificate.pk}{path.suffix}"
+    return ZipEntry(name, path, path.stat().st_size, certificate.issue_date.timetuple()[:6])
+
+
+class _Sink:
+    """Collects what zipfile writes until the generator passes it on"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self.chunks = self.chunks, []
+        yield from chunks
+
+
+def stream_zip(entries: Iterable[ZipEntry]) -> Iterator[bytes]:
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, entry.date_time)
+            info.file_size = entry.size
+            with archive.open(info, "w") as member, open(entry.path, "rb") as file:
+                while chunk := file.read(CHUNK_SIZE):
+                    member.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def zip_size(entries: Iterable[ZipEntry]) -> int:
+    """The length of `stream_zip(entries)`, following zipfile's layout"""
+    offset = central = count = 0
+    for entry in entries:
+        name = len(entry.name.encode("ascii"))
+        zip64 = entry.size * 1.05 > zipfile.ZIP64_LIMIT
+        # Local header (+ zip64 sizes), data, data descriptor (with 8 byte sizes under zip64)
+        local = struct.calcsize(zipfile.structFileHeader) + name + (20 if zip64 else 0) + entry.size
+        local += 24 if zip64 else 16
+        central_extra = 16 if entry.size > zipfile.ZIP64_LIMIT else 0
+        central_extra += 8 if offset > zipfile.ZIP64_LIMIT else 0
+        central += struct.calcsize(zipfile.structCentralDir) + name + (4 + central_extra if central_extra else 0)
+        offset += local
+        count += 1
+    end = struct.calcsize(zipfile.structEndArchive)
+    if count >= zipfile.ZIP_FILECOUNT_LIMIT or offset > zipfile.ZIP64_LIMIT or central > zipfile.ZIP64_LIMIT:
+        end += struct.calcsize(zipfile.structEndArchive64) + struct.calcsize(zipfile.structEndArchive64Locator)
+    return offset + central + end
+
+
+def stream_range(chunks: Iterator[bytes], start: int, end: int) -> Iterator[bytes]:
+    """Bytes `start` to `end` (inclusive) of the stream of `chunks`"""
+    position = 0
+    with closing(chunks):
+        for chunk in chunks:
+            following = position + len(chunk)
+            if following > start:
+                yield chunk[max(0, start - position) : end + 1 - position]
+            position = following
+            if position > end:
+                return
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) of a single `bytes=` Range header, or None to send the
+    whole archive (no header, one we don't handle, several ranges). Raises
+    ValueError when the range lies outside the archive"""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec or "-" not in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise ValueError(f"Range {header!r} is outside of {size} bytes")
+    return start, end
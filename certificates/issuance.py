@@ -0,0 +1,60 @@
+"""Set based certificate issuance.
+
+`Certificate.save()` fills `intern_name` and `stack` from the user and their
+intern profile, two lazy loads per certificate on top of its INSERT. Here
+the interns' roles and names are read in one query, the denormalized fields
+are computed in memory and the certificates written with chunked
+`bulk_create`, all in one transaction. Primary keys are snowflakes made in
+Python, so every backend knows them without reading them back.
+
+Issuing is idempotent: an intern who already holds an issued certificate for
+their cohort is skipped. The intern rows and their users are locked for the
+transaction, so two concurrent issuances for the same interns can't both
+create one. bulk_create sends no post_save, but new rows have nothing cached
+to invalidate."""
+
+from typing import Dict, List
+
+from django.db import transaction
+
+from .models import Certificate
+
+BATCH_SIZE = 1000
+
+
+def issue_certificates(interns, batch_size: int = BATCH_SIZE) -> Dict[str, List[Dict[str, int]]]:
+    """Issues a certificate to every intern in the `interns` queryset that
+    doesn't have one for their cohort. Returns the new certificates and the
+    ones the other interns already had, as intern_id/certificate_id pairs"""
+    with transaction.atomic():
+        rows = list(
+            interns.select_for_update()
+            .order_by("id")
+            .values_list("id", "user_id", "cohort_id", "role", "user__first_name", "user__last_name")
+        )
+        # Subqueries rather than id lists, which can outgrow the backend's parameter limit
+        existing = {
+            (user_id, cohort_id): certificate_id
+            for certificate_id, user_id, cohort_id in Certificate.objects.filter(
+                user_id__in=interns.values("user_id"), cohort_id__in=interns.values("cohort_id"), is_issued=True
+            ).values_list("id", "user_id", "cohort_id")
+        }
+        issued, already_issued, certificates = [], [], []
+        for intern_id, user_id, cohort_id, role, first_name, last_name in rows:
+            certificate_id = existing.get((user_id, cohort_id))
+            if certificate_id is not None:
+                already_issued.append({"intern_id": intern_id, "certificate_id": certificate_id})
+                continue
+            certificate = Certificate(
+                user_id=user_id,
+                cohort_id=cohort_id,
+                intern_name=f"{first_name} {last_name}",
+                stack=role,
+                is_issued=True,
+            )
+            # An intern listed twice gets one certificate
+            existing[(user_id, cohort_id)] = certificate.id
+            certificates.append(certificate)
+            issued.append({"intern_id": intern_id, "certificate_id": certificate.id})
+        Certificate.objects.bulk_create(certificates, batch_size=batch_size)
+    return {"issued": issued, "already_issued": already_issued}
@@ -0,0 +1,130 @@
+"""Background certificate issuance.
+
+The batch endpoint only records an `IssuanceJob` and answers 202; workers
+started with `python manage.py run_issuance_worker` do the issuing. A worker
+claims the oldest pending job with `SELECT ... FOR UPDATE SKIP LOCKED`, so
+workers never wait on each other, and then issues its interns in chunks of
+`CERTIFICATE_JOBS["chunk_size"]`, ordered by id. Each chunk commits together
+with the job's cursor and counters, so progress is visible to the status
+endpoint as it's made and a chunk is either done and recorded or not done at
+all. The job only keeps counts; the certificates it issued are read back
+from the `Certificate` table, a page at a time.
+
+The claim is a lease: a running job whose heartbeat is older than
+`CERTIFICATE_JOBS["lease"]` seconds is taken over by the next worker, which
+carries on from the cursor. The previous holder notices at its next chunk
+and stops. A chunk that ran twice issues nothing twice, since
+`issue_certificates` skips interns who already hold a certificate."""
+
+import logging
+import os
+import socket
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from cohort_management.models import InternProfile
+from .issuance import issue_certificates
+from .models import Certificate, IssuanceJob
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_interns(job: IssuanceJob):
+    if job.cohort_id is not None:
+        return InternProfile.objects.filter(cohort_id=job.cohort_id)
+    return InternProfile.objects.filter(id__in=job.intern_ids)
+
+
+def job_certificates(job: IssuanceJob):
+    """The certificates issued to the job's interns since it was queued"""
+    interns = job_interns(job)
+    return Certificate.objects.filter(
+        user_id__in=interns.values("user_id"),
+        cohort_id__in=interns.values("cohort_id"),
+        is_issued=True,
+        created_at__gte=job.created_at,
+    )
+
+
+def submit(requested_by, cohort=None, intern_ids: Iterable[int] = ()) -> IssuanceJob:
+    """Queues the issuance for a cohort, or for the given intern profiles"""
+    job = IssuanceJob(requested_by=requested_by, cohort=cohort, intern_ids=list(intern_ids))
+    job.total = job_interns(job).count()
+    job.save()
+    return job
+
+
+def claim(worker: str) -> Optional[IssuanceJob]:
+    """Takes the oldest job that is pending or whose worker stopped heartbeating"""
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.CERTIFICATE_JOBS["lease"])
+    with transaction.atomic():
+        job = (
+            IssuanceJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=IssuanceJob.PENDING) | Q(status=IssuanceJob.RUNNING, heartbeat_at__lt=expired))
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        if job.status == IssuanceJob.RUNNING:
+            logger.warning("Taking over issuance job %s from %s at intern %s", job.pk, job.worker, job.cursor)
+        job.status = IssuanceJob.RUNNING
+        job.worker = worker
+        job.heartbeat_at = now
+        job.save(update_fields=["status", "worker", "heartbeat_at", "updated_at"])
+    return job
+
+
+def run(job: IssuanceJob, worker: str, chunk_size: Optional[int] = None) -> IssuanceJob:
+    """Issues the rest of a claimed job, one committed chunk at a time"""
+    chunk_size = chunk_size or settings.CERTIFICATE_JOBS["chunk_size"]
+    interns = job_interns(job)
+    try:
+        while True:
+            with transaction.atomic():
+                job = IssuanceJob.objects.select_for_update().get(pk=job.pk)
+                if job.status != IssuanceJob.RUNNING or job.worker != worker:
+                    # Another worker took it over
+                    return job
+                ids = list(
+                    interns.filter(id__gt=job.cursor).order_by("id").values_list("id", flat=True)[:chunk_size]
+                )
+                now = timezone.now()
+                job.heartbeat_at = now
+                if not ids:
+                    job.status = IssuanceJob.SUCCEEDED
+                    job.finished_at = now
+                    job.save(update_fields=["status", "heartbeat_at", "finished_at", "updated_at"])
+                    return job
+                result = issue_certificates(InternProfile.objects.filter(id__in=ids))
+                job.cursor = ids[-1]
+                job.processed += len(ids)
+                job.certificates_issued += len(result["issued"])
+                job.certificates_already_issued += len(result["already_issued"])
+                job.save(
+                    update_fields=[
+                        "cursor",
+                        "processed",
+                        "certificates_issued",
+                        "certificates_already_issued",
+                        "heartbeat_at",
+                        "updated_at",
+                    ]
+                )
+    except Exception as error:
+        logger.exception("Issuance job %s failed", job.pk)
+        IssuanceJob.objects.filter(pk=job.pk, worker=worker).update(
+            status=IssuanceJob.FAILED, error=str(error), finished_at=timezone.now()
+        )
+        job.refresh_from_db()
+        return job
@@ -0,0 +1,28 @@
+"""Gives verification codes to certificates created before they existed
+
+    python manage.py backfill_verification_codes --chunk-size 1000
+"""
+
+from django.core.management.base import BaseCommand
+
+from certificates.models import Certificate, new_verification_code
+
+
+class Command(BaseCommand):
+    help = "Sets a verification code on every certificate without one, in bounded chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        filled = 0
+        while True:
+            certificates = list(
+                Certificate.objects.filter(verification_code__isnull=True).only("id")[: options["chunk_size"]]
+            )
+            if not certificates:
+                break
+            for certificate in certificates:
+                certificate.verification_code = new_verification_code()
+            filled += Certificate.objects.bulk_update(certificates, ["verification_code"])
+        self.stdout.write(f"Gave {filled} certificates a verification code")
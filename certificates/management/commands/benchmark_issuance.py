@@ -0,0 +1,60 @@
+"""Compares issuing a cohort's certificates one save() at a time with the
+set based issuance, at several cohort sizes
+
+    python manage.py benchmark_issuance --sizes 100 1000 10000
+"""
+
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from certificates.issuance import issue_certificates
+from certificates.models import Certificate
+from cohort_management.models import Cohort, InternProfile
+from utils.benchmark import format_result, measure, throwaway_database
+
+User = get_user_model()
+
+
+def issue_one_by_one(interns) -> None:
+    """What the batch view did before: a save() per intern"""
+    for intern in interns:
+        Certificate(user=intern.user, cohort=intern.cohort, is_issued=True).save()
+
+
+class Command(BaseCommand):
+    help = "Benchmarks per-row against set based certificate issuance at several cohort sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+        parser.add_argument("--skip-one-by-one", action="store_true")
+
+    def cohort(self, size: int, tag: str) -> Cohort:
+        """A new cohort with `size` interns"""
+        cohort = Cohort.objects.create(
+            title=f"{tag} {size}", description="-", rules="-", start_date=date(2024, 1, 1), end_date=date(2024, 3, 31)
+        )
+        users = User.objects.bulk_create(
+            [
+                User(email=f"{tag}{size}.{i}@example.com", username=f"{tag}{size}.{i}", first_name="Intern", last_name=str(i), password="!")
+                for i in range(size)
+            ],
+            batch_size=1000,
+        )
+        InternProfile.objects.bulk_create(
+            [InternProfile(user=user, cohort=cohort, role="Backend developer") for user in users], batch_size=1000
+        )
+        return cohort
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            for size in sorted(options["sizes"]):
+                self.stdout.write(f"\n{size} interns")
+                if not options["skip_one_by_one"]:
+                    interns = InternProfile.objects.filter(cohort=self.cohort(size, "loop"))
+                    self.stdout.write(format_result("save() per intern", measure(lambda: issue_one_by_one(interns), 1, warmup=0)))
+                interns = InternProfile.objects.filter(cohort=self.cohort(size, "bulk"))
+                self.stdout.write(format_result("issue_certificates", measure(lambda: issue_certificates(interns), 1, warmup=0)))
+                # Every intern has one now, so this only reads
+                self.stdout.write(format_result("issue_certificates again", measure(lambda: issue_certificates(interns), 1, warmup=0)))
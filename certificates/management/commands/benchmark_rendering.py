@@ -0,0 +1,49 @@
+"""Measures certificate rendering throughput with a cold and a warm render
+cache, at several process pool sizes
+
+    python manage.py benchmark_rendering --certificates 200 --workers 1 2 4
+"""
+
+import os
+import tempfile
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from certificates.models import Certificate
+from certificates.rendering import render_many
+from cohort_management.models import Cohort
+
+
+class Command(BaseCommand):
+    help = "Benchmarks certificates rendered per second per core"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--certificates", type=int, default=200)
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+        parser.add_argument("--format", choices=["png", "pdf"], default="png")
+
+    def handle(self, *args, **options):
+        cohort = Cohort(title="Cohort 5 Backend", start_date=date(2024, 1, 1), end_date=date(2024, 3, 31))
+        # Unsaved rows: rendering only reads their fields
+        certificates = [
+            Certificate(cohort=cohort, intern_name=f"Intern {i}", stack="Backend developer")
+            for i in range(options["certificates"])
+        ]
+        for workers in sorted(set(options["workers"])):
+            with tempfile.TemporaryDirectory() as output_dir, override_settings(
+                CERTIFICATE_RENDERING={**settings.CERTIFICATE_RENDERING, "output_dir": output_dir}
+            ):
+                for label in ("cold", "warm"):
+                    start = time.perf_counter()
+                    render_many(certificates, options["format"], workers)
+                    elapsed = time.perf_counter() - start
+                    rate = len(certificates) / elapsed
+                    cores = min(workers, os.cpu_count())
+                    self.stdout.write(
+                        f"{workers} workers, {label:<4} {len(certificates)} certificates in {elapsed:.2f}s: "
+                        f"{rate:.1f}/s, {rate / cores:.1f}/s per core"
+                    )
@@ -0,0 +1,25 @@
+"""Draws the files of issued certificates that don't have one yet
+
+    python manage.py render_certificates --cohort 123 --format pdf
+"""
+
+from django.core.management.base import BaseCommand
+
+from certificates.models import Certificate
+from certificates.rendering import FORMATS, render_many
+
+
+class Command(BaseCommand):
+    help = "Renders issued certificates, skipping those whose file is up to date"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cohort", type=int, help="Only this cohort's certificates")
+        parser.add_argument("--format", choices=sorted(FORMATS), default="png")
+        parser.add_argument("--workers", type=int, help="Processes to draw with, one per core by default")
+
+    def handle(self, *args, **options):
+        certificates = Certificate.objects.filter(is_issued=True).select_related("cohort")
+        if options["cohort"] is not None:
+            certificates = certificates.filter(cohort_id=options["cohort"])
+        paths = render_many(certificates.iterator(), options["format"], options["workers"])
+        self.stdout.write(f"{len(paths)} certificates rendered to {options['format']}")
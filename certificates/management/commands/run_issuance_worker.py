@@ -0,0 +1,35 @@
+"""Runs queued certificate issuance jobs
+
+    python manage.py run_issuance_worker
+    python manage.py run_issuance_worker --once
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from certificates.jobs import claim, run, worker_name
+
+
+class Command(BaseCommand):
+    help = "Claims queued certificate issuance jobs and runs them in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit once no job is waiting")
+        parser.add_argument("--chunk-size", type=int, default=settings.CERTIFICATE_JOBS["chunk_size"])
+        parser.add_argument("--poll-interval", type=float, default=settings.CERTIFICATE_JOBS["poll_interval"])
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        while True:
+            close_old_connections()
+            job = claim(worker)
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+            job = run(job, worker, options["chunk_size"])
+            self.stdout.write(f"Issuance job {job.pk}: {job.status}, {job.processed}/{job.total} interns")
@@ -1,3 +1,5 @@
+import secrets
+
 from django.db import models
 from django.utils import timezone
 
@@ -7,6 +9,17 @@ from cohort_management.models import Cohort
 from utils.models import BaseModel
 
 
+# Crockford's base32: no I, L, O or U to misread
+VERIFICATION_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+VERIFICATION_CODE_LENGTH = 12
+
+
+def new_verification_code():
+    """A random code for the public verification link, 60 bits in 12 characters"""
+    bits = secrets.randbits(5 * VERIFICATION_CODE_LENGTH)
+    return "".join(VERIFICATION_ALPHABET[(bits >> (5 * i)) & 31] for i in range(VERIFICATION_CODE_LENGTH))
+
+
 # Create your models here.
 class Certificate(BaseModel):
     user = models.ForeignKey(User, 
@@ -21,6 +34,11 @@ class Certificate(BaseModel):
     stack = models.CharField(max_length=100, blank=True, null=True)
     is_issued = models.BooleanField(default=False)
     issue_date = models.DateTimeField(default=timezone.now)
+    # Null for certificates from before codes; see the backfill_verification_codes command
+    verification_code = models.CharField(
+        max_length=VERIFICATION_CODE_LENGTH, unique=True, null=True, blank=True,
+        default=new_verification_code, editable=False,
+    )
 
     def __str__(self):
         return f'{self.user.first_name} {self.user.last_name}'
@@ -30,3 +48,38 @@ class Certificate(BaseModel):
             self.intern_name = f"{self.user.first_name} {self.user.last_name}"
             self.stack = self.user.user_profile.role
         super().save(*args, **kwargs)
+
+
+class IssuanceJob(BaseModel):
+    """A batch issuance run by the `run_issuance_worker` command in chunks of
+    interns ordered by id. `cursor` is the last intern id done, so a job taken
+    over from a worker that died carries on from there. See certificates.jobs"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    status_choices = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    requested_by = models.ForeignKey(User, related_name='issuance_jobs', on_delete=models.SET_NULL, null=True)
+    cohort = models.ForeignKey(Cohort, related_name='issuance_jobs', on_delete=models.CASCADE, null=True)
+    intern_ids = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=status_choices, default=PENDING, db_index=True)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    cursor = models.BigIntegerField(default=0)
+    # Counts only; the certificates themselves are listed by certificates.jobs.job_certificates
+    certificates_issued = models.PositiveIntegerField(default=0)
+    certificates_already_issued = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Issuance job {self.id} ({self.status})'
@@ -0,0 +1,166 @@
+"""Draws certificates as PNG or PDF files with Pillow.
+
+`intern_name`, `stack`, the cohort title and the issue date are drawn onto
+the image at `CERTIFICATE_RENDERING["template"]`, or onto a plain bordered
+page when there is none, using the TrueType font at
+`CERTIFICATE_RENDERING["font"]` or Pillow's built-in one.
+
+Files are named after a hash of everything that goes into them: those
+fields, the template's and font's contents, the format and RENDER_VERSION.
+A certificate whose inputs didn't change is never drawn again, and one that
+changed gets a new file rather than overwriting the one a download may be
+reading. Files go to `CERTIFICATE_RENDERING["output_dir"]`, written to a
+temporary name first and moved into place, so a half written file is never
+served.
+
+`render_many` draws the missing files of a batch in a ProcessPoolExecutor of
+`CERTIFICATE_RENDERING["workers"]` processes (one per core by default);
+drawing is CPU bound and holds the GIL."""
+
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+
+# Bump when the layout changes, so every certificate is drawn again
+RENDER_VERSION = 1
+FORMATS = {"png": "PNG", "pdf": "PDF"}
+PAGE_SIZE = (2000, 1414)
+INK = (33, 37, 41)
+ACCENT = (0, 82, 155)
+
+
+class RenderSpec(NamedTuple):
+    intern_name: str
+    stack: str
+    cohort: str
+    issued_on: str
+    format: str = "png"
+
+
+def spec_of(certificate, format: str = "png") -> RenderSpec:
+    """What is drawn for `certificate`; reads `certificate.cohort`"""
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported certificate format {format!r}")
+    return RenderSpec(
+        intern_name=certificate.intern_name or "",
+        stack=certificate.stack or "",
+        cohort=certificate.cohort.title if certificate.cohort_id else "",
+        issued_on=certificate.issue_date.strftime("%d %B %Y"),
+        format=format,
+    )
+
+
+@lru_cache(maxsize=8)
+def _file_digest(path: str, mtime: float, size: int) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def asset_digest(path: str) -> str:
+    """Identifies the contents of a template or font file, or its absence"""
+    if not path:
+        return "default"
+    stat = os.stat(path)
+    return _file_digest(path, stat.st_mtime, stat.st_size)
+
+
+def render_key(spec: RenderSpec) -> str:
+    options = settings.CERTIFICATE_RENDERING
+    inputs = [RENDER_VERSION, asset_digest(options["template"]), asset_digest(options["font"]), *spec]
+    return hashlib.sha256("\x1f".join(map(str, inputs)).encode()).hexdigest()
+
+
+def output_path(spec: RenderSpec) -> Path:
+    key = render_key(spec)
+    return Path(settings.CERTIFICATE_RENDERING["output_dir"]) / key[:2] / f"{key}.{spec.format}"
+
+
+@lru_cache(maxsize=32)
+def _font(path: str, size: int):
+    return ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=2)
+def _template(path: str) -> Image.Image:
+    if path:
+        return Image.open(path).convert("RGB")
+    page = Image.new("RGB", PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(page)
+    margin = PAGE_SIZE[1] // 25
+    draw.rectangle([margin, margin, PAGE_SIZE[0] - margin, PAGE_SIZE[1] - margin], outline=ACCENT, width=margin // 4)
+    return page
+
+
+def draw(spec: RenderSpec, template: str = "", font: str = "") -> bytes:
+    """The certificate as a file in `spec.format`"""
+    page = _template(template).copy()
+    width, height = page.size
+    canvas = ImageDraw.Draw(page)
+    lines = [
+        ("Certificate of Completion", 0.22, 0.055, ACCENT),
+        ("This certifies that", 0.36, 0.03, INK),
+        (spec.intern_name, 0.46, 0.075, INK),
+        (f"completed the {spec.stack} track of {spec.cohort}", 0.58, 0.032, INK),
+        (f"Issued on {spec.issued_on}", 0.74, 0.026, INK),
+    ]
+    for text, top, size, colour in lines:
+        canvas.text((width / 2, height * top), text, fill=colour, font=_font(font, int(height * size)), anchor="mm")
+    output = BytesIO()
+    if spec.format == "pdf":
+        page.save(output, "PDF", resolution=150.0)
+    else:
+        page.save(output, "PNG")
+    return output.getvalue()
+
+
+def _write(path: Path, spec: RenderSpec, template: str, font: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as file:
+        file.write(draw(spec, template, font))
+    os.replace(file.name, path)
+
+
+def render(certificate, format: str = "png") -> Path:
+    """The file of `certificate`, drawn in this process if it's missing"""
+    spec = spec_of(certificate, format)
+    path = output_path(spec)
+    if not path.exists():
+        options = settings.CERTIFICATE_RENDERING
+        _write(path, spec, options["template"], options["font"])
+    return path
+
+
+def render_many(certificates: Iterable, format: str = "png", workers: Optional[int] = None) -> Dict[int, Path]:
+    """The files of `certificates` by certificate id, drawing the missing ones
+    in a process pool. Pass certificates with their cohorts loaded"""
+    options = settings.CERTIFICATE_RENDERING
+    paths, missing = {}, {}
+    for certificate in certificates:
+        spec = spec_of(certificate, format)
+        paths[certificate.pk] = path = output_path(spec)
+        if not path.exists():
+            missing[path] = spec
+    if missing:
+        workers = workers or options["workers"] or os.cpu_count()
+        with ProcessPoolExecutor(workers) as pool:
+            chunksize = max(1, len(missing) // (workers * 4))
+            count = len(missing)
+            list(
+                pool.map(
+                    _write,
+                    missing.keys(),
+                    missing.values(),
+                    [options["template"]] * count,
+                    [options["font"]] * count,
+                    chunksize=chunksize,
+                )
+            )
+    return paths
@@ -1,11 +1,21 @@
 from rest_framework import serializers
-from .models import Certificate
+from cohort_management.serializers import CohortSerializer
+from user_management.serializers import UserSummarySerializer
+from utils.fieldsets import SparseFieldsetMixin
+from .models import Certificate, IssuanceJob
 
 
-class CertificateDetailSerializer(serializers.ModelSerializer):
+class CertificateDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Anyone can read a certificate and the response is cached publicly, so the user isn't expandable
     class Meta:
         model = Certificate
         fields = '__all__'
+        expandable_fields = {'cohort': CohortSerializer}
+
+
+class CertificateListSerializer(CertificateDetailSerializer):
+    class Meta(CertificateDetailSerializer.Meta):
+        expandable_fields = {'user': UserSummarySerializer, 'cohort': CohortSerializer}
 
 
 class CertificateSerializer(serializers.ModelSerializer):
@@ -25,3 +35,17 @@ class CertificateSerializer(serializers.ModelSerializer):
 class CertificateIssueBatchSerializer(serializers.Serializer):
     intern_profile_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
     cohort_id = serializers.IntegerField(required=False)
+
+
+class IssuanceJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = IssuanceJob
+        fields = [
+            'id', 'status', 'cohort', 'intern_ids', 'total', 'processed', 'progress',
+            'certificates_issued', 'certificates_already_issued', 'error', 'created_at', 'finished_at',
+        ]
+
+    def get_progress(self, obj):
+        return obj.processed / obj.total if obj.total else 1.0
@@ -0,0 +1,5 @@
+from utils.objectcache import object_cache
+
+from .models import Certificate
+
+object_cache.register(Certificate)
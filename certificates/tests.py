@@ -1,12 +1,33 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from PIL import Image
 
-from .models import Certificate
+from .bundles import certificate_entry, stream_zip, zip_size
+from .issuance import issue_certificates
+from .jobs import claim, run, submit
+from .models import VERIFICATION_ALPHABET, Certificate, IssuanceJob, new_verification_code
+from .rendering import PAGE_SIZE, render, render_many
 from cohort_management.models import InternProfile, Cohort
+from utils.objectcache import object_cache
 
 
 class CertificateIssueBatchAPIViewTests(TestCase):
@@ -46,3 +67,307 @@ class CertificateIssueBatchAPIViewTests(TestCase):
         url = reverse('certificate-issue-batch')
         response = self.client.post(url, {})  # Assuming an empty POST request is sufficient for testing
         self.assertEqual(response.status_code, 401)  # Assuming it returns a 400 for missing data
+
+
+@override_settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, "enabled": True})
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        caches["objects"].clear()
+        self.certificate = Certificate.objects.create(intern_name="Ada Lovelace", stack="Backend developer")
+        self.url = reverse("certificate-detail", kwargs={"pk": self.certificate.pk})
+
+    def later(self, seconds):
+        """Moves the response cache's clock `seconds` ahead"""
+        clock = mock.patch("utils.responsecache.time")
+        clock.start().time.return_value = time.time() + seconds
+        self.addCleanup(clock.stop)
+
+    def test_anonymous_reads_are_served_from_the_cache(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first["Age"], "0")
+        self.assertIn("max-age=30", first["Cache-Control"])
+        self.assertIn("stale-while-revalidate=300", first["Cache-Control"])
+        self.assertIn("Authorization", first["Vary"])
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["ETag"], first["ETag"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+    def test_stale_response_is_served_while_refreshing(self):
+        self.client.get(self.url)
+        Certificate.objects.filter(pk=self.certificate.pk).update(intern_name="Grace Hopper")
+        self.later(60)
+        with mock.patch("utils.responsecache.refreshes.submit") as submit:
+            stale = self.client.get(self.url)
+        self.assertEqual(stale.json()["data"]["intern_name"], "Ada Lovelace")
+        self.assertEqual(stale["Age"], "60")
+        self.assertIn("max-age=0", stale["Cache-Control"])
+        # Runs the refresh here instead of on the pool
+        refresh, *args = submit.call_args.args
+        object_cache.clear()
+        caches["objects"].delete(object_cache.key(Certificate, self.certificate.pk))
+        refresh(*args)
+        self.assertEqual(self.client.get(self.url).json()["data"]["intern_name"], "Grace Hopper")
+
+    def test_refresh_drops_responses_it_cannot_store(self):
+        url = reverse("certificate-verify", kwargs={"code": self.certificate.verification_code})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.certificate.delete()
+        self.later(3601)
+        with mock.patch("utils.responsecache.refreshes.submit") as submit:
+            self.client.get(url)
+        refresh, *args = submit.call_args.args
+        refresh(*args)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_expired_response_is_rendered_again(self):
+        self.client.get(self.url)
+        self.later(400)
+        self.assertEqual(self.client.get(self.url)["Age"], "0")
+
+    def test_anonymous_expand_does_not_reveal_the_user(self):
+        user = get_user_model().objects.bulk_create(
+            [get_user_model()(email="ada@gmail.com", username="ada", first_name="Ada", last_name="Lovelace")]
+        )[0]
+        Certificate.objects.filter(pk=self.certificate.pk).update(user=user)
+        response = self.client.get(self.url, {"expand": "user"})
+        self.assertEqual(response.json()["data"]["user"], user.pk)
+        self.assertNotIn(b"ada@gmail.com", response.content)
+
+    def test_api_schema_is_served_from_the_cache(self):
+        first = self.client.get(reverse("schema-json"))
+        self.assertIn("/autocomplete", first.json()["paths"])
+        self.later(10)
+        second = self.client.get(reverse("schema-json"))
+        self.assertEqual(second["Age"], "10")
+        self.assertEqual(second.content, first.content)
+
+    def test_authenticated_reads_bypass_the_cache(self):
+        admin = get_user_model().objects.bulk_create(
+            [get_user_model()(email="admin@internpulse.com", username="admin", role="admin")]
+        )[0]
+        refresh = RefreshToken.for_user(admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {str(refresh.access_token)}")
+        response = self.client.get(self.url)
+        self.assertIn("Authorization", response["Vary"])
+        self.assertNotIn("Age", response)
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url)["Age"], "0")
+
+
+class CertificateIssuanceTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        admin, *users = User.objects.bulk_create(
+            [User(email="admin@internpulse.com", username="admin", role="admin", is_staff=True)]
+            + [User(email=f"intern{i}@gmail.com", username=f"intern{i}", first_name="Intern", last_name=str(i)) for i in range(3)]
+        )
+        refresh = RefreshToken.for_user(admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {str(refresh.access_token)}")
+        self.cohort = Cohort.objects.create(
+            title="Cohort 5", description="-", rules="-", start_date=date(2024, 1, 1), end_date=date(2024, 3, 31)
+        )
+        self.interns = InternProfile.objects.bulk_create(
+            [InternProfile(user=user, cohort=self.cohort, role="Backend developer") for user in users]
+        )
+        self.url = reverse("certificate-issue-batch")
+
+    def issue(self, payload, chunk_size=500):
+        """Queues an issuance, runs the worker and returns the job's final state"""
+        response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, 202)
+        call_command("run_issuance_worker", "--once", "--chunk-size", str(chunk_size), stdout=StringIO())
+        return self.client.get(response["Location"]).json()["data"]
+
+    def test_cohort_is_issued_in_a_constant_number_of_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = issue_certificates(InternProfile.objects.filter(cohort=self.cohort))
+        self.assertEqual(len(result["issued"]), 3)
+        statements = [query["sql"] for query in queries.captured_queries if "SAVEPOINT" not in query["sql"]]
+        # Interns, existing certificates, one INSERT
+        self.assertEqual(len(statements), 3)
+        certificate = Certificate.objects.get(user=self.interns[0].user)
+        self.assertEqual(certificate.intern_name, "Intern 0")
+        self.assertEqual(certificate.stack, "Backend developer")
+        self.assertTrue(certificate.is_issued)
+
+    def test_worker_issues_queued_job_in_chunks(self):
+        job = self.issue({"cohort_id": self.cohort.pk}, chunk_size=2)
+        self.assertEqual(job["status"], IssuanceJob.SUCCEEDED)
+        self.assertEqual((job["processed"], job["total"], job["progress"]), (3, 3, 1.0))
+        self.assertEqual(job["certificates_issued"], 3)
+        self.assertEqual(Certificate.objects.count(), 3)
+        url = reverse("certificate-issue-batch-certificates", kwargs={"pk": job["id"]})
+        self.assertEqual(self.client.get(url).json()["page_info"]["count"], 3)
+
+    def test_issuing_again_skips_interns_with_a_certificate(self):
+        self.issue({"intern_profile_ids": [self.interns[0].pk]})
+        job = self.issue({"cohort_id": self.cohort.pk})
+        self.assertEqual((job["certificates_issued"], job["certificates_already_issued"]), (2, 1))
+        url = reverse("certificate-issue-batch-certificates", kwargs={"pk": job["id"]})
+        issued = [row["user"] for row in self.client.get(url).json()["data"]]
+        self.assertEqual(sorted(issued), sorted(intern.user_id for intern in self.interns[1:]))
+        self.assertEqual(Certificate.objects.count(), 3)
+
+    def test_job_of_a_dead_worker_resumes_from_its_cursor(self):
+        job = submit(None, cohort=self.cohort)
+        claim("dead")
+        run_chunk = issue_certificates(InternProfile.objects.filter(pk=self.interns[0].pk))
+        IssuanceJob.objects.filter(pk=job.pk).update(
+            cursor=self.interns[0].pk,
+            processed=1,
+            certificates_issued=len(run_chunk["issued"]),
+            heartbeat_at=timezone.now() - timedelta(seconds=settings.CERTIFICATE_JOBS["lease"] + 1),
+        )
+        job = run(claim("alive"), "alive")
+        self.assertEqual(job.status, IssuanceJob.SUCCEEDED)
+        self.assertEqual(job.processed, 3)
+        self.assertEqual(job.certificates_issued, 3)
+        self.assertEqual(job.certificates_already_issued, 0)
+        # The dead worker wakes up and finds the job gone
+        self.assertEqual(run(job, "dead").worker, "alive")
+
+    def test_live_job_is_not_claimed_twice(self):
+        submit(None, cohort=self.cohort)
+        self.assertIsNotNone(claim("first"))
+        self.assertIsNone(claim("second"))
+
+
+class CertificateRenderingTests(SimpleTestCase):
+    def setUp(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        rendering = override_settings(CERTIFICATE_RENDERING={**settings.CERTIFICATE_RENDERING, "output_dir": output_dir})
+        rendering.enable()
+        self.addCleanup(rendering.disable)
+        self.cohort = Cohort(title="Cohort 5", start_date=date(2024, 1, 1), end_date=date(2024, 3, 31))
+
+    def certificate(self, name="Ada Lovelace"):
+        return Certificate(cohort=self.cohort, intern_name=name, stack="Backend developer")
+
+    def test_unchanged_certificate_is_drawn_once(self):
+        certificate = self.certificate()
+        path = render(certificate)
+        self.assertEqual(Image.open(path).size, PAGE_SIZE)
+        with mock.patch("certificates.rendering.draw") as draw:
+            self.assertEqual(render(certificate), path)
+        draw.assert_not_called()
+        certificate.intern_name = "Grace Hopper"
+        self.assertNotEqual(render(certificate), path)
+
+    def test_pdf(self):
+        self.assertTrue(render(self.certificate(), "pdf").read_bytes().startswith(b"%PDF"))
+
+    def test_batch_draws_only_missing_files_in_the_pool(self):
+        certificates = [self.certificate(f"Intern {i}") for i in range(3)]
+        render(certificates[0])
+        paths = render_many(certificates, workers=1)
+        self.assertTrue(all(path.exists() for path in paths.values()))
+        with mock.patch("certificates.rendering.ProcessPoolExecutor") as pool:
+            self.assertEqual(render_many(certificates, workers=1), paths)
+        pool.assert_not_called()
+
+
+class CertificateBundleTests(APITestCase):
+    def setUp(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        rendering = override_settings(CERTIFICATE_RENDERING={**settings.CERTIFICATE_RENDERING, "output_dir": output_dir})
+        rendering.enable()
+        self.addCleanup(rendering.disable)
+        User = get_user_model()
+        admin = User.objects.bulk_create([User(email="admin@internpulse.com", username="admin", role="admin", is_staff=True)])[0]
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {str(RefreshToken.for_user(admin).access_token)}")
+        self.cohort = Cohort.objects.create(
+            title="Cohort 5", description="-", rules="-", start_date=date(2024, 1, 1), end_date=date(2024, 3, 31)
+        )
+        self.certificates = Certificate.objects.bulk_create(
+            [Certificate(cohort=self.cohort, intern_name=f"Intern {i}", stack="Backend developer", is_issued=True) for i in range(3)]
+        )
+        self.url = reverse("certificate-cohort-bundle", kwargs={"pk": self.cohort.pk})
+
+    def render_all(self):
+        for certificate in Certificate.objects.filter(cohort=self.cohort).select_related("cohort"):
+            render(certificate)
+
+    def test_archive_holds_every_rendered_certificate(self):
+        self.render_all()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = b"".join(response.streaming_content)
+        self.assertEqual(int(response["Content-Length"]), len(data))
+        archive = zipfile.ZipFile(BytesIO(data))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(len(archive.namelist()), 3)
+        self.assertEqual(archive.read(f"intern-0-{self.certificates[0].pk}.png"), render(self.certificates[0]).read_bytes())
+
+    def test_certificates_are_not_drawn_in_the_request(self):
+        render(self.certificates[0])
+        with mock.patch("certificates.rendering.draw") as draw:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["data"], {"missing": 2, "rendered": 1})
+        draw.assert_not_called()
+
+    def test_range_resumes_the_same_archive(self):
+        self.render_all()
+        full = self.client.get(self.url)
+        data = b"".join(full.streaming_content)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=1000-", HTTP_IF_RANGE=full["ETag"])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 1000-{len(data) - 1}/{len(data)}")
+        self.assertEqual(b"".join(response.streaming_content), data[1000:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f"bytes={len(data)}-").status_code, 416)
+        # Another archive since: the whole of the new one
+        stale = self.client.get(self.url, HTTP_RANGE="bytes=1000-", HTTP_IF_RANGE='"old"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_zip_size_matches_the_stream(self):
+        entries = [certificate_entry(certificate, render(certificate)) for certificate in self.certificates]
+        self.assertEqual(zip_size(entries), len(b"".join(stream_zip(entries))))
+
+
+class CertificateVerificationTests(APITestCase):
+    def setUp(self):
+        caches["objects"].clear()
+        cohort = Cohort.objects.create(
+            title="Cohort 5", description="-", rules="-", start_date=date(2024, 1, 1), end_date=date(2024, 3, 31)
+        )
+        self.certificate = Certificate.objects.create(
+            cohort=cohort, intern_name="Ada Lovelace", stack="Backend developer", is_issued=True
+        )
+        self.url = reverse("certificate-verify", kwargs={"code": self.certificate.verification_code})
+
+    def test_codes_are_short_and_distinct(self):
+        codes = {new_verification_code() for _ in range(1000)}
+        self.assertEqual(len(codes), 1000)
+        self.assertTrue(all(len(code) == 12 and set(code) <= set(VERIFICATION_ALPHABET) for code in codes))
+
+    def test_verification_is_one_lookup(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response.json()["data"],
+            {"valid": True, "intern_name": "Ada Lovelace", "stack": "Backend developer", "cohort": "Cohort 5"},
+        )
+        # Codes are read back case-insensitively
+        lower = reverse("certificate-verify", kwargs={"code": self.certificate.verification_code.lower()})
+        self.assertEqual(self.client.get(lower).status_code, 200)
+        self.assertEqual(self.client.get(reverse("certificate-verify", kwargs={"code": "0" * 12})).status_code, 404)
+
+    @override_settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, "enabled": True})
+    def test_verification_is_served_from_the_response_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertTrue(response.json()["data"]["valid"])
+        self.assertIn("max-age=3600", response["Cache-Control"])
+        self.assertIn("stale-while-revalidate=300", response["Cache-Control"])
+
+    def test_backfill_gives_old_certificates_codes(self):
+        Certificate.objects.update(verification_code=None)
+        call_command("backfill_verification_codes", stdout=StringIO())
+        self.assertFalse(Certificate.objects.filter(verification_code__isnull=True).exists())
@@ -1,11 +1,26 @@
+from django.conf import settings
 from django.urls import path
+from utils.responsecache import cache_response
 from . import views
 
 
 urlpatterns = [
     path("certificates/", views.CertificateListAPIView.as_view(), name="certificate-list"),
     path("certificate/create/", views.CertificateCreateAPIView.as_view(), name="certificate-create"),
-    path("certificate/detail/<int:pk>/", views.CertificateDetailAPIView.as_view(), name="certificate-detail"),
+    path(
+        "certificate/detail/<int:pk>/",
+        cache_response(**settings.RESPONSE_CACHE["views"]["certificate-detail"])(
+            views.CertificateDetailAPIView.as_view()
+        ),
+        name="certificate-detail",
+    ),
+    path(
+        "certificate/verify/<str:code>/",
+        cache_response(**settings.RESPONSE_CACHE["views"]["certificate-verify"])(
+            views.CertificateVerifyAPIView.as_view()
+        ),
+        name="certificate-verify",
+    ),
     path("certificate/update/<int:pk>/", views.CertificateUpdateAPIView.as_view(), name="certificate-update"),
     path("certificate/delete/<int:pk>/", views.CertificateDestroyAPIView.as_view(), name="certificate-destroy"),
     path(
@@ -13,4 +28,19 @@ urlpatterns = [
         views.CertificateIssueBatchAPIView.as_view(),
         name="certificate-issue-batch",
     ),
+    path(
+        "certificates/issue-batch/<int:pk>/",
+        views.IssuanceJobStatusAPIView.as_view(),
+        name="certificate-issue-batch-status",
+    ),
+    path(
+        "certificates/issue-batch/<int:pk>/certificates/",
+        views.IssuanceJobCertificatesAPIView.as_view(),
+        name="certificate-issue-batch-certificates",
+    ),
+    path(
+        "certificates/cohort/<int:pk>/bundle/",
+        views.CertificateBundleAPIView.as_view(),
+        name="certificate-cohort-bundle",
+    ),
 ]
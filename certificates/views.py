@@ -1,13 +1,34 @@
+import hashlib
+
 from rest_framework import generics
 from rest_framework.parsers import FormParser, MultiPartParser
-from rest_framework.permissions import IsAdminUser
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework import status
 from rest_framework.response import Response
-
-from .models import Certificate
-from .serializers import CertificateSerializer, CertificateIssueBatchSerializer, CertificateDetailSerializer
-
-from cohort_management.models import InternProfile, Cohort
+from rest_framework.views import APIView
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.http import quote_etag
+from django.utils.text import slugify
+
+from .bundles import certificate_entry, parse_range, stream_range, stream_zip, zip_size
+from .jobs import job_certificates, submit
+from .models import Certificate, IssuanceJob
+from .rendering import FORMATS, output_path, spec_of
+from .serializers import (
+    CertificateSerializer,
+    CertificateIssueBatchSerializer,
+    CertificateDetailSerializer,
+    CertificateListSerializer,
+    IssuanceJobSerializer,
+)
+
+from cohort_management.models import Cohort
+from utils.conditional import ConditionalGetMixin
+from utils.objectcache import CachedObjectMixin
+from user_management.pagination import CustomPagination
+from utils.planner import QueryPlanMixin
 
 
 class CertificateCreateAPIView(generics.CreateAPIView):
@@ -44,17 +65,15 @@ class CertificateCreateAPIView(generics.CreateAPIView):
 
 
 # Create your views here.
-class CertificateListAPIView(generics.ListAPIView):
+class CertificateListAPIView(QueryPlanMixin, generics.ListAPIView):
     """
     A view to list all certificates.
     """
-    serializer_class = CertificateDetailSerializer
+    queryset = Certificate.objects.all()
+    serializer_class = CertificateListSerializer
     permission_classes = [IsAdminUser]
     parser_classes = [MultiPartParser, FormParser]
 
-    def get_queryset(self):
-        return Certificate.objects.all()
-
     def list(self, request, *args, **kwargs):
         """
         Get a list of all certificates.
@@ -63,7 +82,7 @@ class CertificateListAPIView(generics.ListAPIView):
             Response: RESTful response with a list of certificates.
         """
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.serializer_class(queryset, many=True)
+        serializer = self.get_serializer(queryset, many=True)
         data = {
             "status": status.HTTP_200_OK,
             "success": True,
@@ -73,7 +92,7 @@ class CertificateListAPIView(generics.ListAPIView):
         return Response(data, status=status.HTTP_200_OK)
 
 
-class CertificateDetailAPIView(generics.RetrieveAPIView):
+class CertificateDetailAPIView(ConditionalGetMixin, CachedObjectMixin, generics.RetrieveAPIView):
     """
     A view to retrieve a cohort.
 
@@ -82,6 +101,8 @@ class CertificateDetailAPIView(generics.RetrieveAPIView):
     queryset = Certificate.objects.all()
     serializer_class = CertificateDetailSerializer
     parser_classes = [MultiPartParser, FormParser]
+    condition_fields = ("updated_at", "cohort__updated_at")
+    cached_related = ("cohort",)
 
     def retrieve(self, request, *args, **kwargs):
         """
@@ -93,9 +114,13 @@ class CertificateDetailAPIView(generics.RetrieveAPIView):
             **kwargs: Additional keyword arguments.
 
         Returns:
-            Response: RESTful response with the retrieved certificate.
+            Response: RESTful response with the retrieved certificate, or 304
+            if the client's copy is current.
         """
         instance = self.get_object()
+        not_modified = self.not_modified(instance)
+        if not_modified is not None:
+            return not_modified
         serializer = self.get_serializer(instance)
         data = {
             "status": status.HTTP_200_OK,
@@ -187,13 +212,13 @@ class CertificateIssueBatchAPIView(generics.CreateAPIView):
 
     def post(self, request):
         """
-        Issue certificates in batch to users.
+        Queue the issuance of certificates in batch to users.
 
         Args:
             request: The request object.
 
         Returns:
-            Response: RESTful response indicating the result of the issued operation.
+            Response: 202 with the issuance job, whose status URL is in the Location header.
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -209,6 +234,7 @@ class CertificateIssueBatchAPIView(generics.CreateAPIView):
             }
             return Response(data, status=status.HTTP_400_BAD_REQUEST)
 
+        cohort = None
         if cohort_id:
             try:
                 cohort = Cohort.objects.get(id=cohort_id)
@@ -219,20 +245,182 @@ class CertificateIssueBatchAPIView(generics.CreateAPIView):
                     "message": "Cohort does not exist"
                 }
                 return Response(data, status=status.HTTP_404_NOT_FOUND)
-            interns = InternProfile.objects.filter(cohort=cohort)
+
+        # Large cohorts outlast the request, so a worker issues them (see certificates/jobs.py)
+        job = submit(request.user, cohort=cohort, intern_ids=[] if cohort else intern_ids)
+
+        data = {
+            "status": status.HTTP_202_ACCEPTED,
+            "success": True,
+            "message": "Certificate issuance queued",
+            "data": IssuanceJobSerializer(job).data
+        }
+        location = reverse("certificate-issue-batch-status", kwargs={"pk": job.pk})
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={"Location": location})
+
+
+class IssuanceJobStatusAPIView(generics.RetrieveAPIView):
+    """
+    A view to follow a batch issuance.
+
+    Allows only authenticated admin users to see the progress and how many certificates were
+    issued so far.
+    """
+    queryset = IssuanceJob.objects.all()
+    serializer_class = IssuanceJobSerializer
+    permission_classes = [IsAdminUser]
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve the state of an issuance job.
+
+        Returns:
+            Response: RESTful response with the job's status, progress and counts so far.
+        """
+        serializer = self.get_serializer(self.get_object())
+        data = {
+            "status": status.HTTP_200_OK,
+            "success": True,
+            "message": "Issuance job retrieved successfully",
+            "data": serializer.data
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class IssuanceJobCertificatesAPIView(generics.ListAPIView):
+    """
+    A view to list the certificates a batch issuance has issued so far.
+
+    Allows only authenticated admin users. Pages through the certificates table, so a
+    large job is never read in one response.
+    """
+    serializer_class = CertificateListSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = CustomPagination
+    list_message = "Issued certificates"
+
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            return Certificate.objects.none()
+        job = get_object_or_404(IssuanceJob, pk=self.kwargs["pk"])
+        return job_certificates(job).order_by("id")
+
+
+class CertificateBundleAPIView(APIView):
+    """
+    A view to download every certificate of a cohort as one ZIP archive.
+
+    Allows only authenticated admin users. The archive is streamed as it is written, and
+    Range requests resume an interrupted download. Certificates are drawn beforehand by
+    `python manage.py render_certificates`, never in the request.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        """
+        Stream the cohort's rendered certificates.
+
+        Query parameters:
+            file_format: "png" (default) or "pdf".
+
+        Returns:
+            StreamingHttpResponse: the archive, or the requested part of it with 206,
+            or a 409 response while some certificates aren't rendered yet.
+        """
+        cohort = Cohort.objects.filter(pk=pk).first()
+        file_format = request.query_params.get("file_format", "png")
+        if cohort is None or file_format not in FORMATS:
+            data = {
+                "status": status.HTTP_404_NOT_FOUND,
+                "success": False,
+                "message": "Cohort does not exist" if cohort is None else "Unsupported file format"
+            }
+            return Response(data, status=status.HTTP_404_NOT_FOUND)
+
+        entries, missing = [], 0
+        certificates = Certificate.objects.filter(cohort=cohort, is_issued=True).select_related("cohort")
+        for certificate in certificates.iterator(chunk_size=2000):
+            path = output_path(spec_of(certificate, file_format))
+            if path.exists():
+                entries.append(certificate_entry(certificate, path))
+            else:
+                missing += 1
+        if missing:
+            # Drawing takes minutes for a large cohort, which is longer than a request may run
+            data = {
+                "status": status.HTTP_409_CONFLICT,
+                "success": False,
+                "message": f"{missing} certificates are not rendered yet, run render_certificates for this cohort",
+                "data": {"missing": missing, "rendered": len(entries)}
+            }
+            return Response(data, status=status.HTTP_409_CONFLICT)
+        entries.sort()
+
+        size = zip_size(entries)
+        # File names are content hashes, so the entries identify the archive's bytes
+        etag = quote_etag(hashlib.sha1("|".join(f"{e.name}:{e.path.name}" for e in entries).encode()).hexdigest())
+        byte_range = None
+        if request.headers.get("If-Range", etag) == etag:
+            try:
+                byte_range = parse_range(request.headers.get("Range", ""), size)
+            except ValueError:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+
+        if byte_range is None:
+            response = StreamingHttpResponse(stream_zip(entries), content_type="application/zip")
+            response["Content-Length"] = size
         else:
-            interns = InternProfile.objects.filter(id__in=intern_ids)
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                stream_range(stream_zip(entries), start, end),
+                content_type="application/zip",
+                status=status.HTTP_206_PARTIAL_CONTENT,
+            )
+            response["Content-Length"] = end - start + 1
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Accept-Ranges"] = "bytes"
+        response["ETag"] = etag
+        response["Content-Disposition"] = f'attachment; filename="{slugify(cohort.title)}-certificates.zip"'
+        return response
+
+
+class CertificateVerifyAPIView(APIView):
+    """
+    A view to check a certificate from the code on its public link.
 
-        certificates_issued = []
-        for intern in interns:
-            certificate = Certificate(user=intern.user, cohort=intern.cohort, is_issued=True)
-            certificate.save()
-            certificates_issued.append({'intern_id': intern.id, 'certificate_id': certificate.id})
+    Open to everyone and kept to one indexed lookup, since shared links get
+    bursts of traffic; anonymous responses are also served from the response
+    cache (see utils/responsecache.py).
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, code):
+        """
+        Verify a certificate.
 
+        Returns:
+            Response: whether the certificate is valid, with the intern's name, stack and cohort.
+        """
+        row = (
+            Certificate.objects.filter(verification_code=code.upper())
+            .values_list("is_issued", "intern_name", "stack", "cohort__title")
+            .first()
+        )
+        if row is None:
+            data = {
+                "status": status.HTTP_404_NOT_FOUND,
+                "success": False,
+                "message": "Certificate does not exist"
+            }
+            return Response(data, status=status.HTTP_404_NOT_FOUND)
+        is_issued, intern_name, stack, cohort = row
         data = {
             "status": status.HTTP_200_OK,
             "success": True,
-            "message": "Certificate issued successfully",
-            "certificates_issued": certificates_issued
+            "message": "Certificate verified" if is_issued else "Certificate has not been issued",
+            "data": {"valid": is_issued, "intern_name": intern_name, "stack": stack, "cohort": cohort}
         }
         return Response(data, status=status.HTTP_200_OK)
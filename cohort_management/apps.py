@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CohortManagementConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "cohort_management"
+
+    def ready(self):
+        import cohort_management.signals
@@ -0,0 +1,136 @@
+"""Typeahead over users and cohorts for the admin pickers.
+
+Each worker keeps a PrefixIndex per kind, built on the first lookup and kept
+current by the post_save/post_delete receivers in cohort_management.signals.
+Other workers' changes show up when the index is rebuilt after
+`AUTOCOMPLETE["max_age"]` seconds. When a kind has more keys than
+`AUTOCOMPLETE["max_keys"]` allows, lookups for it go to the database."""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from utils.prefix import PrefixIndex
+
+from .models import Cohort
+
+User = get_user_model()
+
+USER_FIELDS = ("id", "email", "first_name", "last_name")
+
+
+def user_entry(user) -> dict:
+    return {
+        "type": "user",
+        "id": str(user.id),
+        "label": f"{user.first_name} {user.last_name}".strip(),
+        "email": user.email,
+    }
+
+
+def user_keys(user) -> List[str]:
+    return [user.email, user.first_name, user.last_name, f"{user.first_name} {user.last_name}"]
+
+
+def cohort_entry(cohort) -> dict:
+    return {"type": "cohort", "id": str(cohort.id), "label": cohort.title}
+
+
+def cohort_keys(cohort) -> List[str]:
+    # Every word onwards, so "Backend" finds "Cohort 5 Backend"
+    words = cohort.title.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class Kind:
+    """How to load, index and query one kind of entry"""
+
+    def __init__(self, name, queryset, fields, entry, keys, lookups):
+        self.name = name
+        self.queryset = queryset
+        self.fields = fields
+        self.entry = entry
+        self.keys = keys
+        self.lookups = lookups
+
+    def search_database(self, prefix: str, limit: int) -> List[dict]:
+        query = Q()
+        for lookup in self.lookups:
+            query |= Q(**{lookup: prefix})
+        return [self.entry(obj) for obj in self.queryset().filter(query).only(*self.fields).order_by("id")[:limit]]
+
+
+KINDS = {
+    "user": Kind(
+        "user",
+        User.objects.all,
+        USER_FIELDS,
+        user_entry,
+        user_keys,
+        ("email__istartswith", "first_name__istartswith", "last_name__istartswith"),
+    ),
+    "cohort": Kind("cohort", Cohort.objects.all, ("id", "title"), cohort_entry, cohort_keys, ("title__icontains",)),
+}
+
+
+class Autocomplete:
+    def __init__(self, max_keys: int, max_age: float):
+        self.max_keys = max_keys
+        self.max_age = max_age
+        self._indexes: Dict[str, Optional[PrefixIndex]] = {}
+        self._built_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def build(self, kind: Kind) -> Optional[PrefixIndex]:
+        """Loads every entry of a kind, or returns None if they don't fit"""
+        index = PrefixIndex(self.max_keys)
+        for obj in kind.queryset().only(*kind.fields).iterator(chunk_size=2000):
+            if not index.add(obj.id, kind.entry(obj), kind.keys(obj)):
+                return None
+        return index
+
+    def get_index(self, kind: Kind) -> Optional[PrefixIndex]:
+        if time.monotonic() - self._built_at.get(kind.name, float("-inf")) > self.max_age:
+            with self._lock:
+                if time.monotonic() - self._built_at.get(kind.name, float("-inf")) > self.max_age:
+                    self._indexes[kind.name] = self.build(kind)
+                    self._built_at[kind.name] = time.monotonic()
+        return self._indexes[kind.name]
+
+    def lookup(self, prefix: str, kinds: List[str], limit: int) -> List[dict]:
+        results = []
+        for name in kinds:
+            kind = KINDS[name]
+            index = self.get_index(kind)
+            remaining = limit - len(results)
+            if index is None:
+                results.extend(kind.search_database(prefix, remaining))
+            else:
+                results.extend(index.lookup(prefix, remaining))
+        return results
+
+    def update(self, name: str, obj) -> None:
+        index = self._indexes.get(name)
+        if index is not None:
+            kind = KINDS[name]
+            if not index.add(obj.id, kind.entry(obj), kind.keys(obj)):
+                # Outgrown; the next lookup decides whether it still fits
+                self.reset(name)
+
+    def remove(self, name: str, obj_id) -> None:
+        index = self._indexes.get(name)
+        if index is not None:
+            index.remove(obj_id)
+
+    def reset(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            for kind in [name] if name else list(KINDS):
+                self._indexes.pop(kind, None)
+                self._built_at.pop(kind, None)
+
+
+autocomplete = Autocomplete(settings.AUTOCOMPLETE["max_keys"], settings.AUTOCOMPLETE["max_age"])
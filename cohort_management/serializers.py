@@ -1,9 +1,43 @@
 # cohort_management/serializers.py
 
 from rest_framework import serializers
+from user_management.serializers import UserSummarySerializer
+from utils.fieldsets import SparseFieldsetMixin
 from .models import Cohort, InternProfile
 
-class InternProfileSerializer(serializers.ModelSerializer):
+class CohortSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the Cohort model.
+
+    This serializer handles the conversion of Cohort model instances to JSON format and vice versa.
+    """
+
+    class Meta:
+        model = Cohort
+        fields = ['id', 'title', 'description', 'start_date', 'end_date', 'created_at', 'updated_at']
+
+
+    def validate_title(self, value):
+        """
+        Validate the title field.
+
+        This method ensures that the title provided is at least 10 characters long.
+        """
+        if len(value) < 5:
+            raise serializers.ValidationError("Title must be at least 5 characters long.")
+        return value
+
+    def validate_description(self, value):
+        """
+        Validate the description field.
+
+        This method ensures that the description provided is at least 10 characters long.
+        """
+        if len(value) < 10:
+            raise serializers.ValidationError("Description must be at least 10 characters long.")
+        return value
+
+class InternProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for the InternProfile model.
 
@@ -13,6 +47,7 @@ class InternProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = InternProfile
         fields = '__all__'
+        expandable_fields = {'user': UserSummarySerializer, 'cohort': CohortSerializer}
 
     def validate_role(self, value):
         """
@@ -35,34 +70,13 @@ class InternProfileSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Certificate ID must be a positive integer.")
         return value
 
-class CohortSerializer(serializers.ModelSerializer):
+class AutocompleteResultSerializer(serializers.Serializer):
     """
-    Serializer for the Cohort model.
+    Serializer for one autocomplete match.
 
-    This serializer handles the conversion of Cohort model instances to JSON format and vice versa.
+    Documents the entries of the autocomplete index; `email` is only set on users.
     """
-
-    class Meta:
-        model = Cohort
-        fields = ['id', 'title', 'description', 'start_date', 'end_date', 'created_at', 'updated_at']
-
-
-    def validate_title(self, value):
-        """
-        Validate the title field.
-
-        This method ensures that the title provided is at least 10 characters long.
-        """
-        if len(value) < 5:
-            raise serializers.ValidationError("Title must be at least 5 characters long.")
-        return value
-
-    def validate_description(self, value):
-        """
-        Validate the description field.
-
-        This method ensures that the description provided is at least 10 characters long.
-        """
-        if len(value) < 10:
-            raise serializers.ValidationError("Description must be at least 10 characters long.")
-        return value
+    type = serializers.ChoiceField(choices=['user', 'cohort'])
+    id = serializers.CharField()
+    label = serializers.CharField()
+    email = serializers.EmailField(required=False)
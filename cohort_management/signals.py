@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from utils.objectcache import object_cache
+
+from .autocomplete import USER_FIELDS, autocomplete
+from .models import Cohort, InternProfile
+
+User = get_user_model()
+
+object_cache.register(Cohort)
+object_cache.register(InternProfile, aliases=("user_id",))
+
+
+@receiver(post_save, sender=User)
+def update_user_autocomplete(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) & set(USER_FIELDS):
+        autocomplete.update("user", instance)
+
+
+@receiver(post_save, sender=Cohort)
+def update_cohort_autocomplete(sender, instance, **kwargs):
+    autocomplete.update("cohort", instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_user_autocomplete(sender, instance, **kwargs):
+    autocomplete.remove("user", instance.id)
+
+
+@receiver(post_delete, sender=Cohort)
+def remove_cohort_autocomplete(sender, instance, **kwargs):
+    autocomplete.remove("cohort", instance.id)
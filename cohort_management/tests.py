@@ -1,3 +1,179 @@
-from django.test import TestCase
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from notifications.signals import send_welcome_email
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .autocomplete import autocomplete
+from .models import Cohort, InternProfile
+from .views import CohortListAPIView
+
+User = get_user_model()
+post_save.disconnect(send_welcome_email, sender=User)
+
+
+class AutocompleteTestCase(APITestCase):
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+        self.admin = User.objects.create(
+            email="admin@internpulse.com",
+            username="admin",
+            first_name="Ada",
+            last_name="Admin",
+            role="admin",
+        )
+        refresh = RefreshToken.for_user(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {str(refresh.access_token)}")
+        self.intern = User.objects.create(
+            email="chinedu.okafor@gmail.com",
+            username="chinedu",
+            first_name="Chinedu",
+            last_name="Okafor",
+        )
+        self.cohort = Cohort.objects.create(
+            title="Cohort 5 Backend",
+            description="Backend track",
+            rules="Be kind",
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 3, 31),
+        )
+
+    def lookup(self, q, **params):
+        response = self.client.get(reverse("autocomplete"), {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row["type"], row["label"]) for row in response.json()["data"]]
+
+    def test_matches_emails_names_and_title_words(self):
+        self.assertEqual(self.lookup("chin"), [("user", "Chinedu Okafor")])
+        self.assertEqual(self.lookup("okaf"), [("user", "Chinedu Okafor")])
+        self.assertEqual(self.lookup("chinedu o"), [("user", "Chinedu Okafor")])
+        self.assertEqual(self.lookup("backend"), [("cohort", "Cohort 5 Backend")])
+        self.assertEqual(self.lookup("c", type="cohort"), [("cohort", "Cohort 5 Backend")])
+
+    def test_lookups_after_the_first_skip_the_database(self):
+        autocomplete.lookup("chi", ["user", "cohort"], 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(autocomplete.lookup("chi", ["user", "cohort"], 10)), 1)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.lookup("chin")
+        self.intern.first_name = "Obinna"
+        self.intern.save()
+        self.assertEqual(self.lookup("chinedu o"), [])
+        self.assertEqual(self.lookup("obin"), [("user", "Obinna Okafor")])
+        self.cohort.delete()
+        self.assertEqual(self.lookup("backend"), [])
+
+    def test_falls_back_to_database_when_too_large(self):
+        self.addCleanup(setattr, autocomplete, "max_keys", autocomplete.max_keys)
+        autocomplete.max_keys = 1
+        self.assertEqual(self.lookup("okaf"), [("user", "Chinedu Okafor")])
+        self.assertIsNone(autocomplete._indexes["user"])
+
+    def test_requires_admin(self):
+        refresh = RefreshToken.for_user(self.intern)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {str(refresh.access_token)}")
+        response = self.client.get(reverse("autocomplete"), {"q": "chin"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_documented_in_the_api_schema(self):
+        response = self.client.get("/api/v1/swagger/", {"format": "openapi"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("/autocomplete", response.json()["paths"])
+
+
+class InternProfileFieldsetTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            email="chinedu.okafor@gmail.com",
+            username="chinedu",
+            first_name="Chinedu",
+            last_name="Okafor",
+            role="admin",
+        )
+        self.cohort = Cohort.objects.create(
+            title="Cohort 5 Backend",
+            description="Backend track",
+            rules="Be kind",
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 3, 31),
+        )
+        InternProfile.objects.create(user=self.user, cohort=self.cohort, role="Backend developer")
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {str(refresh.access_token)}")
+
+    def test_expand_joins_relations_in_the_same_query(self):
+        url = reverse("intern-profile-list")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as expanded:
+            response = self.client.get(url, {"fields": "role", "expand": "user,cohort"})
+        self.assertEqual(len(expanded), len(plain))
+        data = response.json()["data"]
+        self.assertEqual(set(data[0]), {"role", "user", "cohort"})
+        self.assertEqual(data[0]["user"]["first_name"], "Chinedu")
+        self.assertEqual(data[0]["cohort"]["title"], "Cohort 5 Backend")
+
+    def test_relations_stay_keys_by_default(self):
+        data = self.client.get(reverse("intern-profile-list")).json()["data"]
+        self.assertEqual(data[0]["user"], self.user.id)
+        self.assertEqual(data[0]["cohort"], self.cohort.id)
+
+
+class CohortConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        admin = User.objects.create(email="admin@internpulse.com", username="admin", role="admin")
+        refresh = RefreshToken.for_user(admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {str(refresh.access_token)}")
+        self.cohort = Cohort.objects.create(
+            title="Cohort 5 Backend",
+            description="Backend track",
+            rules="Be kind",
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 3, 31),
+        )
+
+    def test_cohort_detail_answers_304_until_changed(self):
+        url = reverse("cohort-detail", kwargs={"pk": self.cohort.pk})
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.cohort.title = "Cohort 6 Backend"
+        self.cohort.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["title"], "Cohort 6 Backend")
+
+
+class CohortListCacheTestCase(APITestCase):
+    def setUp(self):
+        admin = User.objects.create(email="admin@internpulse.com", username="admin", role="admin")
+        refresh = RefreshToken.for_user(admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {str(refresh.access_token)}")
+        caches["objects"].clear()
+        self.cohort = Cohort.objects.create(
+            title="Cohort 5 Backend",
+            description="Backend track",
+            rules="Be kind",
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 3, 31),
+        )
+
+    def test_list_is_cached_until_a_cohort_changes(self):
+        url = reverse("cohort-list")
+        self.client.get(url)
+        with mock.patch.object(CohortListAPIView, "get_serializer") as get_serializer:
+            response = self.client.get(url)
+        get_serializer.assert_not_called()
+        self.assertEqual(response.json()["data"][0]["title"], "Cohort 5 Backend")
+        self.cohort.title = "Cohort 6 Backend"
+        self.cohort.save()
+        self.assertEqual(self.client.get(url).json()["data"][0]["title"], "Cohort 6 Backend")
@@ -2,6 +2,7 @@
 
 from django.urls import path
 from .views import (
+    AutocompleteAPIView,
     CohortListAPIView,
     CohortCreateAPIView,
     CohortRetrieveUpdateDestroyAPIView,
@@ -20,4 +21,7 @@ urlpatterns = [
     path('intern-profiles/', InternProfileListAPIView.as_view(), name='intern-profile-list'),
     path('intern-profiles/create/', InternProfileCreateAPIView.as_view(), name='intern-profile-create'),
     path('intern-profiles/<int:pk>/', InternProfileRetrieveUpdateDestroyAPIView.as_view(), name='intern-profile-detail'),
+
+    # Typeahead for the admin pickers
+    path('autocomplete', AutocompleteAPIView.as_view(), name='autocomplete'),
 ]
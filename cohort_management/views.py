@@ -1,9 +1,20 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from user_management.permissions import IsAdminPermission 
+from utils.conditional import ConditionalGetMixin
+from utils.objectcache import CachedObjectMixin
+from utils.planner import QueryPlanMixin
+from utils.singleflight import flights
+from utils.validators import get_response
+from .autocomplete import KINDS, autocomplete
 from .models import Cohort, InternProfile
-from .serializers import CohortSerializer, InternProfileSerializer
+from .serializers import AutocompleteResultSerializer, CohortSerializer, InternProfileSerializer
 
 class CohortListAPIView(generics.ListAPIView):
     """
@@ -22,13 +33,25 @@ class CohortListAPIView(generics.ListAPIView):
         Returns:
             Response: RESTful response with a list of cohorts.
         """
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
+        # Any create, update or delete changes the version, and with it the key
+        version = Cohort.objects.aggregate(count=Count("id"), last_id=Max("id"), updated=Max("updated_at"))
+        digest = hashlib.sha1(f"{version}|{request.get_full_path()}".encode()).hexdigest()
+        key = f"cohort-list:{digest}"
+        cache = caches[settings.OBJECT_CACHE["alias"]]
+
+        def compute():
+            queryset = self.filter_queryset(self.get_queryset())
+            serializer = self.get_serializer(queryset, many=True)
+            data = serializer.data
+            cache.set(key, data, settings.OBJECT_CACHE["timeout"])
+            return data
+
+        # Concurrent misses serialize the list once, see utils/singleflight.py
         data = {
             "status": 200,
             "success": True,
             "message": "Cohorts retrieved successfully",
-            "data": serializer.data
+            "data": flights.fill(key, lambda: cache.get(key), compute)
         }
         return Response(data)
 
@@ -65,7 +88,7 @@ class CohortCreateAPIView(generics.CreateAPIView):
             return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class CohortRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CohortRetrieveUpdateDestroyAPIView(ConditionalGetMixin, CachedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     A view to retrieve, update, or delete a cohort.
 
@@ -85,9 +108,13 @@ class CohortRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
             **kwargs: Additional keyword arguments.
 
         Returns:
-            Response: RESTful response with the retrieved cohort.
+            Response: RESTful response with the retrieved cohort, or 304 if the
+            client's copy is current.
         """
         instance = self.get_object()
+        not_modified = self.not_modified(instance)
+        if not_modified is not None:
+            return not_modified
         serializer = self.get_serializer(instance)
         data = {
             "status": status.HTTP_200_OK,
@@ -143,7 +170,7 @@ class CohortRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
         }
         return Response(data, status=status.HTTP_204_NO_CONTENT)
 
-class InternProfileListAPIView(generics.ListAPIView):
+class InternProfileListAPIView(QueryPlanMixin, generics.ListAPIView):
     """
     A view to list all intern profiles.
 
@@ -203,7 +230,7 @@ class InternProfileCreateAPIView(generics.CreateAPIView):
             return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class InternProfileRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class InternProfileRetrieveUpdateDestroyAPIView(CachedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     A view to retrieve, update, or delete an intern profile.
 
@@ -280,3 +307,33 @@ class InternProfileRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAP
             "message": "Intern profile deleted successfully"
         }
         return Response(data, status=status.HTTP_204_NO_CONTENT)
+
+class AutocompleteAPIView(generics.GenericAPIView):
+    """
+    As-you-type lookup of users and cohorts for the admin pickers.
+
+    Matches `q` against the start of user emails and names and of any word in
+    cohort titles. `type` narrows the lookup to `user` or `cohort`, and `limit`
+    caps the number of results (at most 50). Answers come from an in-memory
+    index, without a database query.
+    """
+    serializer_class = AutocompleteResultSerializer
+    permission_classes = [IsAuthenticated, IsAdminPermission]
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        """
+        Get the users and cohorts matching a prefix.
+
+        Returns:
+            Response: RESTful response with the matches in key order.
+        """
+        prefix = request.query_params.get("q", "")
+        kind = request.query_params.get("type")
+        kinds = [kind] if kind in KINDS else list(KINDS)
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), self.max_limit)
+        except ValueError:
+            limit = 10
+        results = autocomplete.lookup(prefix, kinds, max(limit, 1)) if prefix.strip() else []
+        return Response(get_response(status.HTTP_200_OK, "Autocomplete results", results))
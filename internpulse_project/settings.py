@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from datetime import timedelta
+import os
 from pathlib import Path
 from decouple import config
 
@@ -70,19 +71,29 @@ INSTALLED_APPS = [
     "reset_migrations"
 ]
 
+# The utils.middleware classes are the stock django middleware, skipped for
+# requests matching STATELESS_PATHS
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "user_management.invalidation.InvalidationMiddleware",
+    "utils.responsecache.ResponseCacheMiddleware",
+    "utils.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "utils.middleware.CsrfViewMiddleware",
+    "utils.middleware.AuthenticationMiddleware",
     "corsheaders.middleware.CorsMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "utils.middleware.MessageMiddleware",
+    "utils.middleware.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
 ]
 
+STATELESS_PATHS = {
+    "prefixes": ("/api/v1/",),
+    # google login relies on the session and swagger is browsed by humans
+    "exceptions": ("/api/v1/google/", "/api/v1/swagger/"),
+}
+
 ROOT_URLCONF = "internpulse_project.urls"
 
 TEMPLATES = [
@@ -125,11 +136,10 @@ DATABASES = {
 }
 
 REST_FRAMEWORK = {
+    # Dispatches on the Authorization scheme to our JWT authentication, token
+    # authentication (when rest_framework.authtoken is installed) or the session
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "user_management.backends.CustomJWTAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
-        "rest_framework.authentication.SessionAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user_management.backends.DispatchingAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.AllowAny",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -157,12 +167,23 @@ SIMPLE_JWT = {
     "SIGNING_KEY": SECRET_KEY,
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
-    "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
-    "REFRESH_TOKEN_CLASSES": ("user_management.MyRefreshToken",),
+    "AUTH_TOKEN_CLASSES": ("user_management.models.MyAccessToken",),
+    "REFRESH_TOKEN_CLASSES": ("user_management.models.MyRefreshToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
     "JTI_CLAIM": "jti",
 }
 
+# Set JWT_ALGORITHM to RS256 or EdDSA to sign with the rotating keys in JWT_KEYS_DIR
+# (see user_management/keys.py). HS algorithms use SIMPLE_JWT's SIGNING_KEY.
+JWT_KEYS = {
+    "algorithm": config("JWT_ALGORITHM", default="HS256"),
+    "directory": config("JWT_KEYS_DIR", default=str(BASE_DIR / "keys")),
+    "reload_interval": config("JWT_KEYS_RELOAD", default=60, cast=float),
+    "jwks_max_age": config("JWKS_MAX_AGE", default=300, cast=int),
+    # Should exceed jwks_max_age so verifiers see a new key before it signs anything
+    "activation_delay": config("JWT_KEYS_ACTIVATION_DELAY", default=600, cast=float),
+}
+
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 SWAGGER_SETTINGS = {
@@ -174,13 +195,116 @@ SWAGGER_SETTINGS = {
             "bearerFormat": "JWT",
         },
     },
+    # Served outside the session, so it can be cached (see internpulse_project/urls.py)
+    "SPEC_URL": "schema-json",
 }
 OTP = {
     "expiry": config("OTP_EXPIRY", cast=float),
     "length": config("OTP_LENGTH", cast=int),
 }
+REVOCATION_FILTER = {
+    "enabled": config("REVOCATION_FILTER_ENABLED", default=True, cast=bool),
+    "capacity": config("REVOCATION_FILTER_CAPACITY", default=100000, cast=int),
+    "error_rate": config("REVOCATION_FILTER_ERROR_RATE", default=0.001, cast=float),
+    "refresh_interval": config("REVOCATION_FILTER_REFRESH", default=5, cast=float),
+}
+PRINCIPAL_CACHE = {
+    "maxsize": config("PRINCIPAL_CACHE_SIZE", default=10000, cast=int),
+    "ttl": config("PRINCIPAL_CACHE_TTL", default=30, cast=float),
+}
+# Password hashes are computed on a bounded pool per process (see utils/hashing.py).
+# The scrypt cost can be fitted to the hardware with `manage.py calibrate_hasher`
+PASSWORD_HASHING = {
+    "workers": config("PASSWORD_HASHING_WORKERS", default=os.cpu_count() or 2, cast=int),
+    "max_queue": config("PASSWORD_HASHING_MAX_QUEUE", default=16, cast=int),
+    "scrypt": {
+        "work_factor": config("SCRYPT_WORK_FACTOR", default=2**15, cast=int),
+        "block_size": config("SCRYPT_BLOCK_SIZE", default=8, cast=int),
+        "parallelism": config("SCRYPT_PARALLELISM", default=1, cast=int),
+    },
+}
+# last_login updates and outstanding refresh tokens from logins are buffered and
+# written in bulk (see user_management/bookkeeping.py)
+WRITE_BEHIND = {
+    "enabled": config("WRITE_BEHIND_ENABLED", default=True, cast=bool),
+    "max_size": config("WRITE_BEHIND_MAX_SIZE", default=500, cast=int),
+    "interval": config("WRITE_BEHIND_INTERVAL", default=0.25, cast=float),
+}
+# Per worker typeahead index for /api/v1/autocomplete (see cohort_management/autocomplete.py)
+AUTOCOMPLETE = {
+    "max_keys": config("AUTOCOMPLETE_MAX_KEYS", default=500000, cast=int),
+    "max_age": config("AUTOCOMPLETE_MAX_AGE", default=300, cast=float),
+}
+# "objects" is shared by the workers on a host and backs the model cache in
+# utils/objectcache.py, in front of which each worker keeps a small LRU
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "objects": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config("OBJECT_CACHE_DIR", default=str(BASE_DIR / "cache" / "objects")),
+        "TIMEOUT": config("OBJECT_CACHE_TIMEOUT", default=600, cast=int),
+        "OPTIONS": {"MAX_ENTRIES": config("OBJECT_CACHE_MAX_ENTRIES", default=100000, cast=int)},
+    },
+}
+OBJECT_CACHE = {
+    "alias": "objects",
+    "maxsize": config("OBJECT_CACHE_SIZE", default=10000, cast=int),
+    "ttl": config("OBJECT_CACHE_TTL", default=5, cast=float),
+    "timeout": config("OBJECT_CACHE_TIMEOUT", default=600, cast=int),
+    "hold": config("OBJECT_CACHE_HOLD", default=5, cast=float),
+}
+# Workers publish the cache keys they drop to a table that every worker polls,
+# so per-process caches follow writes made elsewhere (see user_management/invalidation.py)
+INVALIDATION_BUS = {
+    "enabled": config("INVALIDATION_BUS_ENABLED", default=True, cast=bool),
+    "poll_interval": config("INVALIDATION_BUS_POLL_INTERVAL", default=1, cast=float),
+    "overlap": config("INVALIDATION_BUS_OVERLAP", default=10, cast=float),
+    "retention": config("INVALIDATION_BUS_RETENTION", default=3600, cast=float),
+}
+# Concurrent misses on the same cache key wait for one computation instead of
+# repeating it, up to "timeout" seconds (see utils/singleflight.py)
+SINGLE_FLIGHT = {
+    "timeout": config("SINGLE_FLIGHT_TIMEOUT", default=5, cast=float),
+    "lease": config("SINGLE_FLIGHT_LEASE", default=10, cast=float),
+    "poll": config("SINGLE_FLIGHT_POLL", default=0.01, cast=float),
+    "lock_dir": config("SINGLE_FLIGHT_LOCK_DIR", default=str(BASE_DIR / "cache" / "leases")),
+}
+# Whole responses of the public read views, served stale for up to "stale"
+# seconds past "ttl" while they're rendered again (see utils/responsecache.py)
+RESPONSE_CACHE = {
+    "enabled": config("RESPONSE_CACHE_ENABLED", default=True, cast=bool),
+    "alias": "objects",
+    "refresh_workers": config("RESPONSE_CACHE_REFRESH_WORKERS", default=2, cast=int),
+    "refresh_lease": 30,
+    "views": {
+        "certificate-detail": {"ttl": 30, "stale": 300},
+        # Verification links get shared. A revoked or deleted certificate can keep
+        # verifying for up to ttl + stale seconds (65 minutes), also in downstream caches
+        "certificate-verify": {"ttl": 3600, "stale": 300},
+        "swagger-spec": {"ttl": 300, "stale": 3600},
+    },
+}
+# Batch certificate issuance runs in `run_issuance_worker` processes, "chunk_size"
+# interns per transaction; a job whose worker is silent for "lease" seconds is
+# taken over (see certificates/jobs.py)
+CERTIFICATE_JOBS = {
+    "chunk_size": config("CERTIFICATE_JOBS_CHUNK_SIZE", default=500, cast=int),
+    "lease": config("CERTIFICATE_JOBS_LEASE", default=60, cast=float),
+    "poll_interval": config("CERTIFICATE_JOBS_POLL_INTERVAL", default=1, cast=float),
+}
 WORKER_ID = config("WORKER_ID", cast=int)
 DATACENTER_ID = config("DATACENTER_ID", cast=int)
+# New hashes use the first hasher; hashes made with the others are upgraded on login
+PASSWORD_HASHERS = [
+    "utils.hashers.ScryptPasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -227,6 +351,16 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media/"
 
+# Certificate files drawn with Pillow, named after a hash of their contents
+# (see certificates/rendering.py). Without a template or font, a plain page
+# and Pillow's built-in font are used; "workers" 0 means one per core
+CERTIFICATE_RENDERING = {
+    "template": config("CERTIFICATE_TEMPLATE", default=""),
+    "font": config("CERTIFICATE_FONT", default=""),
+    "output_dir": config("CERTIFICATE_OUTPUT_DIR", default=str(MEDIA_ROOT / "certificates" / "rendered")),
+    "workers": config("CERTIFICATE_RENDER_WORKERS", default=0, cast=int),
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -242,7 +376,8 @@ REST_AUTH = {
     "JWT_AUTH_HTTPONLY": False,
     "USE_JWT": True,
     "TOKEN_MODEL": None,
-    "JWT_SERIALIZER": "user_management.serializers.SocialLoginSerializer"
+    "JWT_SERIALIZER": "user_management.serializers.SocialLoginSerializer",
+    "JWT_TOKEN_CLAIMS_SERIALIZER": "user_management.serializers.SocialTokenClaimsSerializer",
 
 }
 
@@ -7,4 +7,13 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
-DEBUG = True
\ No newline at end of file
+DEBUG = True
+
+# Tests run in transactions the flush thread can't see into
+WRITE_BEHIND = {**WRITE_BEHIND, "enabled": False}
+# Tests are one process; InvalidationBusTestCase builds its own buses
+INVALIDATION_BUS = {**INVALIDATION_BUS, "enabled": False}
+RESPONSE_CACHE = {**RESPONSE_CACHE, "enabled": False}
+
+# Keep cached objects in memory so test runs don't share them
+CACHES = {**CACHES, "objects": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "objects"}}
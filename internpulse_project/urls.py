@@ -7,6 +7,7 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 from user_management.views import UserRedirectView
+from utils.responsecache import cache_response
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -25,6 +26,16 @@ urlpatterns = [
         schema_view.with_ui("swagger", cache_timeout=0),
         name="schema-swagger-ui",
     ),
+    # The document the UI loads (SWAGGER_SETTINGS["SPEC_URL"]); the UI pages
+    # themselves depend on the session, so only this one is cached
+    path(
+        "api/v1/swagger.json",
+        cache_response(**settings.RESPONSE_CACHE["views"]["swagger-spec"])(
+            schema_view.without_ui(cache_timeout=0)
+        ),
+        {"format": ".json"},
+        name="schema-json",
+    ),
     path("admin/", admin.site.urls),
     path("~redirect/", UserRedirectView.as_view(), name="redirect"),
     # path("api/v1/", include('allauth.urls')), # We're not using the google login so disabled for now
@@ -1,44 +1,133 @@
 """A wrapper class around the default JWTAuthentication class to check 
-if the token is blacklisted before authenticating the user"""
+if the token is blacklisted before authenticating the user, and the
+authenticator that dispatches each request to the right backend"""
 
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from rest_framework import HTTP_HEADER_ENCODING
+from rest_framework.authentication import (
+    BaseAuthentication,
+    SessionAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
 from rest_framework.exceptions import AuthenticationFailed
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.authentication import AUTH_HEADER_TYPES, JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
 from utils.validators import RestValidationError
-from .models import BLToken
+from .models import TOKEN_VERSION_CLAIM, BLToken
+from .principals import principal_cache
+from .revocation import revocation_filter
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def token_errors():
+    """Turns any token failure into our 401 response"""
+    try:
+        yield
+    except RestValidationError:
+        raise
+    except Exception as e:
+        logger.debug("Rejected token: %s", e)
+        raise RestValidationError(
+            "Token Error",
+            {
+                "auth": ["Invalid or expired token"]
+            },
+            401,
+            success = False
+        )
 
 
 class CustomJWTAuthentication(JWTAuthentication):
     """Custom JWT authentication, same as the one provided by rest_framework simplejwt except
-    that it checks for any blacklisted access token first"""
+    that it checks for any blacklisted access token first. Resolved users and blacklist
+    verdicts are cached per token so repeat requests don't touch the database"""
 
     def authenticate(self, request):
         """Checks if the token was recently blacklisted"""
-        result = None
-        try:
-            result = super().authenticate(request)
-        except Exception as e:
-            print(e)
+        with token_errors():
+            return super().authenticate(request)
+
+    def authenticate_token(self, raw_token: bytes):
+        """Authenticates a token already taken out of the Authorization header"""
+        with token_errors():
+            validated_token = self.get_validated_token(raw_token)
+            return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        """Resolves the token's user from the principal cache, falling back to the
+        database and the blacklist on a miss"""
+        jti = validated_token[api_settings.JTI_CLAIM]
+        principal = principal_cache.get(jti)
+        if principal is None:
+            user = super().get_user(validated_token)
+            blacklisted = revocation_filter.might_contain(jti) and BLToken.objects.filter(jti=jti).exists()
+            principal = principal_cache.set(jti, user, blacklisted)
+        else:
+            user = principal.as_user()
+        if validated_token.get(TOKEN_VERSION_CLAIM, 0) != principal.token_version:
             raise RestValidationError(
-                "Token Error",
+                "Token Errors",
                 {
-                    "auth": ["Invalid or expired token"]
+                    "auth": ["Token has been revoked"]
                 },
                 401,
                 success = False
             )
-        header = self.get_header(request)
-        if result:
-            token = self.get_raw_token(header).decode("utf-8")
-            if BLToken.objects.filter(token=token).exists():
-                raise RestValidationError(
-                    "Token Errors",
-                    {
-                        "auth": ["Token is blacklisted"]
-                    },
-                    401,
-                    success = False
-                )
-        return result
+        if principal.blacklisted:
+            raise RestValidationError(
+                "Token Errors",
+                {
+                    "auth": ["Token is blacklisted"]
+                },
+                401,
+                success = False
+            )
+        return user
+
+
+class DispatchingAuthentication(BaseAuthentication):
+    """Reads the Authorization scheme once and hands the request to exactly one
+    authenticator instead of trying every configured class in turn. Requests
+    without credentials only fall back to session authentication when they
+    carry a session cookie and went through the session middleware"""
+
+    def __init__(self):
+        self.jwt = CustomJWTAuthentication()
+        self.schemes = {scheme.lower().encode(HTTP_HEADER_ENCODING) for scheme in AUTH_HEADER_TYPES}
+        self.token = None
+        if "rest_framework.authtoken" in settings.INSTALLED_APPS:
+            self.token = TokenAuthentication()
+
+    def authenticate(self, request):
+        header = get_authorization_header(request)
+        if header:
+            parts = header.split()
+            scheme = parts[0].lower()
+            if scheme in self.schemes:
+                if len(parts) != 2:
+                    raise RestValidationError(
+                        "Token Error",
+                        {
+                            "auth": ["Authorization header must contain two space-delimited values"]
+                        },
+                        401,
+                        success = False
+                    )
+                return self.jwt.authenticate_token(parts[1])
+            if scheme == b"token" and self.token is not None:
+                return self.token.authenticate(request)
+            return None
+        if getattr(request._request, "user", None) is not None and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return SessionAuthentication().authenticate(request)
+        return None
+
+    def authenticate_header(self, request):
+        return self.jwt.authenticate_header(request)
@@ -0,0 +1,55 @@
+"""Write-behind bookkeeping for the login path. Each login would otherwise
+cost an UPDATE for `last_login` and an INSERT for the refresh token's
+`OutstandingToken` row; both are buffered here and written in bulk by
+`utils.writebehind.WriteBehindBuffer`. Neither write is needed to serve
+later requests: `last_login` is informational and `blacklist()` creates a
+missing outstanding token row itself."""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from utils.writebehind import WriteBehindBuffer
+
+User = get_user_model()
+
+
+def save_last_logins(users) -> None:
+    User.objects.bulk_update(users, ["last_login"])
+
+
+def save_outstanding_tokens(tokens) -> None:
+    OutstandingToken.objects.bulk_create(tokens, ignore_conflicts=True)
+
+
+last_logins = WriteBehindBuffer(save_last_logins, **settings.WRITE_BEHIND)
+outstanding_tokens = WriteBehindBuffer(save_outstanding_tokens, **settings.WRITE_BEHIND)
+
+
+def record_login(user) -> None:
+    """Buffered replacement for `django.contrib.auth.models.update_last_login`"""
+    user.last_login = timezone.now()
+    last_logins.add(user.pk, User(pk=user.pk, last_login=user.last_login))
+
+
+def record_outstanding_token(token, user) -> None:
+    """Buffered replacement for the insert in `BlacklistMixin.for_user`"""
+    jti = token[api_settings.JTI_CLAIM]
+    outstanding_tokens.add(
+        jti,
+        OutstandingToken(
+            user=user,
+            jti=jti,
+            token=str(token),
+            created_at=token.current_time,
+            expires_at=datetime_from_epoch(token["exp"]),
+        ),
+    )
+
+
+def flush() -> None:
+    last_logins.flush()
+    outstanding_tokens.flush()
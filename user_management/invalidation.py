@@ -0,0 +1,132 @@
+"""Keeps the per-process caches of every worker, on every node, coherent.
+
+Whoever drops a cache entry also appends its key to the `CacheInvalidation`
+table under a channel name. Each worker polls the table at most every
+`INVALIDATION_BUS["poll_interval"]` seconds, from InvalidationMiddleware at
+the start of a request, and hands the new keys to the callbacks subscribed
+to their channel. Between polls a request pays one clock read.
+
+The autoincrement id is the cursor, but a row can commit after rows with
+higher ids have been read, so each poll also re-reads the last
+`INVALIDATION_BUS["overlap"]` seconds and skips the ids it has already
+seen. Rows older than `INVALIDATION_BUS["retention"]` are pruned; a worker
+that went longer than that without polling may have missed some, so its
+subscribers are told to drop everything (the callback gets None)."""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import CacheInvalidation
+
+
+class InvalidationBus:
+    def __init__(self, poll_interval: float, overlap: float, retention: float, enabled: bool = True):
+        self.poll_interval = poll_interval
+        self.overlap = timedelta(seconds=overlap)
+        self.retention = retention
+        self.enabled = enabled
+        self._subscribers: Dict[str, List[Callable]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._last_id: Optional[int] = None
+        # Ids inside the overlap window that were already applied or are our own
+        self._seen: Dict[int, object] = {}
+        self._polled_at = 0.0
+        self._pruned_at = 0.0
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, channel: str, callback: Callable[[Optional[List[str]]], None]) -> None:
+        self._subscribers[channel].append(callback)
+
+    def publish(self, channel: str, keys: Iterable) -> None:
+        """Tells the other workers to evict `keys`. Inside a transaction, they
+        only see it once it commits"""
+        if not self.enabled:
+            return
+        rows = CacheInvalidation.objects.bulk_create(
+            [CacheInvalidation(channel=channel, key=str(key)) for key in keys]
+        )
+        with self._lock:
+            for row in rows:
+                # Backends that can't return ids leave it None; we then evict our own keys again
+                if row.id is not None:
+                    self._seen[row.id] = row.created_at
+        self.published += len(rows)
+
+    def poll(self, force: bool = False) -> None:
+        if not self.enabled or (not force and time.monotonic() - self._polled_at < self.poll_interval):
+            return
+        with self._lock:
+            if self._last_id is None or time.monotonic() - self._polled_at > self.retention:
+                self._restart()
+            else:
+                self._read()
+            self._polled_at = time.monotonic()
+            if self._polled_at - self._pruned_at > self.retention / 10:
+                CacheInvalidation.objects.filter(
+                    created_at__lt=timezone.now() - timedelta(seconds=self.retention)
+                ).delete()
+                self._pruned_at = self._polled_at
+
+    def _restart(self) -> None:
+        if self._last_id is not None:
+            self._deliver({channel: None for channel in self._subscribers})
+        self._last_id = CacheInvalidation.objects.aggregate(last=Max("id"))["last"] or 0
+        # What's already in the log happened before our caches were filled
+        self._seen = dict(
+            CacheInvalidation.objects.filter(created_at__gte=timezone.now() - self.overlap).values_list(
+                "id", "created_at"
+            )
+        )
+
+    def _read(self) -> None:
+        since = timezone.now() - self.overlap
+        rows = (
+            CacheInvalidation.objects.filter(Q(id__gt=self._last_id) | Q(created_at__gte=since))
+            .order_by("id")
+            .values_list("id", "channel", "key", "created_at")
+        )
+        keys = defaultdict(list)
+        for row_id, channel, key, created_at in rows:
+            self._last_id = max(self._last_id, row_id)
+            if row_id in self._seen:
+                continue
+            self._seen[row_id] = created_at
+            keys[channel].append(key)
+        self._seen = {row_id: created_at for row_id, created_at in self._seen.items() if created_at >= since}
+        self._deliver(keys)
+
+    def _deliver(self, keys: Dict[str, Optional[List[str]]]) -> None:
+        for channel, channel_keys in keys.items():
+            self.received += len(channel_keys or ())
+            for callback in self._subscribers.get(channel, ()):
+                callback(channel_keys)
+
+    def stats(self) -> Dict[str, object]:
+        return {"published": self.published, "received": self.received, "last_id": self._last_id}
+
+
+class InvalidationMiddleware:
+    """Applies other workers' invalidations before the request touches a cache"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        bus.poll()
+        return self.get_response(request)
+
+
+bus = InvalidationBus(
+    settings.INVALIDATION_BUS["poll_interval"],
+    settings.INVALIDATION_BUS["overlap"],
+    settings.INVALIDATION_BUS["retention"],
+    settings.INVALIDATION_BUS["enabled"],
+)
@@ -0,0 +1,187 @@
+"""Asymmetric JWT signing with key rotation.
+
+When `JWT_KEYS["algorithm"]` is an asymmetric algorithm (RS256/384/512,
+ES256/384/512 or EdDSA), tokens are signed with a private key from
+`JWT_KEYS["directory"]` and carry its id in the `kid` header. Every key in
+the directory is published through the JWKS endpoint, so other services can
+verify tokens offline, and tokens signed with an older key keep verifying
+until that key file is removed. Keys are created and retired with the
+`rotate_jwt_keys` management command. With an HS algorithm the default
+simplejwt backend and `SIMPLE_JWT` settings are used unchanged."""
+
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import get_default_algorithms
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+ASYMMETRIC_ALGORITHMS = {"RS256", "RS384", "RS512", "ES256", "ES384", "ES512", "EdDSA"}
+EC_CURVES = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}
+
+
+class SigningKey(NamedTuple):
+    kid: str
+    private_key: object
+    created: float
+
+    @property
+    def public_key(self):
+        return self.private_key.public_key()
+
+
+def generate_private_key(algorithm: str):
+    """Creates a new private key suitable for the given algorithm"""
+    if algorithm.startswith(("RS", "PS")):
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm in EC_CURVES:
+        return ec.generate_private_key(EC_CURVES[algorithm]())
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"{algorithm} is not an asymmetric algorithm")
+
+
+def write_private_key(directory: Path, kid: str, private_key) -> Path:
+    """Stores a private key as `<kid>.pem`, readable only by its owner"""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{kid}.pem"
+    path.write_bytes(
+        private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    path.chmod(0o600)
+    return path
+
+
+class KeyRing:
+    """The signing keys found on disk. A new key is published straight away but
+    only used for signing once it is `activation_delay` seconds old, which gives
+    verifiers time to pick it up from the JWKS endpoint"""
+
+    def __init__(self, directory: Path, activation_delay: float = 0):
+        self.directory = Path(directory)
+        self.activation_delay = activation_delay
+        self.keys: Dict[str, SigningKey] = {}
+        if self.directory.is_dir():
+            for path in sorted(self.directory.glob("*.pem")):
+                private_key = serialization.load_pem_private_key(path.read_bytes(), password=None)
+                self.keys[path.stem] = SigningKey(path.stem, private_key, path.stat().st_mtime)
+
+    @property
+    def active(self) -> Optional[SigningKey]:
+        """The newest key old enough to sign with, or the oldest key while none is"""
+        if not self.keys:
+            return None
+        keys = sorted(self.keys.values(), key=lambda key: (key.created, key.kid))
+        ready = [key for key in keys if time.time() - key.created >= self.activation_delay]
+        return ready[-1] if ready else keys[0]
+
+    def jwks(self, algorithm: str) -> Dict[str, List[dict]]:
+        """Renders the public half of every key as a JSON Web Key Set"""
+        jwk_algorithm = get_default_algorithms()[algorithm]
+        keys = []
+        for kid in sorted(self.keys, reverse=True):
+            jwk = jwk_algorithm.to_jwk(self.keys[kid].public_key, as_dict=True)
+            jwk.update({"kid": kid, "alg": algorithm, "use": "sig"})
+            keys.append(jwk)
+        return {"keys": keys}
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """simplejwt token backend that signs with the key ring's active key and
+    verifies with whichever key the token's `kid` header names"""
+
+    def __init__(self, algorithm: str, directory: Path, reload_interval: float, activation_delay: float, **kwargs):
+        super().__init__(algorithm, **kwargs)
+        self.directory = Path(directory)
+        self.reload_interval = reload_interval
+        self.activation_delay = activation_delay
+        self._lock = threading.Lock()
+        self._keyring = None
+        self._loaded_at = 0.0
+
+    def _validate_algorithm(self, algorithm: str) -> None:
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            super()._validate_algorithm(algorithm)
+
+    def get_keyring(self, force: bool = False) -> KeyRing:
+        if force or self._keyring is None or time.monotonic() - self._loaded_at > self.reload_interval:
+            with self._lock:
+                self._keyring = KeyRing(self.directory, self.activation_delay)
+                self._loaded_at = time.monotonic()
+        return self._keyring
+
+    def encode(self, payload: Dict) -> str:
+        signing_key = self.get_keyring().active
+        if signing_key is None:
+            raise TokenBackendError(_("No JWT signing key is configured"))
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload["aud"] = self.audience
+        if self.issuer is not None:
+            jwt_payload["iss"] = self.issuer
+        return jwt.encode(
+            jwt_payload,
+            signing_key.private_key,
+            algorithm=self.algorithm,
+            headers={"kid": signing_key.kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def get_verifying_key(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError(_("Token is invalid or expired")) from ex
+        signing_key = self.get_keyring().keys.get(kid)
+        if signing_key is None and time.monotonic() - self._loaded_at > 1:
+            # The key may have been rotated in since we last looked. The reload is
+            # throttled so tokens with made up kids can't keep us reading the disk
+            signing_key = self.get_keyring(force=True).keys.get(kid)
+        if signing_key is None:
+            raise TokenBackendError(_("Token is invalid or expired"))
+        return signing_key.public_key
+
+
+_backend = None
+
+
+def get_token_backend() -> TokenBackend:
+    """Returns the token backend selected by the JWT_KEYS setting"""
+    global _backend
+    if _backend is None:
+        if settings.JWT_KEYS["algorithm"] in ASYMMETRIC_ALGORITHMS:
+            _backend = KeyRingTokenBackend(
+                settings.JWT_KEYS["algorithm"],
+                settings.JWT_KEYS["directory"],
+                settings.JWT_KEYS["reload_interval"],
+                settings.JWT_KEYS["activation_delay"],
+                audience=api_settings.AUDIENCE,
+                issuer=api_settings.ISSUER,
+                leeway=api_settings.LEEWAY,
+                json_encoder=api_settings.JSON_ENCODER,
+            )
+        else:
+            from rest_framework_simplejwt.state import token_backend
+
+            _backend = token_backend
+    return _backend
+
+
+class KeyRingTokenMixin:
+    """Makes a simplejwt token class use the backend from `get_token_backend`"""
+
+    @property
+    def token_backend(self) -> TokenBackend:
+        return get_token_backend()
@@ -0,0 +1,109 @@
+"""Measures the per request cost of authenticating a JWT request
+
+    python manage.py benchmark_auth --revoked 10000 --iterations 2000
+"""
+
+from datetime import timedelta
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.test import APIRequestFactory
+
+from user_management.backends import CustomJWTAuthentication, DispatchingAuthentication
+from user_management.models import BLToken, MyRefreshToken
+from user_management.principals import principal_cache
+from user_management.revocation import revocation_filter
+from utils.benchmark import format_result, measure, throwaway_database
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Benchmarks JWT authentication against a populated token blacklist and compares authentication class setups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--revoked", type=int, default=10000, help="Blacklisted tokens to seed")
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            user = User(
+                email="bench@internpulse.com",
+                username="bench@internpulse.com",
+                first_name="Bench",
+                last_name="User",
+                password=make_password(None),
+            )
+            User.objects.bulk_create([user])
+            expires_at = timezone.now() + timedelta(hours=1)
+            BLToken.objects.bulk_create(
+                [
+                    BLToken(jti=uuid4().hex, expires_at=expires_at, user=user)
+                    for _ in range(options["revoked"])
+                ],
+                batch_size=1000,
+            )
+            token = str(MyRefreshToken.for_user(user).access_token)
+            request = Request(APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"JWT {token}"))
+            authenticator = CustomJWTAuthentication()
+
+            def authenticate():
+                authenticator.authenticate(request)
+
+            def authenticate_uncached():
+                principal_cache.clear()
+                authenticator.authenticate(request)
+
+            self.stdout.write(f"{options['revoked']} blacklisted tokens, {options['iterations']} requests")
+            enabled = revocation_filter.enabled
+            try:
+                revocation_filter.enabled = False
+                before = measure(authenticate_uncached, options["iterations"])
+                revocation_filter.enabled = True
+                revocation_filter.reset()
+                filtered = measure(authenticate_uncached, options["iterations"])
+                principal_cache.clear()
+                cached = measure(authenticate, options["iterations"])
+            finally:
+                revocation_filter.enabled = enabled
+                revocation_filter.reset()
+            self.stdout.write(format_result("blacklist query on every request", before))
+            self.stdout.write(format_result("revocation filter", filtered))
+            self.stdout.write(format_result("revocation filter + principal cache", cached))
+            self.stdout.write(f"principal cache: {principal_cache.stats()}")
+
+            self.stdout.write("\nAuthentication classes, per request (cached principal)")
+            chain = [
+                CustomJWTAuthentication(),
+                TokenAuthentication(),
+                SessionAuthentication(),
+                JWTAuthentication(),
+            ]
+            dispatcher = [DispatchingAuthentication()]
+            for label, headers in (("JWT", {"HTTP_AUTHORIZATION": f"JWT {token}"}), ("anonymous", {})):
+                for stack, authenticators in (("sequential chain", chain), ("dispatcher", dispatcher)):
+                    result = measure(self.resolver(headers, authenticators), options["iterations"])
+                    self.stdout.write(format_result(f"{label} request, {stack}", result))
+
+    def resolver(self, headers, authenticators):
+        """Returns a callable that authenticates a fresh request the way a view would,
+        with the session and auth middleware already applied"""
+        factory = APIRequestFactory()
+        session = SessionMiddleware(lambda request: None)
+        auth = AuthenticationMiddleware(lambda request: None)
+
+        def resolve():
+            django_request = factory.get("/api/v1/profile", **headers)
+            session.process_request(django_request)
+            auth.process_request(django_request)
+            Request(django_request, authenticators=authenticators).user
+
+        return resolve
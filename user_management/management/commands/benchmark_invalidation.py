@@ -0,0 +1,92 @@
+"""Measures how long other worker processes serve a stale cached object after
+a write, with invalidations going through the database log
+
+    python manage.py benchmark_invalidation --workers 4 --rounds 20
+"""
+
+import multiprocessing
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from user_management.invalidation import InvalidationBus
+from utils.benchmark import format_result, measure, throwaway_database
+from utils.objectcache import object_cache
+
+User = get_user_model()
+
+
+def new_bus(poll_interval: float) -> InvalidationBus:
+    bus = InvalidationBus(poll_interval=poll_interval, overlap=10, retention=3600)
+    object_cache.connect_bus(bus)
+    bus.poll(force=True)
+    return bus
+
+
+def reader(user_id: int, rounds: int, poll_interval: float, ready, results) -> None:
+    """One worker: serves the user from its cache and reports when each new
+    name shows up"""
+    connections.close_all()
+    object_cache.clear()
+    bus = new_bus(poll_interval)
+    object_cache.get(User, user_id)
+    ready.put(True)
+    expected = 0
+    while expected < rounds:
+        bus.poll()
+        if object_cache.get(User, user_id).first_name == f"round {expected}":
+            results.put((expected, time.time()))
+            expected += 1
+        time.sleep(0.001)
+
+
+class Command(BaseCommand):
+    help = "Measures cross-process cache staleness and polling cost of the invalidation log"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument("--poll-interval", type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        workers, rounds, poll_interval = options["workers"], options["rounds"], options["poll_interval"]
+        with throwaway_database(shared=True):
+            user = User(email="bench@internpulse.com", username="bench", first_name="Bench")
+            User.objects.bulk_create([user])
+            # The readers open their own connections to the database
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            ready, results = context.Queue(), context.Queue()
+            processes = [
+                context.Process(target=reader, args=(user.pk, rounds, poll_interval, ready, results), daemon=True)
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            for _ in processes:
+                ready.get(timeout=60)
+            bus = new_bus(poll_interval)
+
+            staleness = []
+            for round_number in range(rounds):
+                user.first_name = f"round {round_number}"
+                written = time.time()
+                # The post_save signal invalidates the user and publishes the keys
+                user.save()
+                for _ in processes:
+                    _, seen = results.get(timeout=60)
+                    staleness.append((seen - written) * 1000)
+            for process in processes:
+                process.join(timeout=10)
+
+            staleness.sort()
+            self.stdout.write(
+                f"{workers} workers, {rounds} writes, poll interval {poll_interval * 1000:.0f}ms: stale for "
+                f"mean {statistics.fmean(staleness):.1f}ms  p50 {staleness[len(staleness) // 2]:.1f}ms  "
+                f"max {staleness[-1]:.1f}ms (local LRU TTL without the log: {object_cache.local.ttl:.0f}s)"
+            )
+            self.stdout.write(format_result("poll with nothing new", measure(lambda: bus.poll(force=True), 500)))
+            self.stdout.write(format_result("poll between intervals", measure(bus.poll, 5000)))
@@ -0,0 +1,68 @@
+"""Measures the database writes done per login with and without the write-behind
+bookkeeping buffers
+
+    python manage.py benchmark_login --users 500 --iterations 2000
+"""
+
+from itertools import cycle
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from user_management import bookkeeping
+from utils.benchmark import format_result, measure, throwaway_database
+
+User = get_user_model()
+
+# The password hash is the same work either way, so use a cheap one to keep
+# the database writes visible in the timings
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+class Command(BaseCommand):
+    help = "Compares per login cost with last_login and outstanding token writes done inline or written behind"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def handle(self, *args, **options):
+        with throwaway_database():
+            password = make_password("password123")
+            User.objects.bulk_create(
+                [
+                    User(
+                        email=f"bench{i}@internpulse.com",
+                        username=f"bench{i}",
+                        first_name="Bench",
+                        last_name="User",
+                        password=password,
+                    )
+                    for i in range(options["users"])
+                ],
+                batch_size=1000,
+            )
+            emails = cycle(User.objects.values_list("email", flat=True))
+            client = Client(SERVER_NAME="localhost")
+            url = reverse("login")
+
+            def login():
+                client.post(url, {"email": next(emails), "password": "password123"})
+
+            buffers = (bookkeeping.last_logins, bookkeeping.outstanding_tokens)
+            saved = [(buffer.enabled, buffer.interval) for buffer in buffers]
+            try:
+                for label, enabled in (("inline writes", False), ("write-behind", True)):
+                    for buffer in buffers:
+                        # Only size triggered flushes, so every write lands on this connection
+                        buffer.enabled, buffer.interval = enabled, 3600
+                    result = measure(login, options["iterations"])
+                    bookkeeping.flush()
+                    self.stdout.write(format_result(f"login, {label}", result))
+            finally:
+                for buffer, (enabled, interval) in zip(buffers, saved):
+                    buffer.enabled, buffer.interval = enabled, interval
@@ -0,0 +1,43 @@
+"""Measures the per request cost of the middleware stack on API routes
+
+    python manage.py benchmark_middleware --iterations 2000
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from utils.benchmark import format_result, measure, throwaway_database
+
+# The stack as it was before the stateful middleware became path aware
+FULL_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "corsheaders.middleware.CorsMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "allauth.account.middleware.AccountMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+]
+
+
+class Command(BaseCommand):
+    help = "Compares the full middleware chain with the stateless API fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument("--path", default="/api/v1/.well-known/jwks.json")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            for label, middleware in (
+                ("full chain", FULL_MIDDLEWARE),
+                ("stateless fast path", settings.MIDDLEWARE),
+            ):
+                with override_settings(MIDDLEWARE=middleware):
+                    client = Client(SERVER_NAME="localhost")
+                    result = measure(lambda: client.get(options["path"]), options["iterations"])
+                self.stdout.write(format_result(f"{label} {options['path']}", result))
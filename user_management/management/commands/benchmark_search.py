@@ -0,0 +1,76 @@
+"""Compares ?q= search through the trigram index with icontains scans as the
+user table grows
+
+    python manage.py benchmark_search --users 100000 1000000
+"""
+
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from user_management.models import UserSearchTerm
+from user_management.search import search, user_terms
+from utils.benchmark import format_result, measure, throwaway_database
+
+User = get_user_model()
+
+CONSONANTS = "bcdfghjklmnprstvwyz"
+VOWELS = "aeiou"
+
+
+class Command(BaseCommand):
+    help = "Benchmarks indexed user search against icontains scans at several table sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, nargs="+", default=[100000, 1000000])
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def name(self, rng: random.Random) -> str:
+        syllables = rng.randint(2, 4)
+        return "".join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(syllables)).capitalize()
+
+    def grow(self, target: int, rng: random.Random) -> None:
+        """Adds generated users, and their index rows, until there are `target`"""
+        count = User.objects.count()
+        while count < target:
+            users = []
+            for i in range(count, min(target, count + self.options["chunk_size"])):
+                first, last = self.name(rng), self.name(rng)
+                users.append(
+                    User(
+                        email=f"{first}.{last}{i}@example.com".lower(),
+                        username=f"user{i}",
+                        first_name=first,
+                        last_name=last,
+                        password="!",
+                    )
+                )
+            User.objects.bulk_create(users)
+            UserSearchTerm.objects.bulk_create(
+                [UserSearchTerm(user=user, term=term) for user in users for term in user_terms(user)],
+                batch_size=self.options["chunk_size"],
+            )
+            count += len(users)
+
+    def handle(self, *args, **options):
+        self.options = options
+        rng = random.Random(0)
+        with throwaway_database():
+            for size in sorted(options["users"]):
+                self.grow(size, rng)
+                self.stdout.write(f"\n{size} users")
+                # Searches for a real user by full name, by surname and with a typo
+                sample = User.objects.order_by("?").first()
+                typo = sample.last_name[:-1] + "x"
+                for query in (f"{sample.first_name} {sample.last_name}", sample.last_name, typo):
+                    indexed = lambda: list(search(User.objects.all(), query).values_list("id", flat=True)[:10])
+                    scan = lambda: list(
+                        User.objects.filter(
+                            Q(first_name__icontains=query) | Q(last_name__icontains=query) | Q(email__icontains=query)
+                        ).order_by("id").values_list("id", flat=True)[:10]
+                    )
+                    self.stdout.write(format_result(f"q={query!r} index", measure(indexed, options["iterations"], warmup=3)))
+                    self.stdout.write(format_result(f"q={query!r} icontains", measure(scan, options["iterations"], warmup=3)))
@@ -0,0 +1,61 @@
+"""Times scrypt at increasing work factors on this machine and recommends the
+largest one that hashes within a time budget
+
+    python manage.py calibrate_hasher --target-ms 250
+"""
+
+import hashlib
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.hashers import scrypt_memory
+
+
+class Command(BaseCommand):
+    help = "Recommends a scrypt work factor that fits a milliseconds-per-hash budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target-ms", type=float, default=250, help="Time budget for one hash")
+        parser.add_argument("--block-size", type=int, default=settings.PASSWORD_HASHING["scrypt"]["block_size"])
+        parser.add_argument("--parallelism", type=int, default=settings.PASSWORD_HASHING["scrypt"]["parallelism"])
+        parser.add_argument("--max-work-factor", type=int, default=2**20)
+        parser.add_argument("--runs", type=int, default=3, help="Hashes timed per candidate")
+
+    def time_hash(self, n: int, r: int, p: int, runs: int) -> float:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            hashlib.scrypt(b"calibration", salt=os.urandom(16), n=n, r=r, p=p, maxmem=scrypt_memory(n, r, p), dklen=64)
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    def handle(self, *args, **options):
+        r, p = options["block_size"], options["parallelism"]
+        workers = settings.PASSWORD_HASHING["workers"]
+        recommended = None
+        n = 2**12
+        self.stdout.write(f"{'work factor':>12} {'ms/hash':>10} {'MiB/hash':>10}")
+        while n <= options["max_work_factor"]:
+            elapsed = self.time_hash(n, r, p, options["runs"])
+            self.stdout.write(f"{n:>12} {elapsed:>10.1f} {scrypt_memory(n, r, p) / 2**20:>10.1f}")
+            if elapsed > options["target_ms"]:
+                break
+            recommended = n
+            n *= 2
+
+        if recommended is None:
+            self.stderr.write(f"Even a work factor of {2**12} takes longer than {options['target_ms']}ms here")
+            return
+        memory = scrypt_memory(recommended, r, p) * workers / 2**20
+        self.stdout.write(
+            f"\nRecommended for {options['target_ms']:g}ms per hash:\n"
+            f"SCRYPT_WORK_FACTOR={recommended}\n"
+            f"SCRYPT_BLOCK_SIZE={r}\n"
+            f"SCRYPT_PARALLELISM={p}\n"
+            f"With {workers} hashing workers that is up to {memory:.0f}MiB per process while hashing. "
+            "Existing hashes are upgraded as users log in."
+        )
@@ -0,0 +1,30 @@
+"""Deletes blacklisted access tokens that have expired anyway
+
+    python manage.py purge_blacklisted_tokens --chunk-size 1000
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from user_management.models import BLToken
+
+
+class Command(BaseCommand):
+    help = "Purges expired rows from the access token blacklist in bounded chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        purged = 0
+        while True:
+            ids = list(
+                BLToken.objects.filter(expires_at__lte=now)
+                .order_by("expires_at")
+                .values_list("id", flat=True)[: options["chunk_size"]]
+            )
+            if not ids:
+                break
+            purged += BLToken.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(f"Purged {purged} expired blacklisted tokens")
@@ -0,0 +1,32 @@
+"""Rebuilds the user search index from scratch, e.g. after first deploying it
+
+    python manage.py rebuild_search_index --chunk-size 1000
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from user_management.search import SEARCH_FIELDS, index_users
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Reindexes every user for ?q= search in bounded chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = 0
+        last_id = 0
+        while True:
+            users = list(
+                User.objects.filter(id__gt=last_id).order_by("id").only("id", *SEARCH_FIELDS)[: options["chunk_size"]]
+            )
+            if not users:
+                break
+            index_users(users)
+            indexed += len(users)
+            last_id = users[-1].id
+        self.stdout.write(f"Indexed {indexed} users")
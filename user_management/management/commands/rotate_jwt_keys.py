@@ -0,0 +1,43 @@
+"""Adds a new JWT signing key and retires keys no token can still need
+
+    python manage.py rotate_jwt_keys
+    python manage.py rotate_jwt_keys --prune-only
+"""
+
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from user_management.keys import ASYMMETRIC_ALGORITHMS, KeyRing, generate_private_key, write_private_key
+
+
+class Command(BaseCommand):
+    help = "Generates a new JWT signing key and removes superseded keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prune-only", action="store_true", help="Only remove superseded keys")
+
+    def handle(self, *args, **options):
+        algorithm = settings.JWT_KEYS["algorithm"]
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise CommandError(f"JWT_ALGORITHM is {algorithm}; key rotation needs an asymmetric algorithm")
+        directory = Path(settings.JWT_KEYS["directory"])
+
+        if not options["prune_only"]:
+            kid = timezone.now().strftime("%Y%m%d%H%M%S")
+            path = write_private_key(directory, kid, generate_private_key(algorithm))
+            self.stdout.write(f"Created key {kid} at {path}")
+
+        # A key is no longer needed once its successor has been signing for longer
+        # than the longest lived token
+        delay = settings.JWT_KEYS["activation_delay"]
+        lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME).total_seconds()
+        keys = sorted(KeyRing(directory).keys.values(), key=lambda key: (key.created, key.kid))
+        for key, successor in zip(keys, keys[1:]):
+            if successor.created + delay + lifetime < time.time():
+                (directory / f"{key.kid}.pem").unlink()
+                self.stdout.write(f"Removed superseded key {key.kid}")
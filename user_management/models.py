@@ -5,11 +5,14 @@ from django.db import models
 from pyotp import random_base32
 
 from utils.models import BaseModel
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken, BlacklistMixin, RefreshToken
 from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
 from rest_framework.serializers import ValidationError
 
+from .keys import KeyRingTokenMixin
+
 
 class User(AbstractUser, BaseModel):
     """Custom user model"""
@@ -25,6 +28,7 @@ class User(AbstractUser, BaseModel):
     is_active = models.BooleanField(default=True)
     role = models.CharField(max_length=50, default="intern", choices=USER_ROLES)
     secret = models.CharField(max_length=100, default=random_base32)
+    token_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"User - {self.email} {self.id}"
@@ -39,18 +43,34 @@ class User(AbstractUser, BaseModel):
         self.secret = random_base32()
         self.save()
 
+    def revoke_tokens(self):
+        """Invalidates every access and refresh token issued to the user so far"""
+        self.token_version = models.F("token_version") + 1
+        self.save(update_fields=["token_version", "updated_at"])
+        self.refresh_from_db(fields=["token_version"])
+
     class Meta:
         abstract = False
 
 
 class BLToken(BaseModel):
-    """Blacklisted token model"""
+    """Blacklisted access token model. Only the token's jti is kept, together
+    with its expiry so that rows can be purged once the token is dead anyway"""
 
-    token = models.CharField(max_length=500)
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
     def __str__(self):
-        return f"Blacklisted token - {self.token}"
+        return f"Blacklisted token - {self.jti}"
+
+    @classmethod
+    def revoke(cls, token, user):
+        """Blacklists a validated access token"""
+        return cls.objects.get_or_create(
+            jti=token[api_settings.JTI_CLAIM],
+            defaults={"expires_at": datetime_from_epoch(token["exp"]), "user": user},
+        )[0]
 
     class Meta:
         abstract = False
@@ -97,12 +117,75 @@ class Questionnaire(BaseModel):
         abstract = False
 
 
-class MyRefreshToken(RefreshToken):
+class UserSearchTerm(models.Model):
+    """A row of the user search index: one trigram found in one user's name,
+    email or role. Maintained by user_management.search"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="search_terms")
+    term = models.CharField(max_length=3)
+
+    def __str__(self):
+        return f"Search term - {self.term} {self.user_id}"
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["term", "user"], name="unique_user_search_term")]
+
+
+class CacheInvalidation(models.Model):
+    """An entry of the log of cache keys to evict that every worker reads.
+    Maintained by user_management.invalidation"""
+
+    id = models.BigAutoField(primary_key=True)
+    channel = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Invalidation - {self.channel} {self.key}"
+
+
+TOKEN_VERSION_CLAIM = "ver"
+
+
+class MyAccessToken(KeyRingTokenMixin, AccessToken):
+    pass
+
+
+class MyRefreshToken(KeyRingTokenMixin, RefreshToken):
+    access_token_class = MyAccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        """Embeds the user's token version so that bumping it revokes the token.
+        The outstanding token row is written behind rather than inserted here."""
+        from .bookkeeping import record_outstanding_token
+
+        token = super(BlacklistMixin, cls).for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        record_outstanding_token(token, user)
+        return token
+
+    def blacklist(self):
+        """Writes this token's outstanding row first if it hasn't been flushed yet,
+        so that the blacklist entry points at the row with the user filled in"""
+        from .bookkeeping import outstanding_tokens
+
+        pending = outstanding_tokens.pop(self.payload[api_settings.JTI_CLAIM])
+        if pending is not None:
+            pending.save()
+        return super().blacklist()
+
     def check_blacklist(self) -> None:
         """
-        Checks if this token is present in the token blacklist.  Raises
-        `TokenError` if so.
+        Checks if this token was revoked, either by a token version bump or by
+        being present in the token blacklist.  Raises an exception if so.
         """
+        from .principals import token_versions
+
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        if self.payload.get(TOKEN_VERSION_CLAIM, 0) != token_versions.get(user_id):
+            raise Exception("Token has been revoked")
+
         jti = self.payload[api_settings.JTI_CLAIM]
 
         if BlacklistedToken.objects.filter(token__jti=jti).exists():
@@ -1,16 +1,30 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 from .models import Questionnaire
+from .search import RANK
 from django_filters import rest_framework as filters
 from django.contrib.auth import get_user_model
 
+from utils.lru import LRUCache
+from utils.validators import RestValidationError
+
 User = get_user_model()
+def list_message(view) -> str:
+    """The envelope message of a paginated list, from the view's `list_message`"""
+    return getattr(view, "list_message", "User list")
+
+
 class CustomPagination(PageNumberPagination):
+    def paginate_queryset(self, queryset, request, view=None):
+        self.message = list_message(view)
+        return super().paginate_queryset(queryset, request, view)
+
     def get_paginated_response(self, data):
         return Response({
             "status": 200,
             "success": True,
-            "message": f"User list",
+            "message": self.message,
             "errors": {},
             "data": data,
             'page_info': {
@@ -20,6 +34,71 @@ class CustomPagination(PageNumberPagination):
             },
         })
 
+class SnowflakeCursorPagination(CursorPagination):
+    """Keyset pagination over snowflake ids, which are already in creation order.
+    Each page seeks with `id > cursor` instead of an OFFSET, so a deep page costs
+    the same as the first one. `page_info.count` is an exact count cached for
+    `count_ttl` seconds per filter; pass `?count=exact` for a fresh one.
+    Requests that still send `?page=`, and ranked search results, which aren't
+    in id order, get the old offset pagination."""
+
+    ordering = "id"
+    count_query_param = "count"
+    count_ttl = 60
+    counts = LRUCache(1024, count_ttl)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            PageNumberPagination.page_query_param in request.query_params
+            or RANK in queryset.query.annotations
+        ):
+            self.legacy = CustomPagination()
+            return self.legacy.paginate_queryset(queryset, request, view)
+        self.legacy = None
+        self.message = list_message(view)
+        self.count, self.count_exact = self.get_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset, request):
+        """Returns the count for the filtered queryset and whether it was just taken"""
+        key = (queryset.model._meta.label, str(queryset.order_by().query))
+        if request.query_params.get(self.count_query_param) != "exact":
+            count = self.counts.get(key)
+            if count is not None:
+                return count, False
+        count = queryset.count()
+        self.counts.set(key, count)
+        return count, True
+
+    def decode_cursor(self, request):
+        try:
+            return super().decode_cursor(request)
+        except NotFound:
+            raise RestValidationError(
+                "Invalid cursor",
+                {"cursor": ["The pagination cursor is invalid or has expired"]},
+                400,
+                success=False,
+            )
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            "status": 200,
+            "success": True,
+            "message": self.message,
+            "errors": {},
+            "data": data,
+            "page_info": {
+                "count": self.count,
+                "count_exact": self.count_exact,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+            },
+        })
+
+
 class UserFilter(filters.FilterSet):
     email = filters.CharFilter(lookup_expr='icontains')
     first_name = filters.CharFilter(lookup_expr='icontains')
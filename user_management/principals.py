@@ -0,0 +1,116 @@
+"""Per-process cache of authenticated principals keyed by access token jti.
+A hit gives back the user's identity and the token's blacklist verdict
+without touching the database. The user's current token version is cached
+alongside for refresh token checks. Entries are dropped whenever the user is
+saved or deleted and when the token is logged out; the TTL bounds how long a
+logout handled by another worker can go unnoticed."""
+
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from utils.lru import LRUCache
+
+User = get_user_model()
+
+
+class Principal(NamedTuple):
+    """The parts of a user needed to authorize a request"""
+
+    id: int
+    role: str
+    is_active: bool
+    is_staff: bool
+    is_superuser: bool
+    token_version: int
+    blacklisted: bool
+
+    FIELDS = ("id", "role", "is_active", "is_staff", "is_superuser", "token_version")
+
+    @classmethod
+    def from_user(cls, user, blacklisted: bool) -> "Principal":
+        return cls(*(getattr(user, field) for field in cls.FIELDS), blacklisted)
+
+    def as_user(self):
+        """Returns a User instance with only the cached fields loaded. Any
+        other field is fetched from the database on first access."""
+        fields = [f.attname for f in User._meta.concrete_fields if f.attname in self.FIELDS]
+        return User.from_db(None, fields, [getattr(self, field) for field in fields])
+
+
+class PrincipalCache:
+    """LRU cache of principals with an index from user id to cached jtis"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = LRUCache(maxsize, ttl, on_evict=self._forget)
+        self._by_user = defaultdict(set)
+        # Share the LRU's re-entrant lock so the index and the entries change together
+        self._lock = self._entries._lock
+
+    def _forget(self, jti: str, principal: Principal) -> None:
+        jtis = self._by_user.get(principal.id)
+        if jtis is not None:
+            jtis.discard(jti)
+            if not jtis:
+                del self._by_user[principal.id]
+
+    def get(self, jti: str) -> Optional[Principal]:
+        with self._lock:
+            return self._entries.get(jti)
+
+    def set(self, jti: str, user, blacklisted: bool) -> Principal:
+        principal = Principal.from_user(user, blacklisted)
+        with self._lock:
+            self._entries.set(jti, principal)
+            self._by_user[principal.id].add(jti)
+        return principal
+
+    def invalidate_token(self, jti: str) -> None:
+        with self._lock:
+            self._entries.delete(jti)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for jti in list(self._by_user.get(user_id, ())):
+                self._entries.delete(jti)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return self._entries.stats()
+
+
+class TokenVersionCache:
+    """Caches each user's current token version so that refresh tokens can
+    be checked for revocation with a single integer compare"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = LRUCache(maxsize, ttl)
+
+    def get(self, user_id) -> Optional[int]:
+        version = self._entries.get(user_id)
+        if version is None:
+            version = User.objects.filter(pk=user_id).values_list("token_version", flat=True).first()
+            if version is not None:
+                self._entries.set(user_id, version)
+        return version
+
+    def invalidate_user(self, user_id) -> None:
+        self._entries.delete(user_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+principal_cache = PrincipalCache(
+    settings.PRINCIPAL_CACHE["maxsize"],
+    settings.PRINCIPAL_CACHE["ttl"],
+)
+token_versions = TokenVersionCache(
+    settings.PRINCIPAL_CACHE["maxsize"],
+    settings.PRINCIPAL_CACHE["ttl"],
+)
@@ -0,0 +1,91 @@
+"""A per-process Bloom filter over BLToken jtis so that requests carrying a
+valid access token never have to query the blacklist. Only tokens the filter
+reports as possibly revoked are confirmed against the database."""
+
+import threading
+import time
+
+from django.conf import settings
+
+from utils.bloom import BloomFilter
+
+# Snowflake ids carry a millisecond timestamp above bit 22. Incremental syncs
+# re-read this much history so rows committed late by another worker whose
+# ids are slightly older than our high-water mark are not missed.
+SYNC_OVERLAP = 5000 << 22
+
+
+class RevocationFilter:
+    """Lazily built, periodically refreshed filter of blacklisted tokens"""
+
+    def __init__(self, capacity: int, error_rate: float, refresh_interval: float, enabled: bool = True):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        self._synced_at = 0.0
+
+    def _rows(self, since: int = None):
+        from .models import BLToken
+
+        queryset = BLToken.objects.order_by("id")
+        if since is not None:
+            queryset = queryset.filter(id__gt=since)
+        return queryset.values_list("id", "jti").iterator(chunk_size=2000)
+
+    def _build(self) -> None:
+        capacity = self.capacity
+        if self._filter is not None and self._filter.is_full:
+            capacity = self._filter.capacity * 2
+        bloom = BloomFilter(capacity, self.error_rate)
+        last_id = 0
+        for row_id, jti in self._rows():
+            bloom.add(jti)
+            last_id = max(last_id, row_id)
+        self._filter, self._last_id = bloom, last_id
+
+    def _sync(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._synced_at < self.refresh_interval and self._filter is not None:
+                return
+            if self._filter is None or self._filter.is_full:
+                self._build()
+            else:
+                for row_id, jti in self._rows(since=max(self._last_id - SYNC_OVERLAP, 0)):
+                    if jti not in self._filter:
+                        self._filter.add(jti)
+                    self._last_id = max(self._last_id, row_id)
+            self._synced_at = time.monotonic()
+
+    def might_contain(self, jti: str) -> bool:
+        """Returns False only when the token is definitely not blacklisted"""
+        if not self.enabled:
+            return True
+        if self._filter is None or time.monotonic() - self._synced_at >= self.refresh_interval:
+            self._sync()
+        return jti in self._filter
+
+    def add(self, jti: str) -> None:
+        """Records a freshly blacklisted token in this process's filter"""
+        if self._filter is None:
+            return
+        with self._lock:
+            self._filter.add(jti)
+
+    def reset(self) -> None:
+        """Drops the filter so that it is rebuilt on next use"""
+        with self._lock:
+            self._filter = None
+            self._last_id = 0
+            self._synced_at = 0.0
+
+
+revocation_filter = RevocationFilter(
+    settings.REVOCATION_FILTER["capacity"],
+    settings.REVOCATION_FILTER["error_rate"],
+    settings.REVOCATION_FILTER["refresh_interval"],
+    settings.REVOCATION_FILTER["enabled"],
+)
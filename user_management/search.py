@@ -0,0 +1,88 @@
+"""Trigram search over users.
+
+Every user's first name, last name, email and role are broken into words and
+each word into trigrams (words shorter than three characters are kept whole).
+The trigrams live in `UserSearchTerm`, indexed on the term, and are rewritten
+whenever one of those fields is saved. A `?q=` search looks up the query's
+trigrams in the index and ranks users by how many of them they contain, so
+its cost follows the number of matching index rows rather than the size of
+the user table. A user matches when they contain at least 70% as many of
+the query's trigrams as its shortest word has, so one well matched word is
+enough and a typo in a longer word is tolerated."""
+
+import math
+import re
+from typing import Iterable, List, Set
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, QuerySet
+from rest_framework.filters import BaseFilterBackend
+
+from .models import UserSearchTerm
+
+User = get_user_model()
+
+SEARCH_FIELDS = ("first_name", "last_name", "email", "role")
+# Share of a query word's trigrams a user must contain to match
+MATCH_RATIO = 0.7
+RANK = "search_rank"
+
+WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> Set[str]:
+    """The trigrams of every word in `text`, with short words kept whole"""
+    terms = set()
+    for word in WORD.findall(text.lower()):
+        if len(word) < 3:
+            terms.add(word)
+        else:
+            terms.update(word[i:i + 3] for i in range(len(word) - 2))
+    return terms
+
+
+def user_terms(user) -> Set[str]:
+    return trigrams(" ".join(str(getattr(user, field) or "") for field in SEARCH_FIELDS))
+
+
+def index_users(users: Iterable) -> None:
+    """Rewrites the index entries of the given users"""
+    users = list(users)
+    with transaction.atomic():
+        UserSearchTerm.objects.filter(user__in=users).delete()
+        UserSearchTerm.objects.bulk_create(
+            [UserSearchTerm(user=user, term=term) for user in users for term in user_terms(user)],
+            batch_size=1000,
+        )
+
+
+def search(queryset: QuerySet, query: str, user_path: str = "") -> QuerySet:
+    """Filters `queryset` down to the users matching `query`, best matches first.
+    `user_path` leads from the queryset's model to the user, e.g. "user__"."""
+    words = [trigrams(word) for word in WORD.findall(query)]
+    terms: List[str] = sorted(set().union(*words))
+    if not terms:
+        return queryset.none()
+    # Enough to match most of any one word; users matching more words rank higher
+    needed = max(1, math.ceil(min(len(word) for word in words) * MATCH_RATIO))
+    related = f"{user_path}search_terms"
+    return (
+        queryset.filter(**{f"{related}__term__in": terms})
+        .annotate(**{RANK: Count(f"{related}__term")})
+        .filter(**{f"{RANK}__gte": needed})
+        .order_by(f"-{RANK}", "id")
+    )
+
+
+class SearchFilter(BaseFilterBackend):
+    """Filter backend for `?q=` searches through the user search index. Views
+    whose model isn't the user set `search_user_path` to the path to it"""
+
+    search_param = "q"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return queryset
+        return search(queryset, query, getattr(view, "search_user_path", ""))
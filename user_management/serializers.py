@@ -4,7 +4,6 @@
 from typing import Any, Dict
 import jwt
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import update_last_login
 from django.db.utils import IntegrityError
 from rest_framework.authtoken.models import Token
 from rest_framework.serializers import (
@@ -18,8 +17,13 @@ from rest_framework.serializers import (
     BooleanField
 )
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .bookkeeping import record_login
 from .models import MyRefreshToken
 from utils import validators as v
+from utils.fieldsets import SparseFieldsetMixin
+from utils.hashing import check_password, set_password
+from utils.objectcache import object_cache
 from utils.types import AuthUser
 
 from .models import Profile, Questionnaire
@@ -38,7 +42,7 @@ class CustomLoginSerializer(v.SerializerErrorMixin, Serializer):
         password = attrs.get("password")
         if email and password:
             user = User.objects.filter(email=email).first()
-            if user and user.check_password(password):
+            if user and check_password(user, password):
                 result = {}
                 refresh = self.get_token(user)
                 result["refresh"] = str(refresh)
@@ -50,7 +54,7 @@ class CustomLoginSerializer(v.SerializerErrorMixin, Serializer):
                 )
                 result["iat"] = decoded_token.get("iat")
                 result["expiry"] = decoded_token.get("exp")
-                update_last_login(None, user)
+                record_login(user)
                 return v.get_response(200, "Login successful", result)
             else:
                 raise ValidationError(
@@ -101,9 +105,9 @@ class SignUpSerializer(v.SerializerErrorMixin, ModelSerializer):
             password = validated_data.pop("password")
             validated_data["username"] = validated_data["email"]
             questionnaire_id = validated_data.pop("questionnaire_id", None)
-            user = User.objects.create(**validated_data)
-            user.set_password(password)
-            user.save()
+            user = User(**validated_data)
+            set_password(user, password)
+            user.save(force_insert=True)
             if questionnaire_id:
                 try:
                     questionnaire = Questionnaire.objects.get(id=int(questionnaire_id))
@@ -165,7 +169,7 @@ class ProfileManageSerializer(v.SerializerErrorMixin, ModelSerializer):
         ]
 
 
-class UserManageSerializer(v.SerializerErrorMixin, ModelSerializer):
+class UserManageSerializer(v.SerializerErrorMixin, SparseFieldsetMixin, ModelSerializer):
     """Serializer for modifying your user information."""
 
     email = EmailField(
@@ -191,6 +195,7 @@ class UserManageSerializer(v.SerializerErrorMixin, ModelSerializer):
             "role",
             "profile",
         ]
+        related_serializers = {"profile": ProfileManageSerializer}
 
     def update(self, instance, validated_data):
         try:
@@ -212,11 +217,23 @@ class UserManageSerializer(v.SerializerErrorMixin, ModelSerializer):
                 )
 
     def get_profile(self, obj):
-        if hasattr(obj, "profile"):
-            return ProfileManageSerializer(obj.profile).data
+        profile = object_cache.related(obj, "profile")
+        if profile is not None:
+            return ProfileManageSerializer(profile).data
         else:
             return {}
 
+
+class UserSummarySerializer(UserManageSerializer):
+    """The user fields of UserManageSerializer without the profile"""
+
+    profile = None
+
+    class Meta(UserManageSerializer.Meta):
+        fields = [field for field in UserManageSerializer.Meta.fields if field != "profile"]
+        related_serializers = {}
+
+
 class RequestSerializer(v.SerializerErrorMixin, Serializer):
     email = EmailField()
 
@@ -244,6 +261,12 @@ class SocialLoginSerializer(v.SerializerErrorMixin, ModelSerializer):
         fields = ["access", "refresh"]
 
 
+class SocialTokenClaimsSerializer(TokenObtainPairSerializer):
+    """Makes the google login mint the same tokens as the rest of the API"""
+
+    token_class = MyRefreshToken
+
+
 class QuestionnaireSerializer(v.SerializerErrorMixin, ModelSerializer):
     has_experience_programming = BooleanField(default=False)
     worked_on_real_life_problems = BooleanField(default=False)
@@ -263,11 +286,10 @@ class QuestionnaireSerializer(v.SerializerErrorMixin, ModelSerializer):
             "reason_for_joining_Internpulse",
             "importance_of_work_exp",
         ]
+        related_serializers = {"user": UserSummarySerializer}
 
     def get_user(self, obj):
         if hasattr(obj, "user"):
-            user_data = UserManageSerializer(obj.user).data
-            user_data.pop("profile", {})
-            return user_data
+            return UserSummarySerializer(obj.user).data
         else:
             return {}
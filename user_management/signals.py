@@ -1,4 +1,61 @@
-from django.dispatch import Signal
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from utils.objectcache import object_cache
+
+from .invalidation import bus
+from .models import Profile
+from .principals import principal_cache, token_versions
+from .search import SEARCH_FIELDS, index_users
+
+User = get_user_model()
+
+object_cache.register(User, exclude=("password", "secret"))
+object_cache.register(Profile, aliases=("user_id",))
+object_cache.connect_bus(bus)
 
 password_reset = Signal()
-verification = Signal()
\ No newline at end of file
+verification = Signal()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_principals(sender, instance, **kwargs):
+    """Drops cached principals so role, status or token version changes apply on
+    the next request"""
+    principal_cache.invalidate_user(instance.pk)
+    token_versions.invalidate_user(instance.pk)
+    bus.publish("principals", [instance.pk])
+
+
+def evict_principals(user_ids):
+    """Applies other workers' user changes to this worker's principal caches"""
+    if user_ids is None:
+        principal_cache.clear()
+        token_versions.clear()
+        return
+    for user_id in user_ids:
+        principal_cache.invalidate_user(int(user_id))
+        token_versions.invalidate_user(int(user_id))
+
+
+def evict_tokens(jtis):
+    """Applies other workers' logouts to this worker's principal cache"""
+    if jtis is None:
+        principal_cache.clear()
+        return
+    for jti in jtis:
+        principal_cache.invalidate_token(jti)
+
+
+bus.subscribe("principals", evict_principals)
+bus.subscribe("tokens", evict_tokens)
+
+
+@receiver(post_save, sender=User)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Reindexes the user when a searchable field may have changed. Deleted users
+    lose their index rows through the foreign key cascade"""
+    if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+        index_users([instance])
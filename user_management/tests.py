@@ -1,15 +1,44 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+import jwt
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
 from django.db.models.signals import post_save
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from notifications.signals import send_welcome_email
 from rest_framework.test import APIClient, APITestCase
 from utils.types import test_response_schema
 from utils.otp import generate_otp_link, get_otp
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from urllib.parse import urlencode
 import random
 import string
-from .models import Profile, Questionnaire
+from . import bookkeeping, keys
+from .invalidation import InvalidationBus
+from .models import BLToken, CacheInvalidation, MyRefreshToken, Profile, Questionnaire, UserSearchTerm
+from .pagination import SnowflakeCursorPagination
+from .principals import principal_cache
+from .revocation import revocation_filter
+from utils import hashing
+from utils.bloom import BloomFilter
+from utils.objectcache import TOMBSTONE, object_cache
+from utils.singleflight import SingleFlight
+from utils.writebehind import WriteBehindBuffer
 from rest_framework import status
 
 
@@ -673,6 +702,8 @@ class QuestionnaireListTestCase(APITestCase):
         self.assertTrue(test_response_schema(data, True))
         self.assertIn("page_info", data)
         self.assertIsInstance(data["data"], list)
+        self.assertEqual(data["message"], "Questionnaire list")
+        self.assertEqual(self.client.get(url, {"page": 1}).json()["message"], "Questionnaire list")
 
     def test_qs_list_unauthorized(self):
         self.user.role = "intern"
@@ -1021,4 +1052,938 @@ class RequestPasswordResetLinkTestCase(APITestCase):
         self.assertEqual(data["status"], 404)
         self.assertEqual(data["success"], False)
         self.assertEqual(len(data["errors"]), 1)
-        self.assertTrue(test_response_schema(data))
\ No newline at end of file
+        self.assertTrue(test_response_schema(data))
+
+
+class RevocationFilterTestCase(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="User",
+            username=generate_random_username()
+        )
+        self.refresh_token = RefreshToken.for_user(self.user)
+        revocation_filter.reset()
+
+    def auth(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(self.refresh_token.access_token)}')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        items = [generate_random_username(20) for _ in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        self.assertFalse(bloom.is_full)
+
+    def test_valid_token_skips_blacklist_query(self):
+        self.auth()
+        url = reverse('profile')
+        self.client.get(url)
+        principal_cache.clear()
+        with self.assertNumQueries(1):
+            # user lookup only: no blacklist query, and the profile is in the object cache
+            self.client.get(url)
+
+    def test_logged_out_token_is_rejected(self):
+        self.auth()
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh_token)})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('profile'))
+        data = response.json()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data["errors"]["auth"], ["Token is blacklisted"])
+
+    def test_filter_picks_up_rows_from_other_workers(self):
+        token = self.refresh_token.access_token
+        self.assertFalse(revocation_filter.might_contain(token["jti"]))
+        BLToken.revoke(token, self.user)
+        revocation_filter._synced_at = 0.0
+        self.assertTrue(revocation_filter.might_contain(token["jti"]))
+
+    def test_purge_removes_only_expired_tokens(self):
+        live = self.refresh_token.access_token
+        BLToken.revoke(live, self.user)
+        BLToken.objects.create(
+            jti="expired", expires_at=timezone.now() - timedelta(minutes=1), user=self.user
+        )
+        call_command("purge_blacklisted_tokens", chunk_size=1, stdout=StringIO())
+        self.assertEqual(list(BLToken.objects.values_list("jti", flat=True)), [live["jti"]])
+
+
+class PrincipalCacheTestCase(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="User",
+            username=generate_random_username()
+        )
+        Profile.objects.create(user=self.user, address="2b centenary Garden PH")
+        principal_cache.clear()
+
+    def auth(self, user):
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+
+    def test_repeat_request_authenticates_without_queries(self):
+        self.auth(self.user)
+        url = reverse('profile')
+        self.client.get(url)
+        hits = principal_cache.stats()["hits"]
+        with self.assertNumQueries(0):
+            # the profile comes from the object cache
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(principal_cache.stats()["hits"], hits + 1)
+
+    def test_role_change_invalidates_cached_principal(self):
+        self.auth(self.user)
+        url = reverse('questionnaire-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+        self.user.role = "admin"
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.auth(self.user)
+        url = reverse('profile')
+        self.client.get(url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 401)
+
+
+class LogoutAllTestCase(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="User",
+            username=generate_random_username()
+        )
+        self.refresh_token = MyRefreshToken.for_user(self.user)
+        self.other_refresh_token = MyRefreshToken.for_user(self.user)
+
+    def auth(self, refresh_token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh_token.access_token)}')
+
+    def test_logout_all_revokes_every_token(self):
+        self.auth(self.refresh_token)
+        response = self.client.post(reverse('logout-all'))
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(test_response_schema(data))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+
+        self.auth(self.other_refresh_token)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["errors"]["auth"], ["Token has been revoked"])
+
+    def test_logout_all_revokes_refresh_tokens(self):
+        self.auth(self.refresh_token)
+        self.client.post(reverse('logout-all'))
+        self.user.refresh_from_db()
+        self.auth(MyRefreshToken.for_user(self.user))
+        response = self.client.post(reverse('refresh-token'), {'refresh': str(self.other_refresh_token)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_logout_all_writes_no_blacklist_rows(self):
+        self.auth(self.refresh_token)
+        self.client.post(reverse('logout-all'))
+        self.assertFalse(BLToken.objects.exists())
+
+    def test_tokens_issued_after_logout_all_are_valid(self):
+        self.user.revoke_tokens()
+        self.auth(MyRefreshToken.for_user(self.user))
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 404)
+
+
+class AsymmetricSigningTestCase(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="User",
+            username=generate_random_username()
+        )
+        self.keys_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.keys_dir)
+        self.addCleanup(setattr, keys, "_backend", None)
+        keys._backend = None
+
+    def rs256(self):
+        jwt_keys = {**settings.JWT_KEYS, "algorithm": "RS256", "directory": self.keys_dir}
+        return override_settings(JWT_KEYS=jwt_keys)
+
+    def test_jwks_is_empty_with_shared_secret(self):
+        response = self.client.get(reverse('jwks'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"keys": []})
+
+    def test_tokens_verify_offline_against_jwks(self):
+        with self.rs256():
+            call_command("rotate_jwt_keys", stdout=StringIO())
+            refresh = MyRefreshToken.for_user(self.user)
+            access = str(refresh.access_token)
+            response = self.client.get(reverse('jwks'))
+            self.assertIn("max-age", response["Cache-Control"])
+            jwks = response.json()
+            self.assertEqual(len(jwks["keys"]), 1)
+
+            kid = jwt.get_unverified_header(access)["kid"]
+            self.assertEqual(jwks["keys"][0]["kid"], kid)
+            public_key = jwt.PyJWK(jwks["keys"][0]).key
+            payload = jwt.decode(access, public_key, algorithms=["RS256"])
+            self.assertEqual(payload["user_id"], self.user.id)
+
+            self.client.credentials(HTTP_AUTHORIZATION=f'JWT {access}')
+            response = self.client.get(reverse('profile'))
+            self.assertEqual(response.status_code, 404)
+
+    def test_rotated_key_is_published_before_it_signs(self):
+        with self.rs256():
+            call_command("rotate_jwt_keys", stdout=StringIO())
+            old = str(MyRefreshToken.for_user(self.user).access_token)
+            time.sleep(1)
+            call_command("rotate_jwt_keys", stdout=StringIO())
+            keys.get_token_backend().get_keyring(force=True)
+            self.assertEqual(len(self.client.get(reverse('jwks')).json()["keys"]), 2)
+            new = str(MyRefreshToken.for_user(self.user).access_token)
+            self.assertEqual(jwt.get_unverified_header(old)["kid"], jwt.get_unverified_header(new)["kid"])
+
+
+class DispatchingAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="User",
+            username=generate_random_username()
+        )
+        Profile.objects.create(user=self.user, address="2b centenary Garden PH")
+
+    def test_jwt_scheme_authenticates(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_malformed_jwt_header_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='JWT one two')
+        response = self.client.get(reverse('profile'))
+        data = response.json()
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(test_response_schema(data))
+
+    def test_unknown_scheme_is_anonymous(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Basic dGVzdDp0ZXN0')
+        response = self.client.get(reverse('profile'))
+        data = response.json()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data["message"], "Not authorized")
+
+    def test_session_is_used_without_authorization_header(self):
+        self.client.force_login(self.user)
+        stateless_paths = {**settings.STATELESS_PATHS, "exceptions": ("/api/v1/profile",)}
+        with override_settings(STATELESS_PATHS=stateless_paths):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_session_is_ignored_on_stateless_paths(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 401)
+
+
+class StatelessMiddlewareTestCase(APITestCase):
+    def test_api_requests_skip_stateful_middleware(self):
+        response = self.client.get(reverse('jwks'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Frame-Options", response)
+        self.assertNotIn("sessionid", response.cookies)
+
+    def test_other_paths_keep_full_chain(self):
+        response = self.client.get(reverse('redirect'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["X-Frame-Options"], "DENY")
+
+
+class WriteBehindTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="user",
+            username=generate_random_username()
+        )
+        for buffer in (bookkeeping.last_logins, bookkeeping.outstanding_tokens):
+            buffer.enabled, buffer.interval = True, 3600
+            self.addCleanup(setattr, buffer, "enabled", False)
+
+    def test_buffer_coalesces_and_flushes_when_full(self):
+        batches = []
+        buffer = WriteBehindBuffer(batches.append, max_size=2, interval=3600)
+        buffer.add("a", 1)
+        buffer.add("a", 2)
+        self.assertEqual(batches, [])
+        buffer.add("b", 3)
+        self.assertEqual(batches, [[2, 3]])
+        self.assertEqual(len(buffer), 0)
+
+    def test_login_writes_are_deferred_until_flush(self):
+        response = self.client.post(reverse('login'), {"email": "test@gmail.com", "password": "password123"})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        self.assertFalse(OutstandingToken.objects.filter(user=self.user).exists())
+
+        bookkeeping.flush()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(OutstandingToken.objects.filter(user=self.user).count(), 1)
+
+    def test_logout_before_flush_blacklists_token(self):
+        response = self.client.post(reverse('login'), {"email": "test@gmail.com", "password": "password123"})
+        data = response.json()["data"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {data['access']}")
+        response = self.client.post(reverse('logout'), {"refresh": data["refresh"]})
+        self.assertEqual(response.status_code, 200)
+        bookkeeping.flush()
+        self.assertEqual(OutstandingToken.objects.filter(user=self.user).count(), 1)
+        with self.assertRaises(Exception):
+            MyRefreshToken(data["refresh"]).check_blacklist()
+
+
+class HashingPoolTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="user",
+            username=generate_random_username()
+        )
+        self.login = {"email": "test@gmail.com", "password": "password123"}
+
+    def test_saturated_pool_rejects_with_retry_after(self):
+        busy = hashing.HashingPool(workers=1, max_queue=0)
+        release = threading.Event()
+        worker = threading.Thread(target=busy.run, args=(release.wait,))
+        worker.start()
+        self.addCleanup(worker.join)
+        self.addCleanup(release.set)
+        while not busy.pending:
+            time.sleep(0.001)
+        with mock.patch.object(hashing, "pool", busy):
+            response = self.client.post(reverse('login'), self.login)
+        data = response.json()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(data["success"], False)
+        self.assertTrue(test_response_schema(data))
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertEqual(busy.rejected, 1)
+
+    def test_metrics_require_admin(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+        response = self.client.get(reverse('hashing-metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_report_hashing_times(self):
+        self.client.post(reverse('login'), self.login)
+        self.user.is_staff = True
+        self.user.save()
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+        response = self.client.get(reverse('hashing-metrics'))
+        data = response.json()["data"]
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(data["hashing_seconds"]["count"], 1)
+        self.assertEqual(data["queue_wait_seconds"]["buckets"][-1]["le"], "+Inf")
+
+
+class HasherUpgradeTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="user",
+            username=generate_random_username()
+        )
+        self.login = {"email": "test@gmail.com", "password": "password123"}
+
+    def test_login_upgrades_old_algorithm(self):
+        self.user.password = make_password("password123", hasher="pbkdf2_sha256")
+        self.user.save()
+        response = self.client.post(reverse('login'), self.login)
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$"))
+        self.assertTrue(self.user.check_password("password123"))
+
+    def test_login_upgrades_old_cost(self):
+        cost = settings.PASSWORD_HASHING["scrypt"]
+        with override_settings(PASSWORD_HASHING={**settings.PASSWORD_HASHING, "scrypt": {**cost, "work_factor": 2**12}}):
+            self.user.set_password("password123")
+            self.user.save()
+        self.assertTrue(self.user.password.startswith(f"scrypt${2**12}$"))
+        response = self.client.post(reverse('login'), self.login)
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(f"scrypt${cost['work_factor']}$"))
+
+    def test_calibration_recommends_work_factor(self):
+        out = StringIO()
+        call_command("calibrate_hasher", "--target-ms", "10000", "--max-work-factor", 2**13, "--runs", "1", stdout=out)
+        self.assertIn(f"SCRYPT_WORK_FACTOR={2**13}", out.getvalue())
+
+
+class QueryPlanTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@gmail.com",
+            password="password123",
+            first_name="Admin",
+            last_name="user",
+            username=generate_random_username(),
+            role="admin",
+        )
+        refresh = RefreshToken.for_user(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+
+    def add_users(self, count):
+        for i in range(count):
+            user = User.objects.create(
+                email=f"user{User.objects.count()}@gmail.com",
+                first_name="User",
+                last_name="Test",
+                username=generate_random_username(),
+            )
+            Profile.objects.create(user=user, city="Lagos")
+            Questionnaire.objects.create(user=user, importance_of_work_exp="A lot")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        for name in ('user-list', 'questionnaire-list'):
+            self.add_users(1)
+            self.client.get(reverse(name))
+            small, _ = self.count_queries(reverse(name))
+            self.add_users(5)
+            large, data = self.count_queries(reverse(name))
+            self.assertEqual(small, large, name)
+            self.assertGreater(len(data["data"]), 5)
+
+    def test_nested_output_is_unchanged(self):
+        self.add_users(1)
+        _, data = self.count_queries(reverse('user-list'))
+        user = next(row for row in data["data"] if row["email"] != "admin@gmail.com")
+        self.assertEqual(user["profile"]["city"], "Lagos")
+        admin = next(row for row in data["data"] if row["email"] == "admin@gmail.com")
+        self.assertEqual(admin["profile"], {})
+        _, data = self.count_queries(reverse('questionnaire-list'))
+        self.assertEqual(data["data"][0]["user"]["first_name"], "User")
+        self.assertNotIn("profile", data["data"][0]["user"])
+
+    def test_detail_view_reads_user_and_profile_from_cache(self):
+        self.add_users(1)
+        user = User.objects.exclude(pk=self.admin.pk).get()
+        url = reverse('user-detail', kwargs={'id': user.id})
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["data"]["profile"]["city"], "Lagos")
+
+
+class CursorPaginationTestCase(APITestCase):
+    def setUp(self):
+        SnowflakeCursorPagination.counts.clear()
+        self.user = User.objects.create_user(
+            email="james@gmail.com",
+            password="password123",
+            first_name="James",
+            last_name="john",
+            username=generate_random_username()
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+        for i in range(24):
+            User.objects.create(
+                email=f"user{i}@gmail.com",
+                first_name="User",
+                last_name="Test",
+                username=generate_random_username(),
+            )
+
+    def test_next_links_walk_every_user_once(self):
+        seen = []
+        url = reverse('user-list')
+        while url:
+            data = self.client.get(url).json()
+            self.assertTrue(test_response_schema(data, True))
+            seen.extend(row["id"] for row in data["data"])
+            url = data["page_info"]["next"]
+        self.assertEqual(seen, [str(pk) for pk in User.objects.order_by("id").values_list("id", flat=True)])
+
+    def test_count_is_cached_unless_exact_is_requested(self):
+        url = reverse('user-list')
+        page_info = self.client.get(url).json()["page_info"]
+        self.assertEqual((page_info["count"], page_info["count_exact"]), (25, True))
+        User.objects.create(email="late@gmail.com", username=generate_random_username())
+        page_info = self.client.get(url).json()["page_info"]
+        self.assertEqual((page_info["count"], page_info["count_exact"]), (25, False))
+        page_info = self.client.get(url, {"count": "exact"}).json()["page_info"]
+        self.assertEqual((page_info["count"], page_info["count_exact"]), (26, True))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('user-list'), {"cursor": "garbage"})
+        data = response.json()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["success"], False)
+        self.assertIn("cursor", data["errors"])
+
+    def test_page_parameter_still_uses_offsets(self):
+        data = self.client.get(reverse('user-list'), {"page": 3}).json()
+        self.assertEqual(len(data["data"]), 5)
+        self.assertIsNone(data["page_info"]["next"])
+
+
+class SearchTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="james@gmail.com",
+            password="password123",
+            first_name="James",
+            last_name="john",
+            username=generate_random_username(),
+            role="admin",
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+        for first, last in (("Chinedu", "Okafor"), ("Chioma", "Okeke"), ("Adebayo", "Okafor")):
+            user = User.objects.create(
+                email=f"{first.lower()}@example.com",
+                first_name=first,
+                last_name=last,
+                username=generate_random_username(),
+            )
+            Questionnaire.objects.create(user=user, importance_of_work_exp="A lot")
+
+    def search(self, name, q):
+        response = self.client.get(reverse(name), {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"]
+
+    def test_search_ranks_best_match_first(self):
+        data = self.search('user-list', "chinedu okafor")
+        self.assertEqual([row["first_name"] for row in data], ["Chinedu", "Adebayo"])
+
+    def test_search_tolerates_a_typo(self):
+        data = self.search('user-list', "adebayu")
+        self.assertEqual([row["first_name"] for row in data], ["Adebayo"])
+
+    def test_questionnaires_search_by_user(self):
+        data = self.search('questionnaire-list', "okeke")
+        self.assertEqual([row["user"]["first_name"] for row in data], ["Chioma"])
+
+    def test_index_follows_user_changes(self):
+        user = User.objects.get(first_name="Chioma")
+        user.last_name = "Nwosu"
+        user.save()
+        self.assertEqual(self.search('user-list', "okeke"), [])
+        self.assertEqual(len(self.search('user-list', "nwosu")), 1)
+        user.delete()
+        self.assertFalse(UserSearchTerm.objects.filter(user_id=user.id).exists())
+
+    def test_unrelated_saves_skip_reindexing(self):
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=["last_login"])
+
+
+class SparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@gmail.com",
+            password="password123",
+            first_name="Admin",
+            last_name="user",
+            username=generate_random_username(),
+            role="admin",
+        )
+        Profile.objects.create(user=self.admin, city="Lagos")
+        refresh = RefreshToken.for_user(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"], [query["sql"] for query in queries]
+
+    def test_list_fetches_and_renders_only_requested_fields(self):
+        data, queries = self.get(reverse('user-list'), fields="id,email")
+        self.assertEqual([set(row) for row in data], [{"id", "email"}])
+        user_query = next(sql for sql in queries if "first_name" not in sql and '"email"' in sql)
+        self.assertNotIn("user_management_profile", user_query)
+
+    def test_detail_fields(self):
+        url = reverse('user-detail', kwargs={'id': self.admin.id})
+        data, _ = self.get(url, fields="first_name,profile")
+        self.assertEqual(set(data), {"first_name", "profile"})
+        self.assertEqual(data["profile"]["city"], "Lagos")
+
+    def test_unknown_fields_are_ignored_and_default_is_unchanged(self):
+        url = reverse('user-detail', kwargs={'id': self.admin.id})
+        data, _ = self.get(url, fields="email,password")
+        self.assertEqual(data, {"email": "admin@gmail.com"})
+        data, _ = self.get(url)
+        self.assertEqual(data["profile"]["city"], "Lagos")
+        self.assertIn("last_name", data)
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@gmail.com",
+            password="password123",
+            first_name="Test",
+            last_name="user",
+            username=generate_random_username(),
+        )
+        self.profile = Profile.objects.create(user=self.user, city="Lagos")
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+        self.url = reverse('user-detail', kwargs={'id': self.user.id})
+
+    def test_matching_etag_gets_empty_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(any('"first_name"' in query["sql"] for query in queries))
+
+    def test_profile_change_invalidates_user_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.profile.city = "Abuja"
+        self.profile.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["profile"]["city"], "Abuja")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_fields_change_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, {"fields": "email"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        url = reverse('profile')
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(seconds=5)):
+            self.profile.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_object_is_still_404(self):
+        url = reverse('user-detail', kwargs={'id': 1})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"x"').status_code, 404)
+
+
+
+class ObjectCacheTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            email="user@gmail.com",
+            first_name="Test",
+            last_name="user",
+            username=generate_random_username(),
+        )
+        # Starts with no tombstone left by the save
+        object_cache.clear()
+        caches["objects"].clear()
+
+    def test_reads_go_through_both_tiers(self):
+        before = object_cache.stats()
+        self.assertEqual(object_cache.get(User, self.user.pk).email, "user@gmail.com")
+        with self.assertNumQueries(0):
+            self.assertEqual(object_cache.get(User, self.user.pk).email, "user@gmail.com")
+        object_cache.clear()
+        with self.assertNumQueries(0):
+            object_cache.get(User, self.user.pk)
+        after = object_cache.stats()
+        self.assertEqual(after["database_loads"] - before["database_loads"], 1)
+        self.assertEqual(after["shared"]["hits"] - before["shared"]["hits"], 1)
+
+    def test_saves_and_deletes_invalidate(self):
+        object_cache.get(User, self.user.pk)
+        self.user.first_name = "Changed"
+        self.user.save()
+        self.assertEqual(object_cache.get(User, self.user.pk).first_name, "Changed")
+        self.user.delete()
+        self.assertIsNone(object_cache.get(User, self.user.pk))
+
+    def test_invalidated_key_is_not_refilled_with_an_old_row(self):
+        key = object_cache.key(User, self.user.pk)
+        old = pickle.dumps([getattr(self.user, f.attname) for f in User._meta.concrete_fields])
+        object_cache.invalidate(User, self.user.pk)
+        # A reader that loaded the row before the invalidation tries to store it
+        object_cache._write(key, old, generation=-1)
+        self.assertIsNone(object_cache._read(key))
+
+    def test_alias_remembers_missing_rows_until_one_is_created(self):
+        self.assertIsNone(object_cache.get_by(Profile, user_id=self.user.pk))
+        with self.assertNumQueries(0):
+            self.assertIsNone(object_cache.get_by(Profile, user_id=self.user.pk))
+        Profile.objects.create(user=self.user, city="Lagos")
+        self.assertEqual(object_cache.get_by(Profile, user_id=self.user.pk).city, "Lagos")
+        user = object_cache.get(User, self.user.pk, related=("profile",))
+        with self.assertNumQueries(0):
+            self.assertEqual(user.profile.city, "Lagos")
+
+    def test_save_in_a_transaction_drops_rows_read_before_the_commit(self):
+        key = object_cache.key(User, self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.first_name = "Changed"
+                self.user.save()
+                # A reader still seeing the committed row loads it meanwhile
+                old = pickle.dumps(
+                    [
+                        "Test" if name == "first_name" else getattr(self.user, name)
+                        for name in object_cache._fields[User]
+                    ]
+                )
+                object_cache._write(key, old, object_cache._generation)
+                self.assertEqual(caches["objects"].get(key), TOMBSTONE)
+                self.assertEqual(object_cache.get(User, self.user.pk).first_name, "Test")
+        self.assertEqual(object_cache.get(User, self.user.pk).first_name, "Changed")
+
+    def test_credentials_are_not_cached(self):
+        self.user.set_password("Str0ng-passw0rd")
+        self.user.save()
+        caches["objects"].clear()
+        object_cache.get(User, self.user.pk)
+        data = caches["objects"].get(object_cache.key(User, self.user.pk))
+        self.assertNotIn(self.user.password, pickle.loads(data))
+        self.assertNotIn(self.user.secret, pickle.loads(data))
+        user = object_cache.get(User, self.user.pk)
+        self.assertEqual(user.get_deferred_fields(), {"password", "secret"})
+        # Read from the database when needed
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password("Str0ng-passw0rd"))
+
+    def test_instances_are_not_shared(self):
+        object_cache.get(User, self.user.pk).first_name = "Mutated"
+        self.assertEqual(object_cache.get(User, self.user.pk).first_name, "Test")
+
+    def test_metrics_require_admin(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {str(refresh.access_token)}')
+        self.assertEqual(self.client.get(reverse('object-cache-metrics')).status_code, 403)
+        self.user.role = "admin"
+        self.user.save()
+        response = self.client.get(reverse('object-cache-metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("evictions", response.json()["data"]["local"])
+
+
+class InvalidationBusTestCase(APITestCase):
+    """Each bus stands in for one worker process"""
+
+    def worker(self, channel="objects"):
+        bus = InvalidationBus(poll_interval=60, overlap=10, retention=3600)
+        received = []
+        bus.subscribe(channel, received.append)
+        bus.poll(force=True)
+        return bus, received
+
+    def test_other_workers_receive_keys_once(self):
+        writer, _ = self.worker()
+        reader, received = self.worker()
+        writer.publish("objects", ["a", "b"])
+        reader.poll(force=True)
+        reader.poll(force=True)
+        self.assertEqual(received, [["a", "b"]])
+
+    def test_polls_are_throttled(self):
+        writer, _ = self.worker()
+        reader, received = self.worker()
+        writer.publish("objects", ["a"])
+        with self.assertNumQueries(0):
+            reader.poll()
+        self.assertEqual(received, [])
+
+    def test_own_keys_are_not_delivered_back(self):
+        bus, received = self.worker()
+        bus.publish("objects", ["a"])
+        bus.poll(force=True)
+        self.assertEqual(received, [])
+
+    def test_late_commit_with_a_lower_id_is_delivered(self):
+        CacheInvalidation.objects.create(id=1000, channel="objects", key="early")
+        reader, received = self.worker()
+        # Committed after the reader moved past id 1000
+        CacheInvalidation.objects.create(id=500, channel="objects", key="late")
+        reader.poll(force=True)
+        self.assertEqual(received, [["late"]])
+
+    def test_worker_that_fell_behind_drops_everything(self):
+        reader, received = self.worker()
+        reader._polled_at -= reader.retention + 1
+        reader.poll()
+        self.assertEqual(received, [None])
+
+    def test_old_rows_are_pruned(self):
+        bus, _ = self.worker()
+        bus.publish("objects", ["a"])
+        CacheInvalidation.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        bus._pruned_at = float("-inf")
+        bus.poll(force=True)
+        self.assertFalse(CacheInvalidation.objects.exists())
+
+    def test_object_cache_follows_writes_from_another_worker(self):
+        user = User.objects.create(email="user@gmail.com", first_name="Test", username=generate_random_username())
+        reader, _ = self.worker()
+        reader.subscribe("objects", object_cache.evict)
+        self.assertEqual(object_cache.get(User, user.pk).first_name, "Test")
+        # Another worker saves the user: its signal handlers don't run here
+        User.objects.filter(pk=user.pk).update(first_name="Changed")
+        writer, _ = self.worker()
+        writer.publish("objects", [object_cache.key(User, user.pk)])
+        self.assertEqual(object_cache.get(User, user.pk).first_name, "Test")
+        reader.poll(force=True)
+        self.assertEqual(object_cache.get(User, user.pk).first_name, "Changed")
+
+
+class SingleFlightTestCase(APITestCase):
+    def setUp(self):
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+        self.flights = SingleFlight(timeout=5, lease=10, poll=0.001, lock_dir=lock_dir.name)
+        self.cache = caches["objects"]
+        self.cache.clear()
+
+    def concurrently(self, function, count=5):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(function())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return "value"
+
+        threading.Timer(0.1, release.set).start()
+        results = self.concurrently(lambda: self.flights.do("key", compute))
+        self.assertEqual(results, ["value"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.flights.stats()["coalesced"], 4)
+
+    def test_waiters_fall_back_after_the_timeout(self):
+        release = threading.Event()
+        leader = threading.Thread(target=lambda: self.flights.do("key", lambda: release.wait(5)))
+        leader.start()
+        try:
+            while "key" not in self.flights._calls:
+                time.sleep(0.001)
+            self.assertEqual(self.flights.do("key", lambda: "computed", timeout=0.01, fallback=lambda: "stale"), "stale")
+            self.assertEqual(self.flights.stats()["timeouts"], 1)
+        finally:
+            release.set()
+            leader.join()
+
+    def test_errors_are_shared_with_waiters(self):
+        release = threading.Event()
+        errors = []
+
+        def compute():
+            release.wait(5)
+            raise ValueError("boom")
+
+        def call():
+            try:
+                self.flights.do("key", compute)
+            except ValueError as error:
+                errors.append(error)
+
+        threading.Timer(0.1, release.set).start()
+        self.concurrently(call, count=3)
+        self.assertEqual(len(errors), 3)
+        self.assertNotIn("key", self.flights._calls)
+
+    def test_other_process_holding_the_lease_is_waited_for(self):
+        # The lease of another worker on the host
+        self.assertTrue(self.flights.acquire("key"))
+        threading.Timer(0.05, lambda: self.cache.set("key", "theirs")).start()
+        value = self.flights.fill("key", lambda: self.cache.get("key"), lambda: "ours")
+        self.assertEqual(value, "theirs")
+        self.assertEqual(self.flights.stats()["computed"], 0)
+
+    def test_lease_is_held_by_one_process_until_it_expires(self):
+        self.assertTrue(self.flights.acquire("key"))
+        self.assertFalse(self.flights.acquire("key"))
+        # Its holder died long ago
+        expired = time.time() - 11
+        os.utime(self.flights.lease_path("key"), (expired, expired))
+        self.assertTrue(self.flights.acquire("key"))
+        self.assertFalse(self.flights.acquire("key"))
+
+    def test_lease_is_released_after_computing(self):
+        def compute():
+            self.cache.set("key", "value")
+            return "value"
+
+        self.assertEqual(self.flights.fill("key", lambda: self.cache.get("key"), compute), "value")
+        self.assertFalse(self.flights.lease_path("key").exists())
+        self.assertEqual(self.flights.stats()["computed"], 1)
+
+    def test_object_cache_waits_for_another_worker_loading_the_object(self):
+        user = User.objects.create(email="user@gmail.com", first_name="Test", username=generate_random_username())
+        object_cache.clear()
+        key = object_cache.key(User, user.pk)
+        data = pickle.dumps([getattr(user, f.attname) for f in User._meta.concrete_fields])
+        self.cache.delete(key)
+        # Another worker on the host is loading it
+        self.flights.acquire(key)
+        threading.Timer(0.05, lambda: self.cache.set(key, data)).start()
+        with mock.patch("utils.objectcache.flights", self.flights), self.assertNumQueries(0):
+            self.assertEqual(object_cache.get(User, user.pk).email, "user@gmail.com")
+        self.assertEqual(self.flights.stats()["coalesced"], 1)
@@ -3,7 +3,11 @@ from django.urls import path
 from .views import (
     GoogleCallBackView,
     GoogleLoginView,
+    HashingMetricsView,
+    ObjectCacheMetricsView,
+    JWKSView,
     LoginView,
+    LogoutAllView,
     LogoutView,
     PasswordResetConfirmView,
     PasswordResetRequestView,
@@ -26,6 +30,7 @@ urlpatterns = [
     path("google/login", GoogleLoginView.as_view(), name="google-login"),
     path("google/callback/", GoogleCallBackView.as_view(), name="google-callback"),
     path("logout", LogoutView.as_view(), name="logout"),
+    path("logout/all", LogoutAllView.as_view(), name="logout-all"),
     path("users", UserListView.as_view(), name="user-list"),
     path("users/<int:id>", UserView.as_view(), name="user-detail"),
     path("verify", VerificationConfirmView.as_view(), name="verify-confirm"),
@@ -45,6 +50,9 @@ urlpatterns = [
         name="request-reset-password",
     ),
     path("refresh-token", MyRefreshTokenView.as_view(), name="refresh-token"),
+    path(".well-known/jwks.json", JWKSView.as_view(), name="jwks"),
+    path("metrics/hashing", HashingMetricsView.as_view(), name="hashing-metrics"),
+    path("metrics/object-cache", ObjectCacheMetricsView.as_view(), name="object-cache-metrics"),
     path("profile", ProfileView.as_view(), name="profile"),#
     path("questionnaire", QuestionnaireView.as_view(), name="questionnaire"),
     path("questionnaire/<int:id>", QuestionnaireGetView.as_view(), name="questionnaire-get"),
@@ -5,6 +5,8 @@ from dj_rest_auth.registration.views import SocialLoginView
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
+from django.db.models import QuerySet
+from django.utils.cache import patch_cache_control
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import RedirectView
 from rest_framework.generics import (
@@ -24,7 +26,7 @@ from rest_framework.status import (
     HTTP_403_FORBIDDEN,
     HTTP_404_NOT_FOUND,
 )
-from .pagination import CustomPagination, UserFilter, QuestionnaireFilter
+from .pagination import SnowflakeCursorPagination, UserFilter, QuestionnaireFilter
 from django_filters import rest_framework as filters
 from rest_framework_simplejwt.views import (
     TokenBlacklistView,
@@ -32,11 +34,21 @@ from rest_framework_simplejwt.views import (
 )
 from urllib.parse import unquote
 from user_management.permissions import IsAdminPermission
+from utils import hashing
+from utils.hashing import set_password
+from utils.objectcache import object_cache
 from utils.otp import verify_otp, verify_otp_link
+from utils.conditional import ConditionalGetMixin
+from utils.planner import QueryPlanMixin
 from utils.validators import RestValidationError, get_response, ViewErrorMixin
 
 from .backends import CustomJWTAuthentication
+from . import invalidation
+from .keys import KeyRingTokenBackend, get_token_backend
 from .models import BLToken, Profile, MyRefreshToken, Questionnaire
+from .principals import principal_cache
+from .revocation import revocation_filter
+from .search import SearchFilter
 from .signals import password_reset, verification
 from .serializers import (
     CustomLoginSerializer,
@@ -54,16 +66,33 @@ from .serializers import (
 User = get_user_model()
 
 
+def not_found_error(name) -> RestValidationError:
+    return RestValidationError(
+        "Not found",
+        {"lookup": f"The requested {name} wasn't found"},
+        404,
+        success=False,
+    )
+
+
 def get_obj_or_rest_error(object, name, *args, **values):
+    queryset = object if isinstance(object, QuerySet) else object.objects.all()
     try:
-        return object.objects.get(*args, **values)
-    except object.DoesNotExist:
-        raise RestValidationError(
-            "Not found",
-            {"lookup": f"The requested {name} wasn't found"},
-            404,
-            success=False,
-        )
+        return queryset.get(*args, **values)
+    except queryset.model.DoesNotExist:
+        raise not_found_error(name)
+
+
+def get_cached_or_rest_error(model, name, related=(), **lookup):
+    """Like get_obj_or_rest_error, for a lookup by pk or a cached alias read
+    through utils.objectcache"""
+    if "pk" in lookup:
+        obj = object_cache.get(model, lookup["pk"], related)
+    else:
+        obj = object_cache.get_by(model, related, **lookup)
+    if obj is None:
+        raise not_found_error(name)
+    return obj
 
 
 class LoginView(ViewErrorMixin, TokenObtainPairView):
@@ -106,12 +135,25 @@ class LogoutView(ViewErrorMixin, TokenBlacklistView):
 
     def post(self, request, *args, **kwargs) -> Response:
         super().post(request, *args, **kwargs)
-        header = request.headers.get("Authorization")
-        token = header.split(" ")[1]
-        BLToken.objects.create(token=token, user=request.user)
+        token = BLToken.revoke(request.auth, request.user)
+        revocation_filter.add(token.jti)
+        principal_cache.invalidate_token(token.jti)
+        invalidation.bus.publish("tokens", [token.jti])
         return Response(get_response(200, "Logout successful", {}), 200)
 
 
+class LogoutAllView(ViewErrorMixin, GenericAPIView):
+    """Logs the user out of every session by revoking all their tokens at once"""
+
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CustomJWTAuthentication]
+    serializer_class = EmptySerializer
+
+    def post(self, request, *args, **kwargs) -> Response:
+        request.user.revoke_tokens()
+        return Response(get_response(200, "Logged out of all sessions", {}), 200)
+
+
 class MyRefreshTokenView(ViewErrorMixin, GenericAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CustomLogoutSerializer
@@ -136,6 +178,53 @@ class MyRefreshTokenView(ViewErrorMixin, GenericAPIView):
         )
 
 
+class JWKSView(GenericAPIView):
+    """Publishes the public keys tokens are signed with as a JSON Web Key Set so that
+    other services can verify tokens without calling this API. The set is empty when
+    tokens are signed with a shared secret"""
+
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    serializer_class = EmptySerializer
+
+    def get(self, request, *args, **kwargs) -> Response:
+        backend = get_token_backend()
+        jwks = {"keys": []}
+        if isinstance(backend, KeyRingTokenBackend):
+            jwks = backend.get_keyring().jwks(backend.algorithm)
+        response = Response(jwks, status=HTTP_200_OK)
+        patch_cache_control(response, public=True, max_age=settings.JWT_KEYS["jwks_max_age"])
+        return response
+
+
+class HashingMetricsView(ViewErrorMixin, GenericAPIView):
+    """Reports the password hashing pool's queue depth, rejections and the
+    queue wait and hashing time histograms for this worker process"""
+
+    permission_classes = [IsAuthenticated, IsAdminPermission]
+    serializer_class = EmptySerializer
+
+    def get(self, request, *args, **kwargs) -> Response:
+        return Response(
+            get_response(HTTP_200_OK, "Password hashing metrics", hashing.pool.stats()),
+            status=HTTP_200_OK,
+        )
+
+
+class ObjectCacheMetricsView(ViewErrorMixin, GenericAPIView):
+    """Reports the object cache's hit ratios, evictions and database loads for
+    this worker process"""
+
+    permission_classes = [IsAuthenticated, IsAdminPermission]
+    serializer_class = EmptySerializer
+
+    def get(self, request, *args, **kwargs) -> Response:
+        return Response(
+            get_response(HTTP_200_OK, "Object cache metrics", object_cache.stats()),
+            status=HTTP_200_OK,
+        )
+
+
 class PasswordResetRequestView(ViewErrorMixin, GenericAPIView):
     serializer_class = RequestSerializer
     permission_classes = [AllowAny]
@@ -197,8 +286,9 @@ class PasswordResetConfirmView(ViewErrorMixin, GenericAPIView):
                 {"password": ["Passwords do not match"]},
                 HTTP_400_BAD_REQUEST,
             )
-        user.set_password(pwd)
+        set_password(user, pwd)
         user.save()
+        user.revoke_tokens()
         return Response(
             get_response(
                 HTTP_200_OK,
@@ -274,9 +364,11 @@ class VerificationConfirmView(ViewErrorMixin, GenericAPIView):
         )
 
 
-class UserView(ViewErrorMixin, GenericAPIView):
+class UserView(ViewErrorMixin, ConditionalGetMixin, GenericAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = UserManageSerializer
+    queryset = User.objects.all()
+    condition_fields = ("updated_at", "profile__updated_at")
 
     def get_permissions(self):
         if self.request.method in ["GET", "PATCH"]:
@@ -286,11 +378,14 @@ class UserView(ViewErrorMixin, GenericAPIView):
         return super(UserView, self).get_permissions()
 
     def get_object(self, pk):
-        return get_obj_or_rest_error(User, "user", pk=pk)
+        return get_obj_or_rest_error(self.get_queryset(), "user", pk=pk)
 
     def get(self, request, id, *args, **kwargs):
-        user = self.get_object(id)
-        serializer = self.serializer_class(user)
+        user = get_cached_or_rest_error(User, "user", related=("profile",), pk=id)
+        not_modified = self.not_modified(user)
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(user)
         return Response(
             get_response(
                 HTTP_200_OK,
@@ -345,24 +440,26 @@ class UserView(ViewErrorMixin, GenericAPIView):
         )
 
 
-class UserListView(ViewErrorMixin, ListAPIView):
+class UserListView(ViewErrorMixin, QueryPlanMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = UserManageSerializer
-    pagination_class = CustomPagination
+    pagination_class = SnowflakeCursorPagination
+    list_message = "User list"
     queryset = User.objects.all().order_by("id")
     filterset_class = UserFilter
-    filter_backends = [filters.DjangoFilterBackend]
+    filter_backends = [filters.DjangoFilterBackend, SearchFilter]
 
-class ProfileView(ViewErrorMixin, RetrieveUpdateDestroyAPIView):
+class ProfileView(ViewErrorMixin, ConditionalGetMixin, RetrieveUpdateDestroyAPIView):
     """SO for now we're not allowed to delete a profile after creationg because a user
     should have his profile"""
     serializer_class = ProfileManageSerializer
+    queryset = Profile.objects.all()
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
     allowed_methods = ["GET", "POST", "OPTIONS", "PATCH", ]
     def get_object(self):
-        return get_obj_or_rest_error(Profile, "profile", user=self.request.user)
+        return get_obj_or_rest_error(self.get_queryset(), "profile", user=self.request.user)
 
     def post(self, request, *args, **kwargs) -> Response:
         serializer = self.get_serializer(data=request.data)
@@ -385,7 +482,11 @@ class ProfileView(ViewErrorMixin, RetrieveUpdateDestroyAPIView):
             status=HTTP_201_CREATED
         )
     def get(self, request, *args, **kwargs) -> Response:
-        serializer = self.get_serializer(self.get_object())
+        profile = get_cached_or_rest_error(Profile, "profile", user_id=request.user.pk)
+        not_modified = self.not_modified(profile)
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(profile)
         return Response(
             get_response(
                 HTTP_200_OK,
@@ -473,14 +574,15 @@ class QuestionnaireView(ViewErrorMixin, CreateAPIView):
         )        
 
 
-class QuestionnaireGetView(ViewErrorMixin, RetrieveUpdateDestroyAPIView):
+class QuestionnaireGetView(ViewErrorMixin, QueryPlanMixin, RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdminPermission]
     serializer_class = QuestionnaireSerializer
     allowed_methods = ["OPTIONS", "GET", "DELETE"]
+    queryset = Questionnaire.objects.all()
 
     def get_object(self):
         id = self.kwargs.get('id')
-        return get_obj_or_rest_error(Questionnaire, "questionnaire", id=id)
+        return get_obj_or_rest_error(self.get_queryset(), "questionnaire", id=id)
 
     def get(self, request, *args, **kwargs) -> Response:
         serializer = self.get_serializer(self.get_object())
@@ -493,13 +595,15 @@ class QuestionnaireGetView(ViewErrorMixin, RetrieveUpdateDestroyAPIView):
             status=HTTP_200_OK
         )
 
-class QuestionnaireListView(ViewErrorMixin, ListAPIView):
+class QuestionnaireListView(ViewErrorMixin, QueryPlanMixin, ListAPIView):
     permission_classes = [IsAdminPermission]
     serializer_class = QuestionnaireSerializer
-    pagination_class = CustomPagination
+    pagination_class = SnowflakeCursorPagination
+    list_message = "Questionnaire list"
     queryset = Questionnaire.objects.all().order_by("id")
     filterset_class = QuestionnaireFilter
-    filter_backends = [filters.DjangoFilterBackend]
+    filter_backends = [filters.DjangoFilterBackend, SearchFilter]
+    search_user_path = "user__"
 
 
 
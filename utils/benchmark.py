@@ -0,0 +1,64 @@
+"""Helpers shared by the benchmark management commands. Benchmarks run
+against a throwaway test database so they never touch real data."""
+
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from django.db import connection
+
+
+@contextmanager
+def throwaway_database(shared: bool = False):
+    """Creates a fresh test database for the duration of the block. With
+    `shared`, other processes can open it too: SQLite then uses a temporary
+    file instead of memory."""
+    old_name = connection.settings_dict["NAME"]
+    old_test_name = connection.settings_dict["TEST"].get("NAME")
+    if shared and connection.vendor == "sqlite" and not old_test_name:
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.gettempdir(), f"benchmark-{os.getpid()}.sqlite3")
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict["TEST"]["NAME"] = old_test_name
+
+
+def measure(func: Callable, iterations: int = 1000, warmup: int = 50) -> Dict[str, float]:
+    """Calls `func` repeatedly and returns per call timings in microseconds
+    along with the average number of queries it ran"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1_000_000)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p95_us": samples[int(len(samples) * 0.95) - 1],
+        "queries": queries / iterations,
+    }
+
+
+def format_result(label: str, result: Dict[str, float]) -> str:
+    """Renders a measurement as a single aligned line"""
+    return (
+        f"{label:<40} mean {result['mean_us']:>10.1f}us  "
+        f"p50 {result['p50_us']:>10.1f}us  p95 {result['p95_us']:>10.1f}us  "
+        f"queries/call {result['queries']:.2f}"
+    )
@@ -0,0 +1,58 @@
+"""Conditional GET for detail views.
+
+A view lists the `updated_at` columns its response depends on in
+`condition_fields` (paths like "profile__updated_at" follow relations) and,
+once it has the object, calls `not_modified(instance)`. That computes the
+ETag and Last-Modified from those values and returns a 304 to send instead
+of the body when the client's `If-None-Match` or `If-Modified-Since` still
+matches, or None. The detail views load their objects through
+utils.objectcache, so a 304 costs no query and no serialization; either way
+the validators describe the very object the body would be built from."""
+
+import hashlib
+from typing import Iterable, Optional, Tuple
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _path_value(obj, path: str):
+    for name in path.split("__"):
+        # A missing reverse one-to-one raises a subclass of AttributeError
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return None
+    return obj
+
+
+class ConditionalGetMixin:
+    """Generic view mixin adding ETag/Last-Modified validators to GET"""
+
+    condition_fields = ("updated_at",)
+
+    def make_validators(self, values: Iterable) -> Tuple[str, Optional[int]]:
+        """(etag, last modified timestamp) from the pk and condition_fields values"""
+        values = list(values)
+        # ?fields= and friends change the body, so they're part of the version
+        version = "|".join(str(value) for value in values) + "|" + self.request.get_full_path()
+        etag = quote_etag(hashlib.sha1(version.encode()).hexdigest())
+        modified = [value for value in values[1:] if value is not None]
+        return etag, int(max(modified).timestamp()) if modified else None
+
+    def not_modified(self, instance) -> Optional[HttpResponseNotModified]:
+        self._validators = self.make_validators(
+            [instance.pk, *(_path_value(instance, field) for field in self.condition_fields)]
+        )
+        etag, last_modified = self._validators
+        return get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, "_validators", None)
+        if validators is not None and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,33 @@
+"""Sparse fieldsets and opt-in expansion for read endpoints.
+
+`?fields=id,email` keeps only the listed fields of a serializer and
+`?expand=user,cohort` swaps the relations named in `Meta.expandable_fields`
+from primary keys to nested objects. Both only apply to GET requests on the
+serializer the view builds with its request context, and since
+`utils.planner` plans the query from that same serializer, dropped fields
+are not fetched and expanded relations are joined into the same query."""
+
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _param_set(request, name: str) -> set:
+    value = request.query_params.get(name, "")
+    return {part.strip() for part in value.split(",") if part.strip()}
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin that applies the `fields` and `expand` query parameters"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        expandable = getattr(self.Meta, "expandable_fields", {})
+        expand = _param_set(request, "expand") & set(expandable)
+        for name in expand:
+            self.fields[name] = expandable[name](read_only=True)
+        fields = _param_set(request, "fields")
+        if fields:
+            for name in set(self.fields) - fields - expand:
+                self.fields.pop(name)
@@ -0,0 +1,50 @@
+"""Password hashers whose cost is set from settings.PASSWORD_HASHING, so it can
+be tuned to the hardware with the `calibrate_hasher` command. A stored hash
+made with another hasher or cost is rehashed on the user's next login."""
+
+import base64
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def scrypt_memory(n: int, r: int, p: int) -> int:
+    """Bytes of memory scrypt needs for the given parameters"""
+    return 128 * r * (n + p + 2)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """Django's memory-hard scrypt hasher with its cost read from
+    `PASSWORD_HASHING["scrypt"]`. The memory limit follows the parameters of
+    the hash being computed, so hashes made at a higher cost still verify
+    after the cost is lowered."""
+
+    @property
+    def work_factor(self) -> int:
+        return settings.PASSWORD_HASHING["scrypt"]["work_factor"]
+
+    @property
+    def block_size(self) -> int:
+        return settings.PASSWORD_HASHING["scrypt"]["block_size"]
+
+    @property
+    def parallelism(self) -> int:
+        return settings.PASSWORD_HASHING["scrypt"]["parallelism"]
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash_ = hashlib.scrypt(
+            password.encode(),
+            salt=salt.encode(),
+            n=n,
+            r=r,
+            p=p,
+            maxmem=scrypt_memory(n, r, p),
+            dklen=64,
+        )
+        hash_ = base64.b64encode(hash_).decode("ascii").strip()
+        return "%s$%d$%s$%d$%d$%s" % (self.algorithm, n, salt, r, p, hash_)
@@ -0,0 +1,126 @@
+"""Password hashing off the request threads.
+
+Password hashes are deliberately slow, so a burst of logins hashing inline
+can keep every worker busy and starve cheap endpoints. Hashing goes through
+a bounded thread pool instead: at most `workers` hashes run at once per
+process, and at most `max_queue` more may wait. Past that, requests are
+turned away straight away with a 503 and a Retry-After estimate. The
+hashers Django ships release the GIL, so the pool threads hash in
+parallel."""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from rest_framework.exceptions import APIException
+
+from .metrics import Histogram
+from .types import AuthUser
+from .validators import get_response
+
+# Upper bounds in seconds for the wait and hashing time histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class HashingBusy(APIException):
+    """Raised when the hashing pool is saturated. DRF's exception handler turns
+    `wait` into the Retry-After header"""
+
+    status_code = 503
+
+    def __init__(self, wait: int):
+        super().__init__("Server busy")
+        self.wait = wait
+        self.detail = get_response(
+            503,
+            "Server busy",
+            errors={"server": ["Too many password checks in progress, please retry shortly"]},
+            success=False,
+        )
+
+
+class HashingPool:
+    """A bounded thread pool for password hashing with admission control"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+        self.wait_times = Histogram(BUCKETS)
+        self.hash_times = Histogram(BUCKETS)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Pool threads don't survive a fork, so each worker process makes its own
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="hashing")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        per_hash = self.hash_times.mean or BUCKETS[4]
+        return max(1, math.ceil(self.pending * per_hash / self.workers))
+
+    def run(self, func: Callable, *args) -> Any:
+        """Runs `func` on the pool and returns its result, or raises HashingBusy
+        when the pool and its queue are already full"""
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HashingBusy(self.retry_after())
+            self.pending += 1
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            self.wait_times.observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                self.hash_times.observe(time.perf_counter() - started)
+
+        try:
+            return self._get_executor().submit(task).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "rejected": self.rejected,
+            "queue_wait_seconds": self.wait_times.snapshot(),
+            "hashing_seconds": self.hash_times.snapshot(),
+        }
+
+
+pool = HashingPool(settings.PASSWORD_HASHING["workers"], settings.PASSWORD_HASHING["max_queue"])
+
+
+def check_password(user: AuthUser, raw_password: str) -> bool:
+    """`user.check_password` with the hash computed on the pool. A stored hash
+    that is due an upgrade is rehashed and saved, as Django does"""
+    is_correct, must_update = pool.run(verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        set_password(user, raw_password)
+        user.save(update_fields=["password"])
+    return is_correct
+
+
+def set_password(user: AuthUser, raw_password: str) -> None:
+    """`user.set_password` with the hash computed on the pool"""
+    user.password = pool.run(make_password, raw_password)
+    user._password = raw_password
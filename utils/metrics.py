@@ -0,0 +1,38 @@
+"""In-process metrics that can be exposed through admin endpoints"""
+
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Iterable
+
+
+class Histogram:
+    """Counts observations into fixed upper bound buckets. Snapshots report
+    cumulative counts per bound, the way Prometheus histograms do"""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            count, total = self.count, self.sum
+        cumulative = 0
+        buckets = []
+        for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += bucket_count
+            buckets.append({"le": bound, "count": cumulative})
+        return {"count": count, "sum": total, "mean": total / count if count else 0.0, "buckets": buckets}
@@ -0,0 +1,58 @@
+"""Path aware versions of the stateful middleware in settings.MIDDLEWARE.
+
+The API authenticates with JWTs, so requests under the stateless prefixes in
+`settings.STATELESS_PATHS` skip session loading, CSRF, messages,
+authentication and clickjacking middleware entirely. The admin, the google
+login flow and the swagger UI keep the full chain. allauth insists on its own
+AccountMiddleware being listed by name, so it stays; it lets JSON responses
+straight through."""
+
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, csrf
+
+
+def is_stateless(request) -> bool:
+    """True when the request should skip the stateful middleware"""
+    path = request.path_info
+    return path.startswith(settings.STATELESS_PATHS["prefixes"]) and not path.startswith(
+        settings.STATELESS_PATHS["exceptions"]
+    )
+
+
+def stateful_only(middleware_class):
+    """Returns a subclass of `middleware_class` that does nothing for stateless requests"""
+
+    def __call__(self, request):
+        if is_stateless(request):
+            return self.get_response(request)
+        return middleware_class.__call__(self, request)
+
+    attrs = {"__call__": __call__, "__module__": __name__}
+    if hasattr(middleware_class, "process_view"):
+
+        def process_view(self, request, *args, **kwargs):
+            if is_stateless(request):
+                return None
+            return middleware_class.process_view(self, request, *args, **kwargs)
+
+        attrs["process_view"] = process_view
+    return type(middleware_class.__name__, (middleware_class,), attrs)
+
+
+class SessionMiddleware(stateful_only(sessions.SessionMiddleware)):
+    """Stateless requests get an empty session that is never loaded or saved, since
+    allauth's AccountMiddleware looks at request.session on some responses"""
+
+    def __call__(self, request):
+        if is_stateless(request):
+            request.session = self.SessionStore()
+        return super().__call__(request)
+
+
+CsrfViewMiddleware = stateful_only(csrf.CsrfViewMiddleware)
+AuthenticationMiddleware = stateful_only(auth.AuthenticationMiddleware)
+MessageMiddleware = stateful_only(messages.MessageMiddleware)
+XFrameOptionsMiddleware = stateful_only(clickjacking.XFrameOptionsMiddleware)
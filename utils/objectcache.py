@@ -0,0 +1,248 @@
+"""Two tier read-through cache of model instances.
+
+Registered models are cached by primary key: first in a per-process LRU
+(`OBJECT_CACHE["maxsize"]` entries for `OBJECT_CACHE["ttl"]` seconds), then
+in the Django cache named by `OBJECT_CACHE["alias"]`, which is shared by the
+workers on a host, and only then loaded from the database. Models can also
+be looked up by a unique field registered as an alias, e.g. a profile by its
+user_id, which costs one more cache entry mapping the value to the pk (or to
+"no such row").
+
+Saves and deletes drop the entries through post_save/post_delete. The
+shared tier is overwritten with a tombstone for `OBJECT_CACHE["hold"]`
+seconds and refilled with `add`, so a reader that loaded the old row before
+the write can't put it back. Inside a transaction the signal fires before
+the commit, while readers still see the old row, so the entries are dropped
+again once it commits. With a bus connected (see
+user_management.invalidation) the keys are also published, and the other
+workers drop their LRU entries and tombstone their own node's shared tier
+when they next poll; without one, they keep them until they expire.
+Queryset `update()`/`delete()` send no signals and aren't seen.
+
+Loads of a missing object are coalesced through utils.singleflight, so one
+thread on one worker per host queries the database while the rest wait for
+the shared tier.
+
+Every `get` returns a new instance, so callers are free to modify it.
+
+Fields registered in `exclude`, such as password hashes and OTP seeds,
+are left out of both tiers and come back deferred: reading one loads it
+from the database. Entries are pickles, so anyone who can write to the
+shared tier (a cache directory or server) can run code in every worker
+reading from it; it must only be writable by the application's user."""
+
+import hashlib
+import pickle
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+from rest_framework.permissions import SAFE_METHODS
+
+from .lru import LRUCache
+from .singleflight import flights
+
+TOMBSTONE = "__invalidated__"
+ABSENT = "__absent__"
+
+
+class ObjectCache:
+    def __init__(self, maxsize: int, ttl: float, alias: str, timeout: float, hold: float):
+        self.local = LRUCache(maxsize, ttl)
+        self.alias = alias
+        self.timeout = timeout
+        self.hold = hold
+        self._aliases: Dict[type, tuple] = {}
+        self._prefixes: Dict[type, str] = {}
+        self._fields: Dict[type, List[str]] = {}
+        # Bumped by every invalidation, so a load that raced one isn't kept locally
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.bus = None
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def register(self, model, aliases: Iterable[str] = (), exclude: Iterable[str] = ()) -> None:
+        """Caches `model` without the fields in `exclude`, with lookups by the
+        unique fields in `aliases`"""
+        exclude = set(exclude)
+        self._fields[model] = [field.attname for field in model._meta.concrete_fields if field.name not in exclude]
+        # A schema change gives new keys instead of unpickling old rows
+        signature = hashlib.sha1(",".join(self._fields[model]).encode()).hexdigest()[:8]
+        self._prefixes[model] = f"objects:{model._meta.label_lower}:{signature}"
+        self._aliases[model] = tuple(aliases)
+        uid = f"object-cache-{model._meta.label_lower}"
+        post_save.connect(self._invalidate_instance, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self._invalidate_instance, sender=model, weak=False, dispatch_uid=uid)
+
+    def key(self, model, pk) -> str:
+        return f"{self._prefixes[model]}:{pk}"
+
+    def alias_key(self, model, field: str, value) -> str:
+        return f"{self._prefixes[model]}:{field}={value}"
+
+    def _read(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value = self.shared.get(key)
+        if value is None or value == TOMBSTONE:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self.local.set(key, value)
+        return value
+
+    def _write(self, key: str, value, generation: int) -> None:
+        if generation == self._generation:
+            self.local.set(key, value)
+        self.shared.add(key, value, self.timeout)
+
+    def _load(self, model, pk, key: str) -> Optional[bytes]:
+        generation = self._generation
+        obj = model._default_manager.filter(pk=pk).first()
+        self.loads += 1
+        if obj is None:
+            return None
+        data = pickle.dumps([getattr(obj, attname) for attname in self._fields[model]])
+        self._write(key, data, generation)
+        return data
+
+    def get(self, model, pk, related: Iterable[str] = ()):
+        """The instance of `model` with primary key `pk`, or None. Relations
+        named in `related` are read through the cache and attached to it"""
+        key = self.key(model, pk)
+        data = flights.fill(key, lambda: self._read(key), lambda: self._load(model, pk, key))
+        if data is None:
+            return None
+        obj = model.from_db(model._default_manager.db, self._fields[model], pickle.loads(data))
+        for name in related:
+            self.related(obj, name)
+        return obj
+
+    def get_by(self, model, related: Iterable[str] = (), **lookup):
+        """The instance of `model` matching a single registered alias, or None"""
+        ((field, value),) = lookup.items()
+        if field not in self._aliases[model]:
+            raise ValueError(f"{field} is not a cached alias of {model._meta.label}")
+        key = self.alias_key(model, field, value)
+        pk = self._read(key)
+        if pk == ABSENT:
+            return None
+        if pk is not None:
+            obj = self.get(model, pk, related)
+            # The field may have changed since; then the alias is stale
+            if obj is not None and getattr(obj, field) == value:
+                return obj
+        generation = self._generation
+        pk = model._default_manager.filter(**{field: value}).values_list("pk", flat=True).first()
+        self.loads += 1
+        self._write(key, ABSENT if pk is None else pk, generation)
+        return None if pk is None else self.get(model, pk, related)
+
+    def related(self, instance, name: str):
+        """`instance.<name>` for a forward or reverse one-to-one/foreign key,
+        read through the cache unless it's already loaded on the instance"""
+        field = instance._meta.get_field(name)
+        if field.is_cached(instance):
+            return field.get_cached_value(instance)
+        if field.concrete:
+            pk = getattr(instance, field.attname)
+            value = None if pk is None else self.get(field.related_model, pk)
+        else:
+            value = self.get_by(field.related_model, **{field.field.attname: instance.pk})
+        field.set_cached_value(instance, value)
+        return value
+
+    def connect_bus(self, bus, channel: str = "objects") -> None:
+        """Publishes invalidations on `bus` and applies the ones it delivers"""
+        self.bus = bus
+        self.channel = channel
+        bus.subscribe(channel, self.evict)
+
+    def keys(self, model, pk, aliases: Optional[Dict[str, Any]] = None) -> List[str]:
+        keys = [self.key(model, pk)]
+        return keys + [self.alias_key(model, field, value) for field, value in (aliases or {}).items()]
+
+    def invalidate(self, model, pk, aliases: Optional[Dict[str, Any]] = None) -> None:
+        keys = self.keys(model, pk, aliases)
+        self.evict(keys)
+        self.invalidations += 1
+        if self.bus is not None:
+            self.bus.publish(self.channel, keys)
+
+    def evict(self, keys: Optional[List[str]]) -> None:
+        """Drops `keys` from both tiers, or this process's whole tier for None"""
+        with self._lock:
+            self._generation += 1
+        if keys is None:
+            self.local.clear()
+            return
+        for key in keys:
+            self.local.delete(key)
+        self.shared.set_many({key: TOMBSTONE for key in keys}, self.hold)
+
+    def _invalidate_instance(self, sender, instance, using=None, **kwargs) -> None:
+        aliases = {field: getattr(instance, field) for field in self._aliases[sender]}
+        self.invalidate(sender, instance.pk, aliases)
+        if transaction.get_connection(using).in_atomic_block:
+            # Drops what readers loaded from the old row until now; the other
+            # workers only see the published keys after the commit anyway
+            keys = self.keys(sender, instance.pk, aliases)
+            transaction.on_commit(lambda: self.evict(keys), using=using)
+
+    def clear(self) -> None:
+        """Empties this process's tier. The shared tier is left to expire"""
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        shared_lookups = self.shared_hits + self.shared_misses
+        return {
+            "local": self.local.stats(),
+            "shared": {
+                "hits": self.shared_hits,
+                "misses": self.shared_misses,
+                "hit_ratio": self.shared_hits / shared_lookups if shared_lookups else 0.0,
+            },
+            "database_loads": self.loads,
+            "invalidations": self.invalidations,
+            "single_flight": flights.stats(),
+        }
+
+
+class CachedObjectMixin:
+    """Generic view mixin that reads the object of a GET through the object
+    cache, with the relations in `cached_related` attached. Only for views
+    looking objects up by pk in an unfiltered queryset; writes still load
+    the object from the database."""
+
+    cached_related = ()
+
+    def get_object(self):
+        if self.request.method not in SAFE_METHODS:
+            return super().get_object()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = object_cache.get(self.queryset.model, self.kwargs[lookup_url_kwarg], self.cached_related)
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+object_cache = ObjectCache(
+    settings.OBJECT_CACHE["maxsize"],
+    settings.OBJECT_CACHE["ttl"],
+    settings.OBJECT_CACHE["alias"],
+    settings.OBJECT_CACHE["timeout"],
+    settings.OBJECT_CACHE["hold"],
+)
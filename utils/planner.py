@@ -0,0 +1,115 @@
+"""Works out the query a serializer needs from its declared fields.
+
+`plan_queryset` walks a serializer's readable fields and returns the queryset
+with `select_related` for single valued relations, `prefetch_related` for
+many valued ones and an `only()` projection of the columns that are actually
+rendered, so serializing a page costs the same number of queries whatever
+its size. A SerializerMethodField hides what it reads, so serializers name
+the relation behind one in `Meta.related_serializers`, mapping the field
+(named after the relation) to the serializer the method renders it with.
+A source the planner can't see through, like a property, turns projection
+off for that model so it never causes a query per row."""
+
+from typing import List, Optional, Tuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, QuerySet
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer, ListSerializer, SerializerMethodField
+
+
+class Plan:
+    def __init__(self):
+        self.only: Optional[List[str]] = []
+        self.select: List[str] = []
+        self.prefetch: List[Prefetch] = []
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        if self.select:
+            queryset = queryset.select_related(*self.select)
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        if self.only is not None:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+def _nested_fields(serializer) -> List[Tuple[str, object]]:
+    """The readable fields of a serializer as (name, field) pairs, with method
+    fields swapped for the serializer named in Meta.related_serializers"""
+    hints = getattr(getattr(serializer, "Meta", None), "related_serializers", {})
+    fields = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, SerializerMethodField):
+            if name not in hints:
+                continue
+            field = hints[name]()
+            field.source = name
+        fields.append((name, field))
+    return fields
+
+
+def _plan(model, serializer, prefix: str, plan: Plan) -> None:
+    columns = []
+    project = True
+    for name, field in _nested_fields(serializer):
+        source = field.source
+        if source == "*":
+            continue
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            project = False
+            continue
+        if not model_field.is_relation:
+            columns.append(prefix + source)
+            continue
+        nested = field.child if isinstance(field, ListSerializer) else field
+        if model_field.many_to_many or model_field.one_to_many:
+            related = model_field.related_model._default_manager.all()
+            if isinstance(nested, BaseSerializer):
+                # Prefetching matches rows on the foreign key back to us, so keep it loaded
+                required = [model_field.field.name] if model_field.one_to_many else []
+                related = plan_queryset(related, nested, *required)
+            plan.prefetch.append(Prefetch(prefix + source, queryset=related))
+            continue
+        if model_field.concrete:
+            columns.append(prefix + source)
+        if isinstance(nested, BaseSerializer):
+            plan.select.append(prefix + source)
+            _plan(model_field.related_model, nested, f"{prefix}{source}__", plan)
+    if project:
+        plan.only.extend(columns)
+    elif prefix:
+        # Load the related model in full rather than leave it to deferred loading
+        plan.only.append(prefix[:-2])
+    else:
+        plan.only = None
+
+
+def plan_queryset(queryset: QuerySet, serializer, *required: str) -> QuerySet:
+    """Returns `queryset` set up to load exactly what `serializer` renders,
+    plus any `required` columns"""
+    if isinstance(serializer, type):
+        serializer = serializer()
+    plan = Plan()
+    _plan(queryset.model, serializer, "", plan)
+    if plan.only is not None:
+        plan.only.extend(required)
+    return plan.apply(queryset)
+
+
+class QueryPlanMixin:
+    """Generic view mixin that plans `get_queryset()` around the view's serializer
+    for reads, using the serializer built for this request so `?fields=` and
+    `?expand=` (see utils.fieldsets) shape the query too. Writes get the plain
+    queryset, since saving an instance with deferred fields skips those
+    fields, auto_now ones included"""
+
+    def get_queryset(self) -> QuerySet:
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return plan_queryset(queryset, self.get_serializer())
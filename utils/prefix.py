@@ -0,0 +1,67 @@
+"""A bounded, in-memory prefix index for typeahead lookups"""
+
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Dict, Hashable, Iterable, List, Tuple
+
+
+class PrefixIndex:
+    """Maps lowercased keys to entries through a sorted array, so finding every
+    key that starts with a prefix is a binary search plus a short scan. Each
+    entry may be reachable through several keys. At most `max_keys` keys are
+    held; `add` refuses entries past that and reports it."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._keys: List[Tuple[str, Hashable]] = []
+        self._entries: Dict[Hashable, Tuple[Any, Tuple[str, ...]]] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    def add(self, entry_id: Hashable, value: Any, keys: Iterable[str]) -> bool:
+        """Adds or replaces an entry. Returns False if it didn't fit"""
+        keys = tuple({self.normalize(key) for key in keys if key and key.strip()})
+        with self._lock:
+            self.remove(entry_id)
+            if len(self._keys) + len(keys) > self.max_keys:
+                return False
+            for key in keys:
+                insort(self._keys, (key, entry_id))
+            self._entries[entry_id] = (value, keys)
+            return True
+
+    def remove(self, entry_id: Hashable) -> None:
+        with self._lock:
+            entry = self._entries.pop(entry_id, None)
+            if entry is None:
+                return
+            for key in entry[1]:
+                i = bisect_left(self._keys, (key, entry_id))
+                if i < len(self._keys) and self._keys[i] == (key, entry_id):
+                    del self._keys[i]
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[Any]:
+        """Values of up to `limit` entries with a key starting with `prefix`,
+        in key order"""
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, entry_id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    results.append(self._entries[entry_id][0])
+                i += 1
+        return results
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,167 @@
+"""Stale-while-revalidate cache of whole responses for public read views.
+
+A view opts in by being wrapped in `cache_response(ttl, stale)` where it is
+routed. ResponseCacheMiddleware then stores its successful anonymous GET
+responses in the Django cache named by `RESPONSE_CACHE["alias"]`, keyed by
+the full path and the Accept header. For `ttl` seconds a cached response is
+served as is; for `stale` seconds after that it is still served, while one
+worker per host renders a fresh one in a background thread. Older entries
+are rendered again in the request.
+
+Only requests without an Authorization header or session cookie are served
+from or stored in the cache, and only responses that set no cookie, don't
+vary on Cookie and aren't marked private or no-store are stored. Every
+response of such a view carries `Vary: Authorization`, so shared caches
+downstream don't mix the two either. A cached response still answers the
+client's If-None-Match/If-Modified-Since with a 304. A refresh that gets a
+response it can't store, such as a 404 once the object is gone, drops the
+entry instead of leaving the old one to be served.
+
+Writes aren't seen until the entry expires, so `ttl` is as stale as a
+response can be while nobody is refreshing it."""
+
+import copy
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, has_vary_header, patch_cache_control, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+
+logger = logging.getLogger(__name__)
+
+
+class Policy(NamedTuple):
+    ttl: float
+    stale: float
+
+
+def cache_response(ttl: float, stale: float = 0):
+    """Marks a view function as cacheable by ResponseCacheMiddleware"""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            return view(*args, **kwargs)
+
+        wrapped.response_cache = Policy(ttl, stale)
+        return wrapped
+
+    return decorator
+
+
+def is_anonymous(request) -> bool:
+    return "HTTP_AUTHORIZATION" not in request.META and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def is_storable(response) -> bool:
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    cache_control = response.get("Cache-Control", "")
+    return "private" not in cache_control and "no-store" not in cache_control and not has_vary_header(
+        response, "Cookie"
+    )
+
+
+class ResponseCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @property
+    def cache(self):
+        return caches[settings.RESPONSE_CACHE["alias"]]
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        policy = getattr(request, "_response_cache", None)
+        if policy is None:
+            return response
+        patch_vary_headers(response, ["Authorization"])
+        if getattr(request, "_response_cache_key", None) is not None and is_storable(response):
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+            self._store(request._response_cache_key, response, policy)
+            self._set_freshness(response, policy, age=0)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        policy = getattr(view_func, "response_cache", None)
+        if policy is None or not settings.RESPONSE_CACHE["enabled"]:
+            return None
+        request._response_cache = policy
+        if request.method != "GET" or not is_anonymous(request):
+            return None
+        key = self.key(request)
+        entry = self.cache.get(key)
+        age = None if entry is None else time.time() - entry["stored_at"]
+        if age is None or age >= policy.ttl + policy.stale:
+            # Rendered in this request and stored on the way out
+            request._response_cache_key = key
+            return None
+        if age >= policy.ttl and self.cache.add(f"{key}:refresh", True, settings.RESPONSE_CACHE["refresh_lease"]):
+            refreshes.submit(self._refresh, key, copy.copy(request), view_func, view_args, view_kwargs, policy)
+        return self._cached_response(request, entry, policy, age)
+
+    def key(self, request) -> str:
+        variant = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+        return f"responses:{hashlib.sha1(variant.encode()).hexdigest()}"
+
+    def _store(self, key: str, response, policy: Policy) -> None:
+        entry = {
+            "stored_at": time.time(),
+            "status": response.status_code,
+            "headers": list(response.items()),
+            "content": response.content,
+        }
+        self.cache.set(key, entry, policy.ttl + policy.stale)
+
+    def _refresh(self, key: str, request, view_func, view_args, view_kwargs, policy: Policy) -> None:
+        try:
+            response = view_func(request, *view_args, **view_kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            if is_storable(response):
+                self._store(key, response, policy)
+            else:
+                # e.g. a 404 for a deleted object: the next request renders it
+                self.cache.delete(key)
+        except Exception:
+            logger.exception("Refreshing cached response %s failed", request.get_full_path())
+        finally:
+            self.cache.delete(f"{key}:refresh")
+            connections.close_all()
+
+    def _cached_response(self, request, entry, policy: Policy, age: float) -> Optional[HttpResponse]:
+        headers = dict(entry["headers"])
+        last_modified = parse_http_date_safe(headers.get("Last-Modified", ""))
+        response = get_conditional_response(request, etag=headers.get("ETag"), last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(entry["content"], status=entry["status"])
+            for name, value in entry["headers"]:
+                response[name] = value
+        else:
+            for name in ("ETag", "Last-Modified", "Vary"):
+                if name in headers:
+                    response[name] = headers[name]
+        self._set_freshness(response, policy, age)
+        return response
+
+    def _set_freshness(self, response, policy: Policy, age: float) -> None:
+        # Whole seconds, so that Age and max-age add up to the TTL
+        age = int(age)
+        response["Age"] = str(age)
+        if "Cache-Control" in response:
+            del response["Cache-Control"]
+        patch_cache_control(
+            response, public=True, max_age=max(0, int(policy.ttl) - age), stale_while_revalidate=int(policy.stale)
+        )
+
+
+refreshes = ThreadPoolExecutor(settings.RESPONSE_CACHE["refresh_workers"], thread_name_prefix="response-cache")
@@ -0,0 +1,148 @@
+"""Request coalescing for cache misses.
+
+When a hot entry is missing, every request that notices would otherwise
+recompute it at once. `SingleFlight.fill` lets one of them do it: threads of
+a process wait on the one that got there first, and processes take turns
+through a lease, the others polling the cache until the value shows up. A
+waiter gives up after `timeout` seconds and calls `fallback`, or computes
+the value itself if there is none.
+
+A lease is a file in `SINGLE_FLIGHT["lock_dir"]` created with O_EXCL, which
+the filesystem grants to one process only (the cache's `add` isn't atomic
+on every backend, FileBasedCache included). So processes are coalesced with
+those on the same host, or sharing that directory. A lease whose holder died
+is taken over once its file is `SINGLE_FLIGHT["lease"]` seconds old; two
+processes taking over the same one may then both compute."""
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from django.conf import settings
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, timeout: float, lease: float, poll: float, lock_dir: str):
+        self.timeout = timeout
+        self.lease = lease
+        self.poll = poll
+        self.lock_dir = Path(lock_dir)
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key: Hashable, compute: Callable[[], Any], timeout: Optional[float] = None,
+           fallback: Optional[Callable[[], Any]] = None) -> Any:
+        """Runs `compute` unless another thread of this process is already
+        running it for `key`, in which case its result (or exception) is shared"""
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if not call.done.wait(timeout):
+                self.timeouts += 1
+                return fallback() if fallback is not None else compute()
+            self.coalesced += 1
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = compute()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def fill(self, key: str, read: Callable[[], Any], compute: Callable[[], Any],
+             timeout: Optional[float] = None, fallback: Optional[Callable[[], Any]] = None) -> Any:
+        """`read()` if it has a value, else `compute()`, coalesced across threads
+        and across processes. `read` returns None for a miss and `compute`
+        stores its result in a cache shared with them, where `read` will find it"""
+        value = read()
+        if value is not None:
+            return value
+        timeout = self.timeout if timeout is None else timeout
+        return self.do(key, lambda: self._lease(key, read, compute, timeout, fallback), timeout, fallback)
+
+    def lease_path(self, key: str) -> Path:
+        return self.lock_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.lease"
+
+    def acquire(self, key: str) -> bool:
+        """Takes the lease of `key` unless another live process holds it"""
+        path = self.lease_path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+            except FileNotFoundError:
+                self.lock_dir.mkdir(parents=True, exist_ok=True)
+                continue
+            except FileExistsError:
+                try:
+                    if time.time() - path.stat().st_mtime < self.lease:
+                        return False
+                    # Its holder died
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                continue
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return True
+        return False
+
+    def release(self, key: str) -> None:
+        try:
+            self.lease_path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _lease(self, key, read, compute, timeout, fallback):
+        deadline = time.monotonic() + timeout
+        while not self.acquire(key):
+            if time.monotonic() >= deadline:
+                self.timeouts += 1
+                return fallback() if fallback is not None else compute()
+            time.sleep(self.poll)
+            value = read()
+            if value is not None:
+                self.coalesced += 1
+                return value
+        try:
+            # Another process may have filled it while we waited for the lease
+            value = read()
+            if value is None:
+                self.computed += 1
+                value = compute()
+            return value
+        finally:
+            self.release(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {"computed": self.computed, "coalesced": self.coalesced, "timeouts": self.timeouts}
+
+
+flights = SingleFlight(
+    settings.SINGLE_FLIGHT["timeout"],
+    settings.SINGLE_FLIGHT["lease"],
+    settings.SINGLE_FLIGHT["poll"],
+    settings.SINGLE_FLIGHT["lock_dir"],
+)
@@ -0,0 +1,89 @@
+"""A write-behind buffer that collects writes in memory and hands them to a
+flush function in batches"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Callable, Hashable, List
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Buffers items by key and flushes them in bulk every `interval` seconds
+    from a background thread, or straight away once `max_size` items are
+    waiting. Adding an item under a key that is already buffered replaces
+    it, so repeated writes to the same row coalesce into one. Whatever is
+    left is flushed when the process exits.
+
+    A flush that fails is logged and its items dropped, so only writes that
+    can be lost or redone should go through here. With `enabled` off every
+    item is flushed on its own as it is added."""
+
+    def __init__(self, flush: Callable[[List], None], max_size: int, interval: float, enabled: bool = True):
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive integer")
+        self._flush = flush
+        self.max_size = max_size
+        self.interval = interval
+        self.enabled = enabled
+        self._items = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def add(self, key: Hashable, item) -> None:
+        if not self.enabled:
+            self._flush([item])
+            return
+        with self._lock:
+            self._items[key] = item
+            full = len(self._items) >= self.max_size
+        if full:
+            self.flush()
+        else:
+            self._ensure_thread()
+
+    def pop(self, key: Hashable, default=None):
+        """Takes an item back out of the buffer, for callers that need it written now"""
+        with self._lock:
+            return self._items.pop(key, default)
+
+    def flush(self) -> int:
+        """Writes out everything buffered so far and returns how many items it wrote"""
+        with self._lock:
+            items, self._items = list(self._items.values()), {}
+        if not items:
+            return 0
+        try:
+            self._flush(items)
+        except Exception:
+            logger.exception("Dropped %d buffered writes", len(items))
+            return 0
+        return len(items)
+
+    def _ensure_thread(self) -> None:
+        # Threads don't survive a fork, so a worker forked from a process that
+        # already started one needs its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+            # This thread never sees request_finished, so tidy its connection here
+            close_old_connections()
+
+    def __len__(self) -> int:
+        return len(self._items)